@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Scenario benchmark suite for fastapiserver.py.
+
+Each scenario gets a fresh server in a scratch directory, backed by the
+stub LLM server (benchmarks/stub_llm_server.py) with the given latency and
+token rate, and optionally a pre-seeded history for the default user:
+
+- quiz_burst: a burst of concurrent /generate-quiz calls on distinct topics
+- history_10k / history_100k: paging through /quiz-history and fetching
+  single quizzes from a 10k / 100k quiz history
+- submission_storm: concurrent /submit-quiz for quizzes already in history
+- stats_dashboard: clients polling /quiz-stats, /due and the latest quizzes
+  the way a dashboard does
+
+Per scenario it reports requests/sec, p50/p95/p99 per endpoint, errors, how
+long the first request (which opens the user's store) took, and the
+server's resident memory before and after the load (current and peak,
+Linux only).
+
+With --workers 1,2,4 every scenario runs once per worker count (uvicorn
+--workers, WEB_CONCURRENCY set so the workers share state) and the report
+adds each run's throughput relative to one worker: a scaling efficiency of
+1.0 means N workers served N times the requests per second. Scaling is
+bounded by the cores available; meta.cpus records how many there were.
+
+Results are JSON tagged with the git commit, so two runs can be compared:
+
+    python benchmarks/bench_suite.py --output before.json
+    # ...change something...
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+    python benchmarks/bench_suite.py --scenarios quiz_burst,history_10k --latency 0.5
+    python benchmarks/bench_suite.py --scenarios history_10k,stats_dashboard --workers 1,2,4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from load_benchmark import percentile, wait_for  # noqa: E402
+from quiz_store import QuizStore  # noqa: E402
+
+TOPICS = ["Python", "Algorithms", "Databases", "Networking", "Statistics", "Linear Algebra", "Biology", "History"]
+KEYWORDS = ["recursion", "indexing", "caching", "latency", "sorting", "hashing", "regression", "entropy"]
+
+def make_quiz(i: int, start: datetime, completed: bool) -> dict:
+    topic = TOPICS[i % len(TOPICS)]
+    keywords = [KEYWORDS[(i + k) % len(KEYWORDS)] for k in range(2)]
+    questions = [{
+        "question": f"Question {q} about {keywords[q % 2]} in {topic} (#{i})?",
+        "choice1": "First option", "choice2": "Second option", "choice3": "Third option", "choice4": "Fourth option",
+        "correct": "ABCD"[q], "keyword": keywords[q % 2], "difficulty": "medium",
+    } for q in range(4)]
+    generated_at = start + timedelta(minutes=i)
+    answers = [{"question_index": q, "selected_answer": "A", "is_correct": (i + q) % 3 != 0} for q in range(4)]
+    return {
+        "quiz_id": f"seed-{i}",
+        "topic": topic,
+        "keyword": keywords[0],
+        "questions": questions,
+        "user_answers": answers if completed else [],
+        "generated_at": generated_at.isoformat(),
+        "completed_at": (generated_at + timedelta(minutes=3)).isoformat() if completed else None,
+        "score": sum(a["is_correct"] for a in answers) if completed else None,
+        "total_questions": 4,
+    }
+
+def seed_history(workdir: str, count: int, completed_share: float = 0.7):
+    """Write count quizzes straight into the default user's SQLite store"""
+    user_dir = os.path.join(workdir, "quiz_data", "users", "default")
+    os.makedirs(user_dir, exist_ok=True)
+    store = QuizStore(os.path.join(user_dir, "quiz_history.db"))
+    start = datetime.now() - timedelta(minutes=count + 60)
+    rng = random.Random(count)
+    batch = []
+    for i in range(count):
+        batch.append(make_quiz(i, start, rng.random() < completed_share))
+        if len(batch) == 5000:
+            store.add_many(batch)
+            batch = []
+    if batch:
+        store.add_many(batch)
+    store.close()
+
+# Scenario request functions: (client, request number, seeded count, rng) -> endpoint label, response
+
+async def quiz_burst_request(client, n, seeded, rng):
+    body = {"topic": f"Burst topic {n}", "keywords": ["alpha", "beta", "gamma"], "difficulty": "medium"}
+    return "/generate-quiz", await client.post("/generate-quiz", json=body)
+
+async def history_request(client, n, seeded, rng):
+    if n % 4 == 3:
+        quiz_id = f"seed-{rng.randrange(seeded)}"
+        return "/quiz-history/{quiz_id}", await client.get(f"/quiz-history/{quiz_id}")
+    params = {"limit": 50, "order": "desc"}
+    if n % 4 == 1:
+        params["topic"] = rng.choice(TOPICS)
+    elif n % 4 == 2:
+        params["fields"] = "quiz_id,topic,score,generated_at"
+    return "/quiz-history", await client.get("/quiz-history", params=params)
+
+async def submission_request(client, n, seeded, rng):
+    quiz_id = f"seed-{rng.randrange(seeded)}"
+    body = {
+        "quiz_id": quiz_id, "topic": TOPICS[0], "keyword": KEYWORDS[0],
+        "user_answers": [{"question_index": q, "selected_answer": "B", "is_correct": rng.random() < 0.6} for q in range(4)],
+        "completed_at": datetime.now().isoformat(),
+    }
+    return "/submit-quiz", await client.post("/submit-quiz", json=body)
+
+async def dashboard_request(client, n, seeded, rng):
+    kind = n % 3
+    if kind == 0:
+        return "/quiz-stats", await client.get("/quiz-stats")
+    if kind == 1:
+        return "/due", await client.get("/due", params={"limit": 20})
+    return "/quiz-history", await client.get("/quiz-history", params={"limit": 20, "order": "desc",
+                                                                      "fields": "quiz_id,topic,score,generated_at"})
+
+# name -> (request function, quizzes to seed, default total requests, concurrency)
+SCENARIOS = {
+    "quiz_burst": (quiz_burst_request, 0, 200, 100),
+    "history_10k": (history_request, 10_000, 2000, 20),
+    "history_100k": (history_request, 100_000, 2000, 20),
+    "submission_storm": (submission_request, 5_000, 2000, 50),
+    "stats_dashboard": (dashboard_request, 10_000, 1500, 10),
+}
+
+def child_pids(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def memory_kb(pid: int) -> dict:
+    """
+    Current and peak resident set size of a process and its worker
+    processes, summed, from /proc (Linux only)
+    """
+    result = {}
+    for process in [pid] + child_pids(pid):
+        try:
+            with open(f"/proc/{process}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        result["rss_kb"] = result.get("rss_kb", 0) + int(line.split()[1])
+                    elif line.startswith("VmHWM:"):
+                        result["peak_rss_kb"] = result.get("peak_rss_kb", 0) + int(line.split()[1])
+        except OSError:
+            pass
+    return result
+
+def start_processes(args, workdir: str, workers: int):
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "stub_llm_server.py"), "--port", str(args.stub_port),
+         "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second)],
+    )
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        # Every burst quiz should reach the stub, not the cache
+        "QUIZ_CACHE_POLICY": "off",
+        "WEB_CONCURRENCY": str(workers),
+    })
+    app_path = os.path.abspath(args.app)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fastapiserver:app", "--app-dir", os.path.dirname(app_path),
+         "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    wait_for(f"http://127.0.0.1:{args.stub_port}/docs")
+    wait_for(f"http://127.0.0.1:{args.port}/health")
+    return stub, server
+
+async def drive(args, request_fn, seeded: int, total: int, concurrency: int, workers: int) -> dict:
+    latencies, errors = {}, {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=300) as client:
+        # The first request opens the user's store, which loads the whole history index
+        started = time.perf_counter()
+        await client.get("/quiz-history", params={"limit": 1})
+        first_request_ms = round((time.perf_counter() - started) * 1000, 1)
+        if workers > 1:
+            # Every worker loads its own index; keep that out of the measured run
+            await asyncio.gather(*(client.get("/quiz-history", params={"limit": 1})
+                                   for _ in range(min(concurrency, workers * 8))))
+
+        async def worker(number: int):
+            rng = random.Random(args.seed * 1000 + number)
+            for n in counter:
+                request_started = time.perf_counter()
+                try:
+                    label, response = await request_fn(client, n, seeded, rng)
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                latencies.setdefault(label, []).append(time.perf_counter() - request_started)
+                if response.status_code >= 400:
+                    errors[f"{label} {response.status_code}"] = errors.get(f"{label} {response.status_code}", 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    everything = [v for values in latencies.values() for v in values]
+    summary = lambda values: {
+        "count": len(values),
+        "rps": round(len(values) / elapsed, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+    return {
+        "first_request_ms": first_request_ms,
+        "duration_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        **summary(everything),
+        "errors": errors,
+        "endpoints": {label: summary(values) for label, values in sorted(latencies.items())},
+    }
+
+def run_scenario(args, name: str, workers: int) -> dict:
+    request_fn, seeded, default_total, concurrency = SCENARIOS[name]
+    total = args.requests or default_total
+    concurrency = args.concurrency or concurrency
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_started = time.perf_counter()
+        if seeded:
+            seed_history(workdir, seeded)
+        seed_s = round(time.perf_counter() - seed_started, 2)
+        stub, server = start_processes(args, workdir, workers)
+        try:
+            memory_before = memory_kb(server.pid)
+            result = asyncio.run(drive(args, request_fn, seeded, total, concurrency, workers))
+            memory_after = memory_kb(server.pid)
+        finally:
+            server.terminate()
+            stub.terminate()
+            server.wait()
+            stub.wait()
+    return {"seeded_quizzes": seeded, "seed_s": seed_s, "workers": workers, **result,
+            "memory_before": memory_before, "memory_after": memory_after}
+
+def git_info() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=REPO_DIR, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+def compare(base: dict, result: dict):
+    """Print rps and p95 changes from a previous results file"""
+    base_commit = (base["meta"].get("commit") or "?")[:10]
+    print(f"\ncompared with {base_commit}:")
+    print(f"{'scenario':<18}{'rps':>10}{'was':>10}{'change':>9}{'p95 ms':>10}{'was':>10}{'change':>9}")
+    for name, current in result["scenarios"].items():
+        previous = base["scenarios"].get(name)
+        if previous is None:
+            continue
+        change = lambda now, before: f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{name:<18}{current['rps']:>10}{previous['rps']:>10}{change(current['rps'], previous['rps']):>9}"
+              f"{current['p95_ms']:>10}{previous['p95_ms']:>10}{change(current['p95_ms'], previous['p95_ms']):>9}")
+
+def scaling(scenarios: dict) -> dict:
+    """Throughput of each multi-worker run relative to the same scenario on one worker"""
+    result = {}
+    for key, scenario in scenarios.items():
+        name, _, _ = key.partition("@")
+        single = scenarios.get(f"{name}@1w")
+        if single is None or scenario["workers"] == 1 or not single["rps"]:
+            continue
+        speedup = scenario["rps"] / single["rps"]
+        result[key] = {"speedup": round(speedup, 2), "efficiency": round(speedup / scenario["workers"], 2)}
+    return result
+
+def print_report(result: dict):
+    meta = result["meta"]
+    print(f"commit {meta['commit'] or '?'}{' (dirty)' if meta['dirty'] else ''}, "
+          f"LLM latency {meta['latency']}s, {meta['tokens_per_second']} tokens/s")
+    print(f"{'scenario':<18}{'endpoint':<26}{'count':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, scenario in result["scenarios"].items():
+        for label, stats in scenario["endpoints"].items():
+            print(f"{name:<18}{label:<26}{stats['count']:>7}{stats['rps']:>9}{stats['p50_ms']:>9}"
+                  f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+        memory = scenario["memory_after"]
+        print(f"{'':<18}total {scenario['count']} in {scenario['duration_s']}s = {scenario['rps']} req/s; "
+              f"first request {scenario['first_request_ms']} ms; "
+              f"rss {memory.get('rss_kb', '?')} kB (peak {memory.get('peak_rss_kb', '?')} kB)"
+              + (f"; errors {scenario['errors']}" if scenario["errors"] else ""))
+    if result.get("scaling"):
+        print(f"\nscaling vs one worker ({meta['cpus']} cpus):")
+        for key, stats in result["scaling"].items():
+            print(f"{key:<24}{stats['speedup']:>6}x  efficiency {stats['efficiency']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument("--app", default=os.path.join(REPO_DIR, "fastapiserver.py"), help="server file to benchmark")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub LLM seconds before answering")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="stub completion tokens per second on top of --latency (0 = ignore length)")
+    parser.add_argument("--requests", type=int, default=0, help="requests per scenario (0 = scenario default)")
+    parser.add_argument("--concurrency", type=int, default=0, help="concurrent clients (0 = scenario default)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", default="1",
+                        help="comma-separated server worker counts; each scenario runs once per count")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (known: {', '.join(SCENARIOS)})")
+    try:
+        worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+    except ValueError:
+        parser.error("--workers takes comma-separated integers")
+    if not worker_counts or min(worker_counts) < 1:
+        parser.error("--workers needs counts of at least 1")
+
+    result = {
+        "meta": {
+            **git_info(),
+            "app": os.path.abspath(args.app),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        for workers in worker_counts:
+            # Single-count runs keep plain scenario names so --compare works across commits
+            key = name if worker_counts == [1] else f"{name}@{workers}w"
+            print(f"running {key}...", file=sys.stderr)
+            result["scenarios"][key] = run_scenario(args, name, workers)
+    if len(worker_counts) > 1:
+        result["scaling"] = scaling(result["scenarios"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+if __name__ == "__main__":
+    main()
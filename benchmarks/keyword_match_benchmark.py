@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Keyword matching benchmark: per-keyword regexes vs the Aho-Corasick
+automaton behind /match-keywords.
+
+Builds a synthetic large page and scans it three ways for each keyword set
+size:
+
+- regex: what content.js does today. Every element matched by its
+  'p, h1, ..., div, article, section' selector is scanned with one
+  whole-word, case-insensitive regex per keyword. Container elements repeat
+  the text of everything inside them, so the same text is scanned again at
+  every nesting level.
+- automaton: the same element texts, scanned once each by one compiled
+  automaton (isolates the algorithm).
+- automaton_leaf: only leaf text chunks, which is what a client batching
+  page text into /match-keywords sends.
+
+Counts from regex and automaton are checked to agree.
+
+    python benchmarks/keyword_match_benchmark.py --keywords 100,300,600
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from keyword_matcher import KeywordAutomaton  # noqa: E402
+
+FILLER = "the a of and to in is that for it as with on by this from are be or at an".split()
+SYLLABLES = ["ka", "lo", "mi", "ra", "te", "vu", "sen", "dor", "pix", "qua", "zel", "bro", "fin", "gam"]
+
+def make_vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_keywords(vocabulary, count: int, rng: random.Random):
+    keywords = set()
+    while len(keywords) < count:
+        if rng.random() < 0.3:
+            keywords.add(" ".join(rng.sample(vocabulary, 2)))
+        else:
+            keywords.add(rng.choice(vocabulary))
+    return sorted(keywords)
+
+def make_page(vocabulary, sections: int, paragraphs: int, rng: random.Random):
+    """
+    Element texts as content.js sees them (leaves, then each section, then
+    the page-wide wrapper div) plus the leaf texts alone.
+    """
+    leaves, section_texts = [], []
+    for _ in range(sections):
+        section = []
+        for _ in range(paragraphs):
+            words = [rng.choice(vocabulary) if rng.random() < 0.35 else rng.choice(FILLER)
+                     for _ in range(rng.randint(40, 120))]
+            section.append(" ".join(words).capitalize() + ".")
+        leaves.extend(section)
+        section_texts.append("\n".join(section))
+    elements = leaves + section_texts + ["\n".join(section_texts)]
+    return elements, leaves
+
+def regex_counts(texts, keywords):
+    counts = dict.fromkeys(keywords, 0)
+    for text in texts:
+        lower_text = text.lower()
+        for keyword in keywords:
+            regex = re.compile(r"\b" + re.escape(keyword.lower()) + r"\b", re.IGNORECASE)
+            counts[keyword] += len(regex.findall(lower_text))
+    return counts
+
+def timed(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    elements, leaves = make_page(vocabulary, args.sections, args.paragraphs, rng)
+    results = {
+        "page_chars": sum(len(t) for t in leaves),
+        "scanned_chars": sum(len(t) for t in elements),
+        "elements": len(elements),
+        "leaf_chunks": len(leaves),
+        "runs": [],
+    }
+    for count in args.keywords:
+        keywords = make_keywords(vocabulary, count, rng)
+        compile_s, automaton = timed(lambda: KeywordAutomaton(keywords), args.repeat)
+        regex_s, expected = timed(lambda: regex_counts(elements, keywords), args.repeat)
+        automaton_s, counted = timed(lambda: automaton.count(elements), args.repeat)
+        leaf_s, _ = timed(lambda: automaton.count(leaves), args.repeat)
+        agree = [expected[k] for k in automaton.keywords] == counted
+        results["runs"].append({
+            "keywords": count,
+            "compile_ms": round(compile_s * 1000, 2),
+            "regex_ms": round(regex_s * 1000, 1),
+            "automaton_ms": round(automaton_s * 1000, 1),
+            "automaton_leaf_ms": round(leaf_s * 1000, 1),
+            "speedup": round(regex_s / automaton_s, 1),
+            "speedup_leaf": round(regex_s / leaf_s, 1),
+            "counts_agree": agree,
+        })
+    return results
+
+def print_results(results):
+    print(f"page: {results['page_chars']} chars in {results['leaf_chunks']} leaf chunks; "
+          f"content.js scans {results['scanned_chars']} chars over {results['elements']} elements")
+    print(f"{'keywords':>9}{'compile ms':>12}{'regex ms':>11}{'automaton ms':>14}{'leaf ms':>10}"
+          f"{'speedup':>9}{'leaf x':>8}{'agree':>7}")
+    for run_ in results["runs"]:
+        print(f"{run_['keywords']:>9}{run_['compile_ms']:>12}{run_['regex_ms']:>11}{run_['automaton_ms']:>14}"
+              f"{run_['automaton_leaf_ms']:>10}{run_['speedup']:>9}{run_['speedup_leaf']:>8}"
+              f"{str(run_['counts_agree']):>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", default="50,200,500", help="comma-separated keyword set sizes")
+    parser.add_argument("--sections", type=int, default=20, help="container elements on the page")
+    parser.add_argument("--paragraphs", type=int, default=25, help="paragraphs per section")
+    parser.add_argument("--vocabulary", type=int, default=3000, help="distinct non-filler words")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    args.keywords = [int(k) for k in args.keywords.split(",")]
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Mixed-traffic load benchmark for fastapiserver.py.
+
+Starts the stub LLM server and the API server (in a scratch directory so the
+real quiz_data/ is untouched), then drives a mix of /generate-quiz,
+/quiz-history and /health requests from concurrent clients and reports
+requests/sec plus p50/p99 latency per endpoint.
+
+To compare before/after a change, point --app at an older copy of the server:
+
+    git show <commit>:fastapiserver.py > /tmp/before/fastapiserver.py
+    python benchmarks/load_benchmark.py --app /tmp/before/fastapiserver.py
+    python benchmarks/load_benchmark.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# (method, path, weight) for the default traffic mix
+TRAFFIC_MIX = [
+    ("POST", "/generate-quiz", 2),
+    ("GET", "/quiz-history", 4),
+    ("GET", "/health", 4),
+]
+
+QUIZ_BODY = {"topic": "Python", "keywords": ["decorators", "generators", "closures"], "difficulty": "medium"}
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def wait_for(url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_processes(args, workdir):
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "stub_llm_server.py"),
+         "--port", str(args.stub_port), "--latency", str(args.latency)],
+    )
+    env = dict(os.environ)
+    env["OPENAI_API_KEY"] = "bench-key"
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    app_path = os.path.abspath(args.app)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fastapiserver:app",
+         "--app-dir", os.path.dirname(app_path),
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    wait_for(f"http://127.0.0.1:{args.stub_port}/docs")
+    wait_for(f"http://127.0.0.1:{args.port}/health")
+    return stub, server
+
+async def client_loop(client, deadline, latencies, errors):
+    methods = [(m, p) for m, p, w in TRAFFIC_MIX for _ in range(w)]
+    while time.perf_counter() < deadline:
+        method, path = random.choice(methods)
+        start = time.perf_counter()
+        try:
+            if method == "POST":
+                response = await client.post(path, json=QUIZ_BODY)
+            else:
+                response = await client.get(path)
+            if response.status_code >= 400:
+                errors[path] = errors.get(path, 0) + 1
+        except httpx.HTTPError:
+            errors[path] = errors.get(path, 0) + 1
+            continue
+        latencies.setdefault(path, []).append(time.perf_counter() - start)
+
+async def run_load(args):
+    latencies, errors = {}, {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(client_loop(client, deadline, latencies, errors) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "app": os.path.abspath(args.app),
+        "duration_s": round(elapsed, 2),
+        "concurrency": args.concurrency,
+        "llm_latency_s": args.latency,
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "errors": errors,
+        "endpoints": {
+            path: {
+                "count": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+            for path, values in sorted(latencies.items())
+        },
+    }
+
+def print_report(result):
+    print(f"app: {result['app']}")
+    print(f"{result['requests']} requests in {result['duration_s']}s "
+          f"({result['rps']} req/s, concurrency {result['concurrency']}, LLM latency {result['llm_latency_s']}s)")
+    print(f"{'endpoint':<20}{'count':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for path, stats in result["endpoints"].items():
+        print(f"{path:<20}{stats['count']:>8}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p99_ms']:>10}")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=os.path.join(REPO_DIR, "fastapiserver.py"), help="server file to benchmark")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=2.0, help="stub LLM seconds per completion")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stub, server = start_processes(args, workdir)
+        try:
+            result = asyncio.run(run_load(args))
+        finally:
+            server.terminate()
+            stub.terminate()
+            server.wait()
+            stub.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
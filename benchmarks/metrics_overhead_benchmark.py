@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Overhead of the /metrics instrumentation and JSON request logging.
+
+Drives a minimal FastAPI app in-process over raw ASGI (no sockets, so the
+instrumentation isn't lost in network noise) three ways: bare, with
+MetricsMiddleware, and with MetricsMiddleware plus the per-request JSON log
+line written to /dev/null. Reports microseconds per request and the added
+cost over the bare app. The default configuration (metrics on, request log
+lines off) must stay within the budget, 50us per request by default; the
+log line is opt-in (LOG_REQUESTS=1) and its extra cost is reported
+alongside. Also times a single Histogram.observe and a /metrics render.
+
+    python benchmarks/metrics_overhead_benchmark.py --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fastapi import FastAPI  # noqa: E402
+
+from observability import JsonFormatter, MetricsMiddleware, Registry  # noqa: E402
+
+def build_app(mode: str, registry: Registry):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"item_id": item_id}
+
+    if mode == "bare":
+        return app
+    logger = None
+    if mode == "metrics+log":
+        logger = logging.getLogger(f"bench.{id(registry)}")
+        handler = logging.FileHandler(os.devnull)
+        handler.setFormatter(JsonFormatter())
+        logger.handlers[:] = [handler]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    app.add_middleware(
+        MetricsMiddleware,
+        latency=registry.histogram("http_request_duration_seconds", "", ("method", "route", "status")),
+        response_size=registry.histogram("http_response_size_bytes", "", ("route",)),
+        in_flight=registry.gauge("http_requests_in_flight", ""),
+        logger=logger,
+    )
+    return app
+
+async def drive(app, requests: int) -> float:
+    """Seconds per request calling the ASGI app directly"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(i):
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/items/{i}", "raw_path": f"/items/{i}".encode(), "root_path": "",
+            "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        }
+
+    for i in range(200):  # warm up
+        await app(scope(i), receive, send)
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(scope(i), receive, send)
+    return (time.perf_counter() - started) / requests
+
+def run(args):
+    results = {"requests": args.requests, "budget_us": args.budget_us, "modes": {}}
+    for mode in ("bare", "metrics", "metrics+log"):
+        best = None
+        for _ in range(args.repeat):
+            per_request = asyncio.run(drive(build_app(mode, Registry()), args.requests))
+            best = per_request if best is None else min(best, per_request)
+        results["modes"][mode] = round(best * 1e6, 2)
+    bare = results["modes"]["bare"]
+    results["overhead_us"] = {mode: round(us - bare, 2) for mode, us in results["modes"].items() if mode != "bare"}
+    results["within_budget"] = results["overhead_us"]["metrics"] <= args.budget_us
+
+    registry = Registry()
+    histogram = registry.histogram("h", "", ("route",))
+    started = time.perf_counter()
+    for i in range(100000):
+        histogram.observe(0.01 * (i % 100), route="/x")
+    results["observe_ns"] = round((time.perf_counter() - started) / 100000 * 1e9)
+    for i in range(50):
+        registry.histogram(f"h{i}", "", ("route", "status")).observe(0.1, route=f"/r{i}", status=200)
+    started = time.perf_counter()
+    registry.render()
+    results["render_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode (best is kept)")
+    parser.add_argument("--budget-us", type=float, default=50.0, help="allowed overhead per request")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for mode, us in results["modes"].items():
+            extra = f"  (+{results['overhead_us'][mode]} us)" if mode in results["overhead_us"] else ""
+            print(f"{mode:>12}: {us} us/request{extra}")
+        print(f"Histogram.observe: {results['observe_ns']} ns; render of 50 histograms: {results['render_ms']} ms")
+        print(f"default configuration within {args.budget_us} us budget: {results['within_budget']}")
+    sys.exit(0 if results["within_budget"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API used by the benchmarks.
+
+Answers /v1/chat/completions after a configurable delay with either a
+comma-separated keyword list or a JSON array of quiz questions, depending on
+which prompt fastapiserver.py sent. Streamed requests (stream=True) get the
+same content as server-sent chunks spread evenly over the latency. Point the
+server at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Completions longer than the request's max_tokens (at 4 characters per
+token) are cut off there with finish_reason "length", as a real model does.
+
+--tokens-per-second adds generation time on top of --latency, proportional
+to the completion's length, so longer completions take longer as they do
+with a real model.
+
+--malformed-rate makes that share of quiz completions come back the way real
+models sometimes answer: in a code fence, with trailing commas, or cut off
+in the middle of the last question.
+
+--rate-limit-rate and --timeout-rate inject upstream faults: that share of
+requests gets a 429 with Retry-After, or hangs for --hang seconds so the
+client times out. POST /faults with any of {"rate_limit_rate",
+"timeout_rate", "malformed_rate"} changes them while running (e.g. to take
+the "API" down and bring it back); GET /faults shows settings and counts.
+
+    python benchmarks/stub_llm_server.py --port 9100 --latency 2.0
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+app = FastAPI(title="Stub LLM Server")
+
+# Seconds to wait before answering each completion
+LATENCY = 2.0
+# Completion tokens generated per second on top of LATENCY; 0 ignores length
+TOKENS_PER_SECOND = 0.0
+# Number of pieces a streamed completion is split into
+STREAM_CHUNKS = 40
+# Injected faults: share of quiz completions returned malformed, share of
+# requests answered 429 / left hanging
+FAULTS = {"malformed_rate": 0.0, "rate_limit_rate": 0.0, "timeout_rate": 0.0}
+# Retry-After sent with injected 429s, and how long hanging requests hang
+RETRY_AFTER = 1.0
+HANG = 30.0
+injected = {"rate_limited": 0, "timed_out": 0, "served": 0}
+
+def build_keywords(prompt: str) -> str:
+    match = re.search(r'learning about "([^"]+)"', prompt)
+    topic = match.group(1) if match else "topic"
+    return ", ".join(f"{topic} term {i}" for i in range(1, 13))
+
+def build_questions(keywords, count: int = 4):
+    questions = []
+    for i in range(count):
+        keyword = keywords[i % len(keywords)]
+        questions.append({
+            "question": f"Which statement best describes {keyword}? ({i + 1})",
+            "choice1": f"The correct description of {keyword}",
+            "choice2": "A plausible but wrong description",
+            "choice3": "Another wrong description",
+            "choice4": "An unrelated description",
+            "correct": "A",
+            "keyword": keyword,
+            "difficulty": "medium"
+        })
+    return questions
+
+def build_quiz(prompt: str) -> str:
+    match = re.search(r'focusing on these keywords: (.+)', prompt)
+    keywords = [k.strip() for k in match.group(1).split(",")] if match else ["general"]
+    count = re.search(r'Generate (\d+) multiple', prompt)
+    questions = build_questions(keywords, int(count.group(1)) if count else 4)
+    if "existing questions:" in prompt:
+        for question in questions:
+            question["question"] = question["question"].replace("?", "? (follow-up)")
+    # json_object/json_schema prompts ask for the array wrapped in an object
+    wrapped = '{"questions"' in prompt
+    content = json.dumps({"questions": questions} if wrapped else questions, indent=2)
+    if random.random() < FAULTS["malformed_rate"]:
+        return malform(content)
+    return content
+
+def malform(content: str) -> str:
+    kind = random.choice(["fence", "trailing_comma", "truncated"])
+    if kind == "fence":
+        return f"```json\n{content}\n```"
+    if kind == "trailing_comma":
+        return content.replace('"\n  }', '",\n  }').replace("}\n]", "},\n]")
+    # Cut off halfway through the last question
+    return content[:content.rfind("{") + 40]
+
+def build_quiz_batch(prompt: str) -> str:
+    items = re.findall(r'^(\d+)\. Topic: ".*" \| Keywords: (.+?) \| Difficulty', prompt, re.MULTILINE)
+    quizzes = [
+        {"item": int(number), "questions": build_questions([k.strip() for k in keywords.split(",")])}
+        for number, keywords in items
+    ]
+    wrapped = '{"quizzes"' in prompt
+    return json.dumps({"quizzes": quizzes} if wrapped else quizzes, indent=2)
+
+def build_content(messages) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    if "Quiz requests:" in prompt:
+        return build_quiz_batch(prompt)
+    if "multiple choice" in prompt:
+        return build_quiz(prompt)
+    if "keywords" in prompt:
+        return build_keywords(prompt)
+    return "Hello!"
+
+def cut_off(content: str, max_tokens) -> tuple:
+    """Content truncated to max_tokens and its finish_reason"""
+    if max_tokens and len(content) > max_tokens * 4:
+        return content[:max_tokens * 4], "length"
+    return content, "stop"
+
+def usage_for(messages, content: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) // 4 for m in messages)
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+def completion_seconds(content: str) -> float:
+    """Time to answer: fixed latency plus generation time for the completion tokens"""
+    if TOKENS_PER_SECOND <= 0:
+        return LATENCY
+    return LATENCY + (len(content) // 4) / TOKENS_PER_SECOND
+
+async def stream_completion(body: dict, content: str, finish_reason: str = "stop"):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo")}
+    size = max(1, len(content) // STREAM_CHUNKS)
+    pieces = [content[i:i + size] for i in range(0, len(content), size)]
+    duration = completion_seconds(content)
+    for piece in pieces:
+        await asyncio.sleep(duration / len(pieces))
+        chunk = dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield f"data: {json.dumps(chunk)}\n\n"
+    chunk = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+    yield f"data: {json.dumps(chunk)}\n\n"
+    if body.get("stream_options", {}).get("include_usage"):
+        chunk = dict(base, choices=[], usage=usage_for(body.get("messages", []), content))
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.get("/faults")
+async def get_faults():
+    return {"faults": FAULTS, "injected": injected}
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    for name, value in (await request.json()).items():
+        if name in FAULTS:
+            FAULTS[name] = float(value)
+    return {"faults": FAULTS, "injected": injected}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < FAULTS["rate_limit_rate"]:
+        injected["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(RETRY_AFTER)},
+            content={"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+    if random.random() < FAULTS["timeout_rate"]:
+        injected["timed_out"] += 1
+        await asyncio.sleep(HANG)
+    injected["served"] += 1
+    content, finish_reason = cut_off(build_content(body.get("messages", [])), body.get("max_tokens"))
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(body, content, finish_reason), media_type="text/event-stream")
+    await asyncio.sleep(completion_seconds(content))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason
+        }],
+        "usage": usage_for(body.get("messages", []), content)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds per completion")
+    parser.add_argument("--tokens-per-second", type=float, default=TOKENS_PER_SECOND,
+                        help="completion tokens generated per second on top of --latency (0 = ignore length)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="share of quiz completions returned malformed (0-1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429 (0-1)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests left hanging (0-1)")
+    parser.add_argument("--retry-after", type=float, default=RETRY_AFTER, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--hang", type=float, default=HANG, help="seconds a hanging request hangs")
+    args = parser.parse_args()
+    LATENCY = args.latency
+    TOKENS_PER_SECOND = args.tokens_per_second
+    FAULTS.update(malformed_rate=args.malformed_rate, rate_limit_rate=args.rate_limit_rate,
+                  timeout_rate=args.timeout_rate)
+    RETRY_AFTER = args.retry_after
+    HANG = args.hang
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,17 +1,138 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import codecs
+import hashlib
 import json
 import os
-from datetime import datetime
-from openai import OpenAI
+import time
+from datetime import datetime, timedelta, timezone
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+import httpx
 import uuid
 
+try:
+    import orjson
+except ImportError:  # optional; history responses fall back to the standard json encoder
+    orjson = None
+
+from quiz_store import QuizStore, EventLogQuizStore, IndexedQuizStore
+from quiz_archive import QuizArchive
+from quiz_export import EXPORT_FORMATS, PARQUET_AVAILABLE, csv_chunks, ndjson_chunks, parquet_chunks
+from quiz_stats import QuizStats
+from quiz_scheduler import ReviewScheduler, parse_timestamp, utc_now
+from quiz_cache import QuizCache, SeenQuestions
+from keyword_engine import KeywordEngine, TopicKeywordCache
+from keyword_matcher import MatcherCache
+from quiz_pool import QuizPool
+from quiz_parser import JSONArrayStreamParser, ParseStats, QuizParseError, parse_quiz_items
+from upstream import CircuitBreaker, RateLimiter, SingleFlight, UpstreamGuard
+from observability import MetricsMiddleware, Registry, configure_logging
+from shared_state import SharedState
+from prompts import KEYWORD_PROMPTS, QUIZ_PROMPTS, PromptSelector, PromptStats, PromptTemplate, get_difficulty_instruction
+from token_accounting import TokenBudget, TokenLedger, count_message_tokens, count_tokens
+from tenancy import (
+    DEFAULT_USER, LLMQuota, QuotaExceededError, UserSpace, UserSpaces, current_user_id, load_api_keys,
+    migrate_to_default_user, valid_user_id,
+)
+
 load_dotenv()
 
-app = FastAPI(title="Learning Extension API", version="1.0.0")
+# Upstream (OpenAI) tuning. Timeouts are in seconds.
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+KEYWORDS_TIMEOUT = float(os.getenv("KEYWORDS_TIMEOUT", "20"))
+QUIZ_TIMEOUT = float(os.getenv("QUIZ_TIMEOUT", "60"))
+# Model for quiz completions. QUIZ_OUTPUT_MODE is "text" (plain prompt), "json_object"
+# (JSON mode) or "json_schema" (strict structured output, needs a model that supports it)
+QUIZ_MODEL = os.getenv("OPENAI_QUIZ_MODEL", "gpt-3.5-turbo")
+QUIZ_OUTPUT_MODE = os.getenv("QUIZ_OUTPUT_MODE", "text")
+# Fewer valid questions than this triggers a follow-up request for just the missing ones
+QUIZ_MIN_QUESTIONS = int(os.getenv("QUIZ_MIN_QUESTIONS", "3"))
+QUIZ_PARSE_RETRIES = int(os.getenv("QUIZ_PARSE_RETRIES", "1"))
+# Prompt templates (see prompts.py) as "name:weight,..."; several variants split traffic
+# between them for comparison in /upstream. max_tokens for a quiz completion is sized to
+# the questions requested, never above QUIZ_MAX_TOKENS.
+QUIZ_PROMPT_VARIANTS = os.getenv("QUIZ_PROMPT_VARIANTS", "quiz-v1")
+KEYWORDS_PROMPT_VARIANTS = os.getenv("KEYWORDS_PROMPT_VARIANTS", "keywords-v1")
+QUIZ_MAX_TOKENS = int(os.getenv("QUIZ_MAX_TOKENS", "2000"))
+# /generate-quiz/batch: completion token budget per call and the estimate per quiz,
+# which together decide how many quizzes share one completion
+QUIZ_BATCH_MAX_TOKENS = int(os.getenv("QUIZ_BATCH_MAX_TOKENS", "3500"))
+QUIZ_BATCH_TOKENS_PER_QUIZ = int(os.getenv("QUIZ_BATCH_TOKENS_PER_QUIZ", "700"))
+QUIZ_BATCH_MAX_ITEMS = 20
+# /generate-keywords fan-out: topics in flight per request and deadline per topic
+KEYWORDS_FANOUT_CONCURRENCY = int(os.getenv("KEYWORDS_FANOUT_CONCURRENCY", "5"))
+KEYWORDS_TOPIC_DEADLINE = float(os.getenv("KEYWORDS_TOPIC_DEADLINE", "25"))
+# /match-keywords request limits and number of compiled keyword sets kept
+MATCH_MAX_KEYWORDS = int(os.getenv("MATCH_MAX_KEYWORDS", "5000"))
+MATCH_MAX_TEXT_CHARS = int(os.getenv("MATCH_MAX_TEXT_CHARS", "5000000"))
+MATCHER_CACHE_SIZE = int(os.getenv("MATCHER_CACHE_SIZE", "64"))
+# Retries for transient OpenAI errors (429, timeouts, 5xx) with jittered exponential backoff
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+# Account rate limits; 0 means unlimited
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
+# Consecutive failures that open the circuit breaker, and how long it stays open
+OPENAI_BREAKER_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+OPENAI_BREAKER_RESET = float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+# Logs are JSON lines tagged with the request ID unless LOG_FORMAT=text; LOG_REQUESTS=1
+# adds one line per request. METRICS_ENABLED=0 turns off request timing for /metrics.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "0") == "1"
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# History responses are serialized straight from stored dicts; HISTORY_VALIDATE=1 builds
+# and validates SavedQuiz models instead. Pages longer than HISTORY_STREAM_CHUNK quizzes
+# are streamed in chunks of that size.
+HISTORY_VALIDATE = os.getenv("HISTORY_VALIDATE", "0") == "1"
+HISTORY_STREAM_CHUNK = int(os.getenv("HISTORY_STREAM_CHUNK", "200"))
+# Completed quizzes older than ARCHIVE_AFTER_DAYS (0 = never) are moved to compressed
+# cold storage every ARCHIVE_INTERVAL seconds; they stay readable and keep counting in stats
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH = 1000
+# Quizzes written per transaction by POST /quiz-history/import
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "500"))
+# Responses of at least this many bytes are gzipped for clients that accept it; 0 disables
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+# Worker processes started by `python fastapiserver.py` (WEB_CONCURRENCY is also what
+# uvicorn and gunicorn read). With more than one, SHARED_STATE defaults to on: rate limits
+# and LLM quotas are kept in quiz_data/shared_state.db so all workers draw from the same
+# budgets. Set SHARED_STATE=1 when a process manager starts the workers itself.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE = os.getenv("SHARED_STATE", "1" if WORKERS > 1 else "0") == "1"
+
+logger = configure_logging("camel", LOG_LEVEL, json_format=(LOG_FORMAT == "json"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await quiz_pool.start()
+    archiver = asyncio.ensure_future(archive_periodically()) if ARCHIVE_AFTER_DAYS > 0 else None
+    yield
+    if archiver is not None:
+        archiver.cancel()
+    await quiz_pool.stop()
+    # Release pooled upstream connections on shutdown
+    await openai_client.close()
+    user_spaces.close()
+    quiz_cache.close()
+    topic_keyword_cache.close()
+    token_ledger.close()
+    if shared_state is not None:
+        shared_state.close()
+
+app = FastAPI(title="Learning Extension API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware to allow requests from Chrome extension
 app.add_middleware(
@@ -20,18 +141,404 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID"],
 )
 
+if GZIP_MIN_SIZE:
+    # Server-sent event streams are never compressed
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=6)
+
+# Prometheus metrics for GET /metrics
+metrics = Registry()
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status"))
+http_response_size = metrics.histogram(
+    "http_response_size_bytes", "Response body size by route template", ("route",),
+    buckets=(100, 1000, 10000, 100000, 1000000, 10000000))
+http_requests_in_flight = metrics.gauge("http_requests_in_flight", "Requests being served")
+llm_request_duration = metrics.histogram(
+    "llm_request_duration_seconds", "Upstream completion latency, including retries", ("model", "mode", "outcome"))
+llm_tokens = metrics.histogram(
+    "llm_tokens_per_call", "Tokens used per upstream completion", ("mode", "type"),
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+quiz_stage_duration = metrics.histogram(
+    "quiz_stage_duration_seconds", "Time spent parsing completions and building Question models", ("stage",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+history_operation_duration = metrics.histogram(
+    "history_operation_duration_seconds", "Quiz history load and save duration", ("operation",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+quiz_sources = metrics.counter("quiz_source_total", "Quizzes served by where their questions came from", ("source",))
+fallback_questions = metrics.counter(
+    "fallback_questions_total", "Hardcoded fallback questions or keyword sets served", ("kind", "reason"))
+
+metrics.gauge(
+    "upstream_circuit_open", "1 while the OpenAI circuit breaker is open or half-open",
+    collect=lambda: {(): 0 if upstream_guard.breaker.stats()["state"] == "closed" else 1})
+metrics.gauge(
+    "user_spaces_open", "User quiz stores currently open",
+    collect=lambda: {(): user_spaces.stats()["open"]})
+
+if METRICS_ENABLED:
+    app.add_middleware(
+        MetricsMiddleware,
+        latency=http_request_duration,
+        response_size=http_response_size,
+        in_flight=http_requests_in_flight,
+        logger=logger if LOG_REQUESTS else None,
+    )
+
 # Initialize OpenAI client
-# Make sure to set your OPENAI_API_KEY environment variable
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Make sure to set your OPENAI_API_KEY environment variable.
+# The async client shares one pooled HTTP connection pool so completions never
+# block the event loop; OPENAI_BASE_URL can point it at a local stub server.
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONCURRENCY,
+            max_keepalive_connections=OPENAI_MAX_CONCURRENCY,
+        ),
+        timeout=httpx.Timeout(QUIZ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    ),
+    # Retries are handled by upstream_guard so they respect the breaker and rate limits
+    max_retries=0,
+)
+
+# Caps the number of completions in flight at once; extra callers wait here
+# instead of piling up on the upstream API.
+openai_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# Identical keyword/quiz requests already in flight share one completion
+upstream_flights = SingleFlight()
+
+# How often quiz completions needed repairs, partial recovery or re-requests
+quiz_parse_stats = ParseStats()
 
 # Create data directory for storing quiz data
 DATA_DIR = "quiz_data"
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Budgets every worker process draws from (None with a single process)
+shared_state = SharedState(os.path.join(DATA_DIR, "shared_state.db")) if SHARED_STATE else None
+
+# Retries, rate limits and circuit breaker shared by every completion. The breaker is
+# per process: each worker notices an outage on its own first failures.
+upstream_guard = UpstreamGuard(
+    RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE, shared=shared_state),
+    CircuitBreaker(OPENAI_BREAKER_THRESHOLD, OPENAI_BREAKER_RESET),
+    max_retries=OPENAI_MAX_RETRIES,
+    base_delay=OPENAI_RETRY_BASE_DELAY,
+    max_delay=OPENAI_RETRY_MAX_DELAY,
+)
+
+# Prompt variants per completion kind, and how each variant performs
+quiz_prompts = PromptSelector(QUIZ_PROMPTS, QUIZ_PROMPT_VARIANTS)
+keyword_prompts = PromptSelector(KEYWORD_PROMPTS, KEYWORDS_PROMPT_VARIANTS)
+prompt_stats = PromptStats()
+
+# max_tokens for quiz completions, learned from the completions seen
+token_budget = TokenBudget(ceiling=QUIZ_MAX_TOKENS)
 
-QUIZ_HISTORY_FILE = os.path.join(DATA_DIR, "quiz_history.json")
+# Tokens spent per day, topic, purpose and prompt template, kept across restarts
+token_ledger = TokenLedger(os.path.join(DATA_DIR, "token_usage.db"))
+
+# Quota, ledger, cache and history writes are SQLite transactions that may wait up to
+# busy_timeout on other workers, so request handlers run them in the threadpool
+async def check_llm_quota():
+    """Raise QuotaExceededError if the current user has no completions left"""
+    user_id = current_user_id.get()
+    if user_id is not None:
+        await run_in_threadpool(llm_quota.check, user_id)
+
+async def charge_llm_quota():
+    """Count one completion against the current user's quota; background work is free"""
+    user_id = current_user_id.get()
+    if user_id is not None:
+        await run_in_threadpool(llm_quota.charge, user_id)
+
+def estimate_tokens(kwargs: Dict) -> int:
+    """Upper bound on a completion's tokens for the rate limiter"""
+    return count_message_tokens(kwargs.get("messages", [])) + kwargs.get("max_tokens", 0)
+
+def response_usage(response, messages: List[Dict]) -> Dict:
+    """
+    Prompt and completion tokens of a finished completion and why it stopped
+    ("length" means max_tokens cut it off). Counted locally if the API
+    doesn't report usage.
+    """
+    choice = response.choices[0] if response.choices else None
+    if response.usage:
+        prompt_tokens, completion_tokens = response.usage.prompt_tokens, response.usage.completion_tokens
+    else:
+        prompt_tokens = count_message_tokens(messages)
+        completion_tokens = count_tokens(choice.message.content or "") if choice else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "finish_reason": choice.finish_reason if choice else None,
+    }
+
+def account_tokens(purpose: str, topics: List[str], prompt: str, prompt_tokens: int, completion_tokens: int):
+    """Add one completion's tokens to the ledger, split evenly across the topics it served"""
+    count = len(topics)
+    try:
+        for position, topic in enumerate(topics):
+            share = lambda tokens: tokens // count + (1 if position < tokens % count else 0)
+            token_ledger.record(purpose, topic, prompt, share(prompt_tokens), share(completion_tokens))
+    except Exception as e:
+        # Accounting never fails the request it accounts for
+        logger.warning(f"Error recording token usage: {str(e)}")
+
+async def create_chat_completion(timeout: float, **kwargs):
+    """
+    Run one chat completion under the concurrency cap with a per-call timeout,
+    retried and rate limited by upstream_guard. Raises CircuitOpenError
+    without calling OpenAI while the breaker is open. The call is charged to
+    the requesting user's LLM quota.
+    """
+    await charge_llm_quota()
+
+    async def attempt():
+        async with openai_semaphore:
+            return await openai_client.chat.completions.create(timeout=timeout, **kwargs)
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await upstream_guard.call(attempt, estimate_tokens(kwargs))
+        outcome = "ok"
+    finally:
+        llm_request_duration.observe(time.perf_counter() - started, model=kwargs.get("model", ""), mode="complete", outcome=outcome)
+    if response.usage:
+        llm_tokens.observe(response.usage.prompt_tokens, mode="complete", type="prompt")
+        llm_tokens.observe(response.usage.completion_tokens, mode="complete", type="completion")
+    return response
+
+async def stream_chat_completion(timeout: float, usage: Dict, **kwargs) -> AsyncIterator[str]:
+    """
+    Stream one chat completion under the concurrency cap, yielding content as
+    it arrives. Token usage from the final chunk and the finish reason are
+    stored in usage.
+    Only opening the stream is retried; a stream that breaks midway is not.
+    Like create_chat_completion, a slot of the cap is held per attempt, not
+    across retry backoff, and the stream is read into a queue so a slow
+    client doesn't hold one either.
+    """
+    await charge_llm_quota()
+    estimated = estimate_tokens(kwargs)
+
+    async def attempt():
+        await openai_semaphore.acquire()
+        try:
+            return await openai_client.chat.completions.create(
+                timeout=timeout, stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+        except BaseException:
+            openai_semaphore.release()
+            raise
+
+    content: asyncio.Queue = asyncio.Queue()
+
+    async def read(stream):
+        """Read the opened stream to the end into the queue"""
+        try:
+            async with stream:
+                async for chunk in stream:
+                    if chunk.usage:
+                        usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                        usage["completion_tokens"] = chunk.usage.completion_tokens
+                        usage["total_tokens"] = chunk.usage.total_tokens
+                        llm_tokens.observe(chunk.usage.prompt_tokens, mode="stream", type="prompt")
+                        llm_tokens.observe(chunk.usage.completion_tokens, mode="stream", type="completion")
+                    if chunk.choices and chunk.choices[0].finish_reason:
+                        usage["finish_reason"] = chunk.choices[0].finish_reason
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content.put_nowait(chunk.choices[0].delta.content)
+            content.put_nowait(None)
+        except Exception as e:
+            content.put_nowait(e)
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        stream = await upstream_guard.call(attempt, estimated)
+        reader = asyncio.create_task(read(stream))
+        # The slot is given back when reading ends, even if it never got to start
+        reader.add_done_callback(lambda _: openai_semaphore.release())
+        try:
+            while True:
+                text = await content.get()
+                if text is None:
+                    break
+                if isinstance(text, Exception):
+                    raise text
+                yield text
+        finally:
+            if not reader.done():
+                # The client went away: stop reading and close the stream
+                reader.cancel()
+                await asyncio.gather(reader, return_exceptions=True)
+                await stream.close()
+        outcome = "ok"
+    finally:
+        llm_request_duration.observe(time.perf_counter() - started, model=kwargs.get("model", ""), mode="stream", outcome=outcome)
+    if usage.get("total_tokens"):
+        await upstream_guard.limiter.offload(upstream_guard.limiter.settle, estimated, usage["total_tokens"])
+
+# Every user's history lives under quiz_data/users/<user_id>/. A pre-tenancy
+# install's history is moved to the default user on first start.
+USERS_DIR = os.path.join(DATA_DIR, "users")
+moved_files = migrate_to_default_user(DATA_DIR, USERS_DIR)
+if moved_files:
+    logger.info(f"Moved existing quiz history ({', '.join(moved_files)}) to user {DEFAULT_USER!r}")
+
+# "sqlite" (default) or "eventlog" (append-only log + snapshot, see quiz_store.py).
+# Only sqlite can be shared by several worker processes.
+QUIZ_STORE_BACKEND = os.getenv("QUIZ_STORE_BACKEND", "sqlite")
+if SHARED_STATE and QUIZ_STORE_BACKEND == "eventlog":
+    raise RuntimeError("QUIZ_STORE_BACKEND=eventlog supports a single worker process only")
+
+def open_quiz_store(user_dir: str):
+    """One user's quiz store in the configured backend"""
+    if QUIZ_STORE_BACKEND == "eventlog":
+        return EventLogQuizStore(
+            user_dir,
+            fsync_batch=int(os.getenv("EVENTLOG_FSYNC_BATCH", "32")),
+            fsync_interval=float(os.getenv("EVENTLOG_FSYNC_INTERVAL", "1.0")),
+            compact_after=int(os.getenv("EVENTLOG_COMPACT_AFTER", "10000")),
+        )
+    return QuizStore(os.path.join(user_dir, "quiz_history.db"))
+
+def open_user_space(user_id: str, user_dir: str) -> UserSpace:
+    """
+    Open a user's store and archive with its own observers: running
+    /quiz-stats aggregates, questions already shown (so the quiz cache avoids
+    repeats) and SM-2 review state. QUIZ_INDEX_MAX_BODIES caps how many of the user's
+    quizzes keep their questions in memory (0 = all of them).
+    """
+    stats = QuizStats()
+    seen = SeenQuestions()
+    scheduler = ReviewScheduler()
+    with history_operation_duration.time(operation="open"):
+        store = IndexedQuizStore(
+            open_quiz_store(user_dir),
+            max_bodies=int(os.getenv("QUIZ_INDEX_MAX_BODIES", "0")),
+            observers=[stats, seen, scheduler],
+            archive=QuizArchive(os.path.join(user_dir, "quiz_archive.db")),
+        )
+    # Legacy whole-file history, imported into the store on first open
+    history_file = os.path.join(user_dir, "quiz_history.json")
+    migrated_count = store.migrate_from_json(history_file)
+    if migrated_count:
+        logger.info(f"Migrated {migrated_count} quizzes from {history_file} to the {QUIZ_STORE_BACKEND} store")
+    return UserSpace(user_id, store, stats, seen, scheduler)
+
+def archive_completed(user: UserSpace, older_than_days: float) -> int:
+    """Move the user's quizzes completed more than older_than_days ago to the archive"""
+    cutoff = utc_now() - timedelta(days=older_than_days)
+    archived_at = datetime.now().isoformat()
+
+    def finished(meta: Dict) -> bool:
+        completed_at = parse_timestamp(meta.get("completed_at"))
+        return completed_at is not None and completed_at < cutoff
+
+    moved = 0
+    while True:
+        quiz_ids = user.store.page_ids(ARCHIVE_BATCH, predicate=finished)
+        count = user.store.archive_quizzes(quiz_ids, archived_at) if quiz_ids else 0
+        moved += count
+        if count < ARCHIVE_BATCH:
+            return moved
+
+async def archive_periodically():
+    """Archive every user's old completed quizzes now and every ARCHIVE_INTERVAL seconds"""
+    while True:
+        for user_id in sorted(os.listdir(USERS_DIR)):
+            if not valid_user_id(user_id) or not os.path.isdir(os.path.join(USERS_DIR, user_id)):
+                continue
+            try:
+                space = await user_spaces.acquire(user_id)
+                try:
+                    moved = await run_in_threadpool(archive_completed, space, ARCHIVE_AFTER_DAYS)
+                finally:
+                    user_spaces.release(space)
+                if moved:
+                    logger.info(f"Archived {moved} completed quizzes", extra={"user_id": user_id})
+            except Exception as e:
+                logger.error(f"Error archiving quizzes: {str(e)}", extra={"user_id": user_id})
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+# Open user stores; idle ones beyond USER_SPACES_MAX_OPEN are closed
+user_spaces = UserSpaces(
+    USERS_DIR,
+    open_user_space,
+    max_open=int(os.getenv("USER_SPACES_MAX_OPEN", "64")),
+    idle_seconds=float(os.getenv("USER_SPACES_IDLE_SECONDS", "60")),
+)
+
+# Optional {"<api key>": {"user_id": ..., "llm_calls_per_hour": ..., "llm_calls_per_day": ...}}.
+# When it exists every request needs an X-API-Key from it.
+API_KEYS = load_api_keys(os.getenv("API_KEYS_FILE", os.path.join(DATA_DIR, "api_keys.json")))
+
+# Completions per user per hour/day (0 = unlimited); api_keys.json entries can override them
+llm_quota = LLMQuota(
+    per_hour=int(os.getenv("USER_LLM_CALLS_PER_HOUR", "0")),
+    per_day=int(os.getenv("USER_LLM_CALLS_PER_DAY", "0")),
+    overrides={entry["user_id"]: entry for entry in API_KEYS.values()},
+    shared=shared_state,
+)
+
+# Bump when the quiz output format changes so cached questions in the old format aren't
+# reused. Prompt templates (quiz-v1, quiz-v2, ...) produce the same format and share the cache.
+QUIZ_FORMAT_VERSION = "quiz-v1"
+
+# "unseen" serves cached questions the user hasn't seen, "any" allows repeats, "off" disables the cache
+QUIZ_CACHE_POLICY = os.getenv("QUIZ_CACHE_POLICY", "unseen")
+quiz_cache = QuizCache(
+    os.path.join(DATA_DIR, "quiz_cache.db"),
+    QUIZ_FORMAT_VERSION,
+    ttl=float(os.getenv("QUIZ_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "256")),
+    max_disk_entries=int(os.getenv("QUIZ_CACHE_MAX_DISK_ENTRIES", "10000")),
+)
+
+# Offline keywords: the bundled topic index, an optional extra index file and an optional
+# folder of .txt/.md documents. Only topics none of them know go to OpenAI.
+keyword_engine = KeywordEngine(
+    [os.path.join(os.path.dirname(os.path.abspath(__file__)), "keyword_index.json"), os.getenv("KEYWORD_INDEX_FILE")],
+    corpus_dir=os.getenv("KEYWORD_CORPUS_DIR"),
+)
+
+# Keywords for every topic seen so far, local or from OpenAI, kept across restarts
+topic_keyword_cache = TopicKeywordCache(
+    os.path.join(DATA_DIR, "topic_keywords.db"),
+    ttl=float(os.getenv("TOPIC_KEYWORDS_TTL", "0")),
+)
+
+# Compiled Aho-Corasick automata for /match-keywords, keyed by keyword set
+keyword_matchers = MatcherCache(MATCHER_CACHE_SIZE)
+
+# Background pool of ready quizzes for the topics each user asked about; QUIZ_POOL_SIZE=0
+# disables it. QUIZ_POOL_TOKENS_PER_HOUR is per user, and a user's topic is dropped after
+# QUIZ_POOL_TOPIC_TTL seconds without a request.
+# Pooled quizzes live in one process's memory, so the pool is off with shared state:
+# every worker would otherwise refill its own pool and multiply the token spend.
+# The lambda defers lookup of generate_pool_quiz, which is defined further down.
+QUIZ_POOL_SIZE = int(os.getenv("QUIZ_POOL_SIZE", "0"))
+if SHARED_STATE and QUIZ_POOL_SIZE:
+    logger.warning("QUIZ_POOL_SIZE is ignored with several worker processes; the quiz pool is disabled")
+    QUIZ_POOL_SIZE = 0
+quiz_pool = QuizPool(
+    lambda topic, keywords, difficulty: generate_pool_quiz(topic, keywords, difficulty),
+    os.path.join(DATA_DIR, "tracked_topics.json"),
+    size=QUIZ_POOL_SIZE,
+    low_watermark=int(os.getenv("QUIZ_POOL_LOW_WATERMARK", "1")),
+    workers=int(os.getenv("QUIZ_POOL_WORKERS", "2")),
+    tokens_per_hour=int(os.getenv("QUIZ_POOL_TOKENS_PER_HOUR", "20000")),
+    difficulties=os.getenv("QUIZ_POOL_DIFFICULTIES", "small,medium,big").split(","),
+    topic_ttl=float(os.getenv("QUIZ_POOL_TOPIC_TTL", str(7 * 24 * 3600))),
+    default_user=DEFAULT_USER,
+)
 
 # Pydantic models for request/response validation
 class LearningTopicsRequest(BaseModel):
@@ -39,6 +546,9 @@ class LearningTopicsRequest(BaseModel):
 
 class KeywordsByTopicResponse(BaseModel):
     keywords_by_topic: Dict[str, List[str]]
+    fallback_topics: List[str] = []  # Topics that got fallback keywords
+    keyword_sources: Dict[str, str] = {}  # "cache", "local", "openai" or "fallback" per topic
+    topic_errors: Dict[str, str] = {}  # Why each fallback topic failed
 
 class QuizRequest(BaseModel):
     topic: str  # The topic to generate quiz for
@@ -55,12 +565,70 @@ class Question(BaseModel):
     keyword: str
     difficulty: str = "medium"
 
+# Structured-output schema for QUIZ_OUTPUT_MODE=json_schema
+QUIZ_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    **{field: {"type": "string"} for field in ("question", "choice1", "choice2", "choice3", "choice4", "keyword", "difficulty")},
+                    "correct": {"type": "string", "enum": ["A", "B", "C", "D"]},
+                },
+                "required": ["question", "choice1", "choice2", "choice3", "choice4", "correct", "keyword", "difficulty"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+# The same for /generate-quiz/batch: {"quizzes": [{"item": 1, "questions": [...]}, ...]}
+QUIZ_BATCH_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "quizzes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"item": {"type": "integer"}, "questions": QUIZ_JSON_SCHEMA["properties"]["questions"]},
+                "required": ["item", "questions"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["quizzes"],
+    "additionalProperties": False,
+}
+
 class QuizResponse(BaseModel):
     topic: str
     questions: List[Question]
     generated_at: str
     quiz_id: str  # Add unique ID for each quiz
 
+class BatchQuizRequest(BaseModel):
+    items: List[QuizRequest]  # One entry per quiz to generate
+
+class BatchQuizResponse(BaseModel):
+    quizzes: List[QuizResponse]  # Same order as the request items
+    completions: int  # Batched OpenAI calls made for this request
+
+class MatchKeywordsRequest(BaseModel):
+    topics: Dict[str, List[str]]  # Topic name -> tracked keywords
+    texts: List[str]  # Page text chunks, each scanned once
+    case_sensitive: bool = False
+    whole_word: bool = True  # "learn" doesn't match inside "learning"
+
+class MatchKeywordsResponse(BaseModel):
+    matches: Dict[str, Dict[str, int]]  # Topic -> keyword -> occurrences, only keywords found
+    total_matches: int
+    automaton_key: str  # Hash of the keyword set and options
+    automaton_cached: bool  # False when this request compiled it
+
 class UserAnswer(BaseModel):
     question_index: int
     selected_answer: str  # "A", "B", "C", or "D"
@@ -83,171 +651,456 @@ class SavedQuiz(BaseModel):
     completed_at: Optional[str] = None
     score: Optional[int] = None
     total_questions: int
+    usage: Optional[Dict[str, Any]] = None  # Source, prompt template and tokens of the completions behind it
+
+class DueKeyword(BaseModel):
+    topic: str
+    keyword: str
+    due_at: str
+    overdue_days: float
+    interval_days: float  # Current SM-2 interval
+    easiness: float  # SM-2 easiness factor; lower means harder for the user
+    repetitions: int  # Successful reviews in a row
+    reviews: int
+    last_reviewed: Optional[str] = None  # None for keywords never answered yet
+    last_quality: Optional[int] = None  # 0-5 grade of the last review
+    priority: float  # How far past due relative to the interval
+
+class DueKeywordsResponse(BaseModel):
+    due: List[DueKeyword]  # Most urgent first
+    total_due: int
 
 class QuizHistoryResponse(BaseModel):
     quizzes: List[SavedQuiz]
-    total_count: int
+    total_count: int  # Matching quizzes across all pages
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to get the next page
+
+def saved_quiz_from_dict(quiz_data: Dict) -> SavedQuiz:
+    """Convert a stored quiz dict back to a SavedQuiz model"""
+    return SavedQuiz(
+        quiz_id=quiz_data.get("quiz_id", ""),
+        topic=quiz_data.get("topic", ""),
+        keyword=quiz_data.get("keyword", ""),
+        questions=[Question(**q) for q in quiz_data.get("questions", [])],
+        user_answers=[UserAnswer(**a) for a in quiz_data.get("user_answers", [])],
+        generated_at=quiz_data.get("generated_at", ""),
+        completed_at=quiz_data.get("completed_at"),
+        score=quiz_data.get("score"),
+        total_questions=quiz_data.get("total_questions", 0),
+        usage=quiz_data.get("usage"),
+    )
+
+# SavedQuiz fields and their defaults, for serializing stored quizzes without building models
+SAVED_QUIZ_DEFAULTS = {
+    "quiz_id": "", "topic": "", "keyword": "", "questions": [], "user_answers": [],
+    "generated_at": "", "completed_at": None, "score": None, "total_questions": 0, "usage": None,
+}
 
-def load_quiz_history() -> List[Dict]:
-    """Load quiz history from JSON file"""
+def saved_quiz_fields(quiz_data: Dict) -> Dict:
+    """
+    A stored quiz shaped like SavedQuiz. Questions and answers were validated
+    when they were saved, so they are passed through as stored.
+    """
+    return {field: quiz_data.get(field, default) for field, default in SAVED_QUIZ_DEFAULTS.items()}
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+def history_etag(user: UserSpace, *request_parts) -> str:
+    """Weak ETag for a history response: changes whenever the user's history does"""
+    raw = json.dumps([user.user_id, user.store.version_tag, request_parts], default=str)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:24]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison: W/"x" and "x" match
+    opaque = lambda tag: tag[2:] if tag.startswith("W/") else tag
+    candidates = [opaque(candidate.strip()) for candidate in if_none_match.split(",")]
+    return "*" in candidates or opaque(etag) in candidates
+
+def json_bytes_response(content: bytes, etag: str) -> Response:
+    return Response(content, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def encode_history_cursor(generated_at: str, quiz_id: str) -> str:
+    """Opaque /quiz-history cursor pointing just past the given quiz"""
+    return base64.urlsafe_b64encode(json.dumps([generated_at, quiz_id]).encode()).decode()
+
+def decode_history_cursor(cursor: str):
     try:
-        if os.path.exists(QUIZ_HISTORY_FILE):
-            with open(QUIZ_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        print(f"Error loading quiz history: {str(e)}")
-        return []
+        generated_at, quiz_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(generated_at), str(quiz_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-def save_quiz_history(quizzes: List[Dict]):
-    """Save quiz history to JSON file"""
+def save_quiz_to_history(user: UserSpace, quiz_data: Dict):
+    """Add a new quiz to the user's history"""
     try:
-        with open(QUIZ_HISTORY_FILE, 'w') as f:
-            json.dump(quizzes, f, indent=2)
+        with history_operation_duration.time(operation="add"):
+            user.store.add(quiz_data)
     except Exception as e:
-        print(f"Error saving quiz history: {str(e)}")
+        logger.error(f"Error saving quiz history: {str(e)}", extra={"user_id": user.user_id})
 
-def save_quiz_to_history(quiz_data: Dict):
-    """Add a new quiz to the history"""
-    history = load_quiz_history()
-    history.append(quiz_data)
-    save_quiz_history(history)
+def save_generated_quiz(user: UserSpace, quiz_id: str, request: QuizRequest, questions: List[Question], generated_at: str,
+                        usage: Optional[Dict] = None):
+    """Create the history entry for a newly generated quiz"""
+    save_quiz_to_history(user, build_quiz_record(quiz_id, request, questions, generated_at, usage))
 
-def update_quiz_submission(quiz_id: str, submission: QuizSubmission):
+def build_quiz_record(quiz_id: str, request: QuizRequest, questions: List[Question], generated_at: str,
+                      usage: Optional[Dict] = None) -> Dict:
+    """History entry for a newly generated quiz, with the token usage of its completions"""
+    return {
+        "quiz_id": quiz_id,
+        "topic": request.topic,
+        "keyword": request.keywords[0] if request.keywords else "general",  # Use first keyword as trigger
+        "questions": [question.dict() for question in questions],
+        "user_answers": [],  # Will be filled when user submits answers
+        "generated_at": generated_at,
+        "completed_at": None,
+        "score": None,
+        "total_questions": len(questions),
+        "usage": usage,
+    }
+
+def update_quiz_submission(user: UserSpace, quiz_id: str, submission: QuizSubmission) -> bool:
     """Update quiz with user answers and completion data"""
-    history = load_quiz_history()
-    
-    for quiz in history:
-        if quiz.get('quiz_id') == quiz_id:
-            quiz['user_answers'] = [answer.dict() for answer in submission.user_answers]
-            quiz['completed_at'] = submission.completed_at
-            quiz['score'] = sum(1 for answer in submission.user_answers if answer.is_correct)
-            break
-    
-    save_quiz_history(history)
+    with history_operation_duration.time(operation="update"):
+        return user.store.update(quiz_id, {
+            'user_answers': [answer.dict() for answer in submission.user_answers],
+            'completed_at': submission.completed_at,
+            'score': sum(1 for answer in submission.user_answers if answer.is_correct)
+        })
 
-async def generate_keywords_with_openai(topic: str) -> List[str]:
+def fallback_keywords(topic: str) -> List[str]:
+    """Basic keywords used when OpenAI can't produce any for a topic"""
+    fallback_questions.inc(kind="keywords", reason="upstream")
+    return [f"{topic}_concept", f"{topic}_basics", f"{topic}_fundamentals"]
+
+async def request_keywords_from_openai(topic: str) -> List[str]:
     """
-    Generate relevant keywords for a given topic using OpenAI API.
+    Ask OpenAI for keywords for a topic. Errors are raised to the caller.
+    Identical concurrent requests share one completion.
     """
-    try:
-        prompt = f"""Generate a list of 10-15 important keywords or key terms that someone learning about "{topic}" should encounter and understand. 
+    return await upstream_flights.run("keywords", topic, lambda: complete_keywords(topic))
 
-These keywords should be:
-- Core concepts, terms, or technologies related to {topic}
-- Things that would commonly appear in articles, tutorials, or discussions about {topic}
-- Fundamental building blocks of knowledge in this area
+async def complete_keywords(topic: str) -> List[str]:
+    template = keyword_prompts.choose()
+    messages = template.messages(topic=topic)
+    started = time.perf_counter()
+    response = await create_chat_completion(
+        KEYWORDS_TIMEOUT,
+        model="gpt-3.5-turbo",
+        messages=messages,
+        max_tokens=200,
+        temperature=0.7
+    )
+    usage = response_usage(response, messages)
+    await run_in_threadpool(account_tokens, "keywords", [topic], template.name, usage["prompt_tokens"], usage["completion_tokens"])
 
-Return only the keywords as a simple comma-separated list, no explanations or numbering.
+    keywords_text = (response.choices[0].message.content or "").strip()
 
-Example format: keyword1, keyword2, keyword3, etc."""
+    # Parse the comma-separated keywords
+    keywords = [keyword.strip() for keyword in keywords_text.split(',')]
+    keywords = [k for k in keywords if k]  # Remove empty strings
+    prompt_stats.record(template.name, time.perf_counter() - started, usage["prompt_tokens"],
+                        usage["completion_tokens"], parsed=bool(keywords), items=min(len(keywords), 15),
+                        truncated=usage["finish_reason"] == "length")
 
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert educator who creates comprehensive learning keyword lists."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200,
-            temperature=0.7
-        )
-        
-        keywords_text = response.choices[0].message.content.strip()
-        
-        # Parse the comma-separated keywords
-        keywords = [keyword.strip() for keyword in keywords_text.split(',')]
-        keywords = [k for k in keywords if k]  # Remove empty strings
-        
-        return keywords[:15]  # Limit to 15 keywords max
-        
+    if not keywords:
+        raise ValueError("OpenAI returned no keywords")
+
+    return keywords[:15]  # Limit to 15 keywords max
+
+async def resolve_keywords(topic: str) -> Tuple[List[str], str]:
+    """
+    Keywords for a topic and where they came from: the persistent topic
+    cache, the local keyword engine, or (for unknown topics) OpenAI.
+    Errors from OpenAI are raised to the caller.
+    """
+    cached = await run_in_threadpool(topic_keyword_cache.get, topic)
+    if cached:
+        return cached, "cache"
+    # A corpus lookup ranks phrases across documents; keep it off the event loop
+    local = await run_in_threadpool(keyword_engine.keywords, topic)
+    if local:
+        await run_in_threadpool(topic_keyword_cache.put, topic, local, "local")
+        return local, "local"
+    await check_llm_quota()
+    keywords = await request_keywords_from_openai(topic)
+    await run_in_threadpool(topic_keyword_cache.put, topic, keywords, "openai")
+    return keywords, "openai"
+
+async def generate_keywords_with_openai(topic: str) -> List[str]:
+    """
+    Generate relevant keywords for a given topic, locally if possible, else using OpenAI API.
+    """
+    try:
+        keywords, _ = await resolve_keywords(topic)
+        return keywords
     except Exception as e:
-        print(f"Error generating keywords for {topic}: {str(e)}")
+        logger.warning(f"Error generating keywords for {topic}: {str(e)}")
         # Fallback to basic keywords if OpenAI fails
-        return [f"{topic}_concept", f"{topic}_basics", f"{topic}_fundamentals"]
+        return fallback_keywords(topic)
 
-async def generate_quiz_with_openai(topic: str, keywords: List[str], difficulty: str = "medium") -> List[Question]:
+def requested_questions(count: str) -> int:
+    """Most questions a count like "3-5" or "2" asks for"""
+    return int(count.split("-")[-1])
+
+def quiz_response_format(name: str = "quiz", schema: Optional[Dict] = None) -> Optional[Dict]:
+    """response_format for quiz completions according to QUIZ_OUTPUT_MODE"""
+    if QUIZ_OUTPUT_MODE == "json_object":
+        return {"type": "json_object"}
+    if QUIZ_OUTPUT_MODE == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema or QUIZ_JSON_SCHEMA}}
+    return None
+
+def question_from_data(q_data: Dict, keywords: List[str], difficulty: str) -> Question:
+    """Validate one question object from the model's JSON"""
+    # Ensure the keyword exists in our keyword list
+    keyword = q_data.get("keyword", keywords[0] if keywords else "general")
+    if keyword not in keywords:
+        keyword = keywords[0] if keywords else "general"
+
+    return Question(
+        question=q_data["question"],
+        choice1=q_data["choice1"],
+        choice2=q_data["choice2"],
+        choice3=q_data["choice3"],
+        choice4=q_data["choice4"],
+        correct=q_data["correct"],
+        keyword=keyword,
+        difficulty=q_data.get("difficulty", difficulty)
+    )
+
+async def request_quiz_from_openai(topic: str, keywords: List[str], difficulty: str = "medium") -> Tuple[List[Question], Dict]:
     """
-    Generate multiple choice quiz questions based on topic and keywords using OpenAI API.
+    Ask OpenAI for quiz questions. Returns the questions and the token usage
+    of the completions that produced them. Errors are raised to the caller.
+    Identical concurrent requests share one completion, and its questions
+    are added to the quiz cache once; callers that joined a completion
+    already in flight get its usage with zero tokens, so the spend is
+    counted against one quiz only.
     """
-    try:
-        keywords_str = ", ".join(keywords)
-        
-        # Set difficulty instruction based on input
-        if difficulty == "big":
-            difficulty_instruction = "The question should be hard/difficult and take some thought to solve. Give some context for the question."
-        elif difficulty == "small":
-            difficulty_instruction = "The question should be simple and easy to answer."
-        else:  # medium
-            difficulty_instruction = "The question should be medium difficulty."
-        
-        prompt = f"""You are a kind and curious tutor that helps the user learn {topic}.
-You never give the full answer immediately. Create multiple choice quiz questions about "{topic}" focusing on these keywords: {keywords_str}
+    # Checked before joining a flight so one user's quota error isn't shared with others
+    await check_llm_quota()
+    key = (topic, tuple(keywords), difficulty)
+    joined = upstream_flights.in_flight("quiz", key)
+    questions, usage = await upstream_flights.run(
+        "quiz", key, lambda: complete_and_cache_quiz(topic, keywords, difficulty)
+    )
+    if joined:
+        usage = dict(usage, prompt_tokens=0, completion_tokens=0, coalesced=True)
+    return questions, usage
+
+async def complete_quiz_questions(topic: str, keywords: List[str], difficulty: str, template: PromptTemplate,
+                                  count: str = "3-5", avoid: List[str] = ()) -> Tuple[List[Question], Dict]:
+    """
+    Run one quiz completion and keep every item that validates as a Question,
+    even when the rest of the output is malformed or cut off. max_tokens is
+    sized to the questions requested; returns the questions and token usage.
+    """
+    extra = {}
+    response_format = quiz_response_format()
+    if response_format:
+        extra["response_format"] = response_format
+    messages = template.messages(topic=topic, keywords=keywords, difficulty=difficulty, count=count,
+                                 avoid=avoid, wrap_object=QUIZ_OUTPUT_MODE != "text")
+    started = time.perf_counter()
+    response = await create_chat_completion(
+        QUIZ_TIMEOUT,
+        model=QUIZ_MODEL,
+        messages=messages,
+        max_tokens=token_budget.max_tokens(template, difficulty, requested_questions(count)),
+        temperature=0.7,
+        **extra
+    )
+    usage = response_usage(response, messages)
+    await run_in_threadpool(account_tokens, "quiz", [topic], template.name, usage["prompt_tokens"], usage["completion_tokens"])
+
+    with quiz_stage_duration.time(stage="parse"):
+        questions_data, outcome = parse_quiz_items(response.choices[0].message.content or "")
+
+    questions = []
+    with quiz_stage_duration.time(stage="validate"):
+        for q_data in questions_data:
+            try:
+                questions.append(question_from_data(q_data, keywords, difficulty))
+            except (KeyError, TypeError, ValidationError) as e:
+                logger.warning(f"Skipping invalid question for {topic}: {str(e)}")
+    quiz_parse_stats.record(outcome, valid=len(questions), invalid=len(questions_data) - len(questions))
+
+    truncated = usage["finish_reason"] == "length"
+    token_budget.observe(template, difficulty, usage["completion_tokens"], len(questions), truncated)
+    prompt_stats.record(template.name, time.perf_counter() - started, usage["prompt_tokens"],
+                        usage["completion_tokens"], parsed=outcome in ("clean", "repaired") and bool(questions),
+                        items=len(questions), truncated=truncated)
+    return questions, usage
+
+async def complete_and_cache_quiz(topic: str, keywords: List[str], difficulty: str) -> Tuple[List[Question], Dict]:
+    template = quiz_prompts.choose()
+    questions, completion = await complete_quiz_questions(topic, keywords, difficulty, template)
+    usage = {"prompt": template.name, "prompt_tokens": completion["prompt_tokens"],
+             "completion_tokens": completion["completion_tokens"], "completions": 1}
+
+    # Ask again only for the questions lost to malformed or truncated output
+    for _ in range(QUIZ_PARSE_RETRIES):
+        if not questions or len(questions) >= QUIZ_MIN_QUESTIONS:
+            break
+        missing = QUIZ_MIN_QUESTIONS - len(questions)
+        try:
+            more, completion = await complete_quiz_questions(
+                topic, keywords, difficulty, template, count=str(missing), avoid=[q.question for q in questions]
+            )
+        except Exception as e:
+            logger.warning(f"Error re-requesting {missing} questions for {topic}: {str(e)}")
+            break
+        known = {q.question for q in questions}
+        more = [q for q in more if q.question not in known][:missing]
+        quiz_parse_stats.record_rerequest(len(more))
+        questions += more
+        usage["prompt_tokens"] += completion["prompt_tokens"]
+        usage["completion_tokens"] += completion["completion_tokens"]
+        usage["completions"] += 1
+
+    if not questions:
+        raise QuizParseError("No valid questions in OpenAI response")
+
+    if QUIZ_CACHE_POLICY != "off":
+        await run_in_threadpool(quiz_cache.store, topic, keywords, difficulty, [q.dict() for q in questions],
+                                usage["prompt_tokens"] + usage["completion_tokens"])
+    return questions, usage
+
+# Name the batch prompt is recorded under in the token ledger
+QUIZ_BATCH_PROMPT = "batch-v1"
+
+def build_batch_quiz_prompt(items: List[QuizRequest], wrap_object: bool = False) -> str:
+    """One prompt asking for several quizzes, sharing the instruction block"""
+    requests = "\n".join(
+        f'{number}. Topic: "{item.topic}" | Keywords: {", ".join(item.keywords)} | '
+        f'Difficulty: {item.difficulty} ({get_difficulty_instruction(item.difficulty)})'
+        for number, item in enumerate(items, start=1)
+    )
+
+    wrap_instruction = ""
+    if wrap_object:
+        wrap_instruction = '\n- Wrap the array in a JSON object under a "quizzes" key: {"quizzes": [...]}'
 
-{difficulty_instruction}
+    return f"""You are a kind and curious tutor that helps the user learn.
+You never give the full answer immediately. Create multiple choice quiz questions for each of these numbered quiz requests, focusing on that request's keywords:
 
-Generate 3-5 multiple choice questions. Each question should have 4 answer choices.
+Quiz requests:
+{requests}
 
-Format your response as a JSON array like this:
+For each request generate 3-5 multiple choice questions. Each question should have 4 answer choices.
+
+Format your response as a JSON array with one object per request, like this:
 [
   {{
-    "question": "The quiz question text here?",
-    "choice1": "First answer option text",
-    "choice2": "Second answer option text", 
-    "choice3": "Third answer option text",
-    "choice4": "Fourth answer option text",
-    "correct": "A",
-    "keyword": "relevant_keyword",
-    "difficulty": "{difficulty}"
+    "item": 1,
+    "questions": [
+      {{
+        "question": "The quiz question text here?",
+        "choice1": "First answer option text",
+        "choice2": "Second answer option text",
+        "choice3": "Third answer option text",
+        "choice4": "Fourth answer option text",
+        "correct": "A",
+        "keyword": "relevant_keyword",
+        "difficulty": "small, medium or big, as requested"
+      }},
+      ...
+    ]
   }},
   ...
 ]
 
 Important:
+- Every request number must appear exactly once as "item"
 - The question should test understanding of the keyword in context
 - choice1 through choice4 should contain ONLY the answer text (no A, B, C, D labels)
 - correct should be the letter (A, B, C, or D) of the correct answer
 - choice1 corresponds to A, choice2 to B, choice3 to C, choice4 to D
 - Make the incorrect options plausible but clearly wrong
-- Questions should be educational and test real understanding"""
+- Questions should be educational and test real understanding{wrap_instruction}"""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert educator who creates comprehensive multiple choice quizzes. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        
-        questions_json = response.choices[0].message.content.strip()
-        
-        # Parse the JSON response
-        questions_data = json.loads(questions_json)
-        
-        questions = []
-        for q_data in questions_data:
-            # Ensure the keyword exists in our keyword list
-            keyword = q_data.get("keyword", keywords[0] if keywords else "general")
-            if keyword not in keywords:
-                keyword = keywords[0] if keywords else "general"
-                
-            questions.append(Question(
-                question=q_data["question"],
-                choice1=q_data["choice1"],
-                choice2=q_data["choice2"],
-                choice3=q_data["choice3"],
-                choice4=q_data["choice4"],
-                correct=q_data["correct"],
-                keyword=keyword,
-                difficulty=q_data.get("difficulty", difficulty)
-            ))
-        
-        return questions
-        
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON from OpenAI response: {str(e)}")
-        # Fallback question
+def pack_quiz_batches(items: List[Tuple[int, QuizRequest]]) -> List[List[Tuple[int, QuizRequest]]]:
+    """Group batch items into as few completions as the per-call token budget allows"""
+    per_call = max(1, QUIZ_BATCH_MAX_TOKENS // QUIZ_BATCH_TOKENS_PER_QUIZ)
+    return [items[i:i + per_call] for i in range(0, len(items), per_call)]
+
+async def request_quiz_batch_from_openai(items: List[Tuple[int, QuizRequest]]) -> Dict[int, Tuple[List[Question], Dict]]:
+    """
+    Generate several quizzes with one completion and split the output back
+    per item, each with an even share of the completion's token usage.
+    Items the model skipped or got wrong are left out of the result.
+    Errors are raised to the caller.
+    """
+    requests = [item for _, item in items]
+    messages = [
+        {"role": "system", "content": "You are an expert educator who creates comprehensive multiple choice quizzes. Always respond with valid JSON."},
+        {"role": "user", "content": build_batch_quiz_prompt(requests, wrap_object=QUIZ_OUTPUT_MODE != "text")}
+    ]
+    extra = {}
+    response_format = quiz_response_format("quiz_batch", QUIZ_BATCH_JSON_SCHEMA)
+    if response_format:
+        extra["response_format"] = response_format
+    response = await create_chat_completion(
+        QUIZ_TIMEOUT,
+        model=QUIZ_MODEL,
+        messages=messages,
+        max_tokens=min(QUIZ_BATCH_MAX_TOKENS, QUIZ_BATCH_TOKENS_PER_QUIZ * len(requests)),
+        temperature=0.7,
+        **extra
+    )
+    completion = response_usage(response, messages)
+    await run_in_threadpool(account_tokens, "batch", [item.topic for item in requests], QUIZ_BATCH_PROMPT,
+                            completion["prompt_tokens"], completion["completion_tokens"])
+
+    batch_data, outcome = parse_quiz_items(response.choices[0].message.content or "", key="quizzes")
+
+    results = {}
+    for entry in batch_data:
+        try:
+            number = int(entry["item"])
+            if not 1 <= number <= len(items) or number - 1 in results:
+                continue
+            _, item = items[number - 1]
+            questions = [question_from_data(q, item.keywords, item.difficulty) for q in entry["questions"]]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping invalid batch quiz entry: {str(e)}")
+            continue
+        if questions:
+            results[number - 1] = questions
+    quiz_parse_stats.record(outcome, valid=sum(len(questions) for questions in results.values()))
+
+    by_index = {}
+    for number, (position, questions) in enumerate(sorted(results.items()), start=1):
+        index, item = items[position]
+        # Even shares, the last item taking what doesn't divide
+        share = lambda tokens: tokens // len(results) + (tokens % len(results) if number == len(results) else 0)
+        usage = {
+            "source": "batch",
+            "prompt": QUIZ_BATCH_PROMPT,
+            "prompt_tokens": share(completion["prompt_tokens"]),
+            "completion_tokens": share(completion["completion_tokens"]),
+            "completions": 1,
+        }
+        by_index[index] = (questions, usage)
+        if QUIZ_CACHE_POLICY != "off":
+            await run_in_threadpool(quiz_cache.store, item.topic, item.keywords, item.difficulty,
+                                    [q.dict() for q in questions], usage["prompt_tokens"] + usage["completion_tokens"])
+    return by_index
+
+def fallback_quiz(topic: str, keywords: List[str], error: Exception) -> List[Question]:
+    """Single hardcoded question used when OpenAI can't produce a quiz"""
+    if isinstance(error, (json.JSONDecodeError, QuizParseError)):
+        logger.warning(f"Error parsing JSON from OpenAI response: {str(error)}")
+        fallback_questions.inc(kind="quiz", reason="parse")
         return [Question(
             question=f"What is the most important concept to understand about {topic}?",
             choice1=f"Understanding {keywords[0] if keywords else topic}",
@@ -258,28 +1111,240 @@ Important:
             keyword=keywords[0] if keywords else "general",
             difficulty="medium"
         )]
+    logger.warning(f"Error generating quiz for {topic}: {str(error)}")
+    fallback_questions.inc(kind="quiz", reason="upstream")
+    return [Question(
+        question=f"Which of these is most relevant to {topic}?",
+        choice1=f"{keywords[0] if keywords else topic} concepts",
+        choice2="Unrelated programming concepts",
+        choice3="Hardware specifications",
+        choice4="None of the above",
+        correct="A",
+        keyword=keywords[0] if keywords else "general",
+        difficulty="medium"
+    )]
+
+async def generate_quiz_with_openai(topic: str, keywords: List[str], difficulty: str = "medium") -> List[Question]:
+    """
+    Generate multiple choice quiz questions based on topic and keywords using OpenAI API.
+    """
+    try:
+        questions, _ = await request_quiz_from_openai(topic, keywords, difficulty)
+        return questions
     except Exception as e:
-        print(f"Error generating quiz for {topic}: {str(e)}")
-        # Fallback question
-        return [Question(
-            question=f"Which of these is most relevant to {topic}?",
-            choice1=f"{keywords[0] if keywords else topic} concepts",
-            choice2="Unrelated programming concepts",
-            choice3="Hardware specifications",
-            choice4="None of the above",
-            correct="A",
-            keyword=keywords[0] if keywords else "general",
-            difficulty="medium"
-        )]
+        return fallback_quiz(topic, keywords, e)
+
+async def generate_pool_quiz(topic: str, keywords: List[str], difficulty: str) -> Tuple[List[Dict], int]:
+    """Quiz generator for the background pool; its questions also feed the quiz cache"""
+    questions, usage = await request_quiz_from_openai(topic, keywords, difficulty)
+    return [q.dict() for q in questions], usage["prompt_tokens"] + usage["completion_tokens"]
+
+def questions_without_upstream(topic: str, keywords: List[str], difficulty: str) -> Optional[List[Dict]]:
+    """
+    Pooled or cached questions to serve when OpenAI is unavailable, accepting
+    questions the user has already seen rather than a hardcoded fallback.
+    """
+    pooled = quiz_pool.take(topic, keywords, difficulty)
+    if pooled is None and QUIZ_CACHE_POLICY != "off":
+        pooled = quiz_cache.lookup(topic, keywords, difficulty, min_questions=1)
+    return pooled
+
+def served_usage(source: str) -> Dict:
+    """Usage of a quiz that cost no completion of its own"""
+    return {"source": source, "prompt": None, "prompt_tokens": 0, "completion_tokens": 0, "completions": 0}
+
+async def quiz_without_completion(topic: str, keywords: List[str], difficulty: str,
+                                  error: Exception) -> Tuple[List[Question], Dict]:
+    """
+    Questions for a quiz whose completion failed: a repeat from the pool or
+    cache unless the model's output was the problem, else the hardcoded fallback
+    """
+    if not isinstance(error, (json.JSONDecodeError, QuizParseError)):
+        stale = await run_in_threadpool(questions_without_upstream, topic, keywords, difficulty)
+        if stale is not None:
+            logger.warning(f"Serving pooled/cached quiz for {topic} while OpenAI is unavailable: {str(error)}")
+            quiz_sources.inc(source="stale")
+            return [Question(**q) for q in stale], served_usage("stale")
+    quiz_sources.inc(source="fallback")
+    return fallback_quiz(topic, keywords, error), served_usage("fallback")
+
+async def generate_quiz_questions(user: UserSpace, topic: str, keywords: List[str],
+                                  difficulty: str = "medium") -> Tuple[List[Question], Dict]:
+    """
+    Questions for a quiz: a ready quiz from the background pool if there is
+    one, else the quiz cache when it has enough questions the user hasn't
+    seen yet, else a live OpenAI completion. If OpenAI is down (or the
+    circuit breaker is open) repeats from the pool or cache are preferred
+    over the hardcoded fallback, but a user over their LLM quota gets the
+    quota error.
+    Only real completions are cached, never fallback questions.
+    Returns the questions and the usage to save with the quiz: where they
+    came from and the tokens spent on them.
+    """
+    quiz_pool.track(user.user_id, topic, keywords)
+    pooled = quiz_pool.take(topic, keywords, difficulty, seen=user.seen)
+    if pooled is not None:
+        quiz_sources.inc(source="pool")
+        return [Question(**q) for q in pooled], served_usage("pool")
+
+    if QUIZ_CACHE_POLICY != "off":
+        seen = user.seen if QUIZ_CACHE_POLICY == "unseen" else None
+        cached = await run_in_threadpool(quiz_cache.lookup, topic, keywords, difficulty, seen=seen)
+        if cached is not None:
+            quiz_sources.inc(source="cache")
+            return [Question(**q) for q in cached], served_usage("cache")
+
+    try:
+        questions, usage = await request_quiz_from_openai(topic, keywords, difficulty)
+        quiz_sources.inc(source="openai")
+        return questions, dict(usage, source="openai")
+    except QuotaExceededError:
+        raise
+    except Exception as e:
+        return await quiz_without_completion(topic, keywords, difficulty, e)
+
+async def stream_quiz_questions(user: UserSpace, topic: str, keywords: List[str], usage: Dict,
+                                difficulty: str = "medium") -> AsyncIterator[Question]:
+    """
+    Streaming counterpart of generate_quiz_questions: yields each question as
+    soon as the model has finished writing it. Pooled or cached questions are
+    yielded straight away. Falls back like generate_quiz_with_openai if the
+    model produces no usable question. What the quiz was served from and
+    the tokens it cost are stored in usage.
+    """
+    quiz_pool.track(user.user_id, topic, keywords)
+    pooled = quiz_pool.take(topic, keywords, difficulty, seen=user.seen)
+    source = "pool"
+    if pooled is None and QUIZ_CACHE_POLICY != "off":
+        seen = user.seen if QUIZ_CACHE_POLICY == "unseen" else None
+        pooled = await run_in_threadpool(quiz_cache.lookup, topic, keywords, difficulty, seen=seen)
+        source = "cache"
+    if pooled is not None:
+        usage.update(served_usage(source))
+        for q in pooled:
+            yield Question(**q)
+        return
+
+    template = quiz_prompts.choose()
+    messages = template.messages(topic=topic, keywords=keywords, difficulty=difficulty,
+                                 wrap_object=QUIZ_OUTPUT_MODE != "text")
+    extra = {}
+    response_format = quiz_response_format()
+    if response_format:
+        extra["response_format"] = response_format
+    completion = {}
+    streamed = []
+    # json_object/json_schema prompts ask for {"questions": [...]}, which the
+    # parser unwraps as it streams
+    parser = JSONArrayStreamParser(unwrap="questions")
+    questions = []
+    error = None
+    started = time.perf_counter()
+    try:
+        async for piece in stream_chat_completion(
+            QUIZ_TIMEOUT,
+            completion,
+            model=QUIZ_MODEL,
+            messages=messages,
+            max_tokens=token_budget.max_tokens(template, difficulty, requested_questions("3-5")),
+            temperature=0.7,
+            **extra
+        ):
+            streamed.append(piece)
+            for q_data in parser.feed(piece):
+                try:
+                    question = question_from_data(q_data, keywords, difficulty)
+                except (KeyError, ValidationError) as e:
+                    logger.warning(f"Skipping invalid streamed question for {topic}: {str(e)}")
+                    continue
+                questions.append(question)
+                yield question
+    except Exception as e:
+        error = e
+
+    usage.update(served_usage("fallback"))
+    if streamed or completion:
+        # A stream that broke before its usage chunk is counted locally
+        prompt_tokens = completion.get("prompt_tokens", count_message_tokens(messages))
+        completion_tokens = completion.get("completion_tokens", count_tokens("".join(streamed)))
+        await run_in_threadpool(account_tokens, "quiz", [topic], template.name, prompt_tokens, completion_tokens)
+        truncated = completion.get("finish_reason") == "length"
+        token_budget.observe(template, difficulty, completion_tokens, len(questions), truncated)
+        prompt_stats.record(template.name, time.perf_counter() - started, prompt_tokens, completion_tokens,
+                            parsed=error is None and not truncated and not parser.errors and bool(questions),
+                            items=len(questions), truncated=truncated)
+        usage.update({"prompt": template.name, "prompt_tokens": prompt_tokens,
+                      "completion_tokens": completion_tokens, "completions": 1})
+
+    if error is not None:
+        if not questions:
+            stale = await run_in_threadpool(questions_without_upstream, topic, keywords, difficulty)
+            if stale is not None:
+                usage["source"] = "stale"
+                for q in stale:
+                    yield Question(**q)
+                return
+            for question in fallback_quiz(topic, keywords, error):
+                yield question
+            return
+        logger.warning(f"Quiz stream for {topic} ended early after {len(questions)} questions: {str(error)}")
+
+    if not questions:
+        for question in fallback_quiz(topic, keywords, ValueError("No questions in streamed response")):
+            yield question
+        return
+    usage["source"] = "openai"
+    if QUIZ_CACHE_POLICY != "off":
+        await run_in_threadpool(quiz_cache.store, topic, keywords, difficulty, [q.dict() for q in questions],
+                                usage["prompt_tokens"] + usage["completion_tokens"])
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def catch_up(space: UserSpace):
+    """Apply changes other worker processes made to the user's history"""
+    if space.store.stale():
+        space.store.sync()
+
+async def get_user_space(
+    x_api_key: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+) -> AsyncIterator[UserSpace]:
+    """
+    The caller's UserSpace. With an API keys file the X-API-Key header picks
+    the user; otherwise X-User-Id does, defaulting to the default user.
+    The user is also recorded for LLM quota accounting. Changes other worker
+    processes made to the user's history are applied before the request runs.
+    """
+    if API_KEYS:
+        entry = API_KEYS.get(x_api_key or "")
+        if entry is None:
+            raise HTTPException(status_code=401, detail="Missing or unknown API key")
+        user_id = entry["user_id"]
+    else:
+        user_id = x_user_id or DEFAULT_USER
+        if not valid_user_id(user_id):
+            raise HTTPException(status_code=400, detail="Invalid user id")
+    space = await user_spaces.acquire(user_id)
+    try:
+        # Off the event loop: a write in progress holds the store's lock while
+        # it waits for other workers
+        await run_in_threadpool(catch_up, space)
+        current_user_id.set(user_id)
+        yield space
+    finally:
+        user_spaces.release(space)
 
 @app.get("/")
 async def root():
     return {"message": "Learning Extension API is running with OpenAI integration!"}
 
 @app.post("/generate-keywords", response_model=KeywordsByTopicResponse)
-async def generate_keywords(request: LearningTopicsRequest):
+async def generate_keywords(request: LearningTopicsRequest, user: UserSpace = Depends(get_user_space)):
     """
-    Generate keywords for each topic using OpenAI API.
+    Generate keywords for each topic, from the topic cache or the local
+    keyword engine when they know it and using OpenAI API otherwise.
     Returns a dictionary with topics as keys and keyword lists as values.
     """
     try:
@@ -289,19 +1354,43 @@ async def generate_keywords(request: LearningTopicsRequest):
         if not request.topics:
             raise HTTPException(status_code=400, detail="No topics provided")
         
-        keywords_by_topic = {}
-        
-        for topic in request.topics:
-            if not topic.strip():
-                continue
-                
-            keywords = await generate_keywords_with_openai(topic.strip())
-            keywords_by_topic[topic.strip()] = keywords
-        
-        if not keywords_by_topic:
+        # Unique, non-empty topics in request order
+        topics = list(dict.fromkeys(topic.strip() for topic in request.topics if topic.strip()))
+
+        if not topics:
             raise HTTPException(status_code=400, detail="No valid topics provided")
-        
-        return KeywordsByTopicResponse(keywords_by_topic=keywords_by_topic)
+
+        # Fan out concurrently, bounded and with a deadline per topic
+        fanout_semaphore = asyncio.Semaphore(KEYWORDS_FANOUT_CONCURRENCY)
+
+        async def keywords_for_topic(topic: str) -> Tuple[List[str], str]:
+            async with fanout_semaphore:
+                return await asyncio.wait_for(resolve_keywords(topic), KEYWORDS_TOPIC_DEADLINE)
+
+        results = await asyncio.gather(*(keywords_for_topic(topic) for topic in topics), return_exceptions=True)
+
+        keywords_by_topic = {}
+        keyword_sources = {}
+        fallback_topics = []
+        topic_errors = {}
+        for topic, result in zip(topics, results):
+            if isinstance(result, BaseException):
+                error = "timed out" if isinstance(result, asyncio.TimeoutError) else str(result)
+                logger.warning(f"Error generating keywords for {topic}: {error}")
+                keywords_by_topic[topic] = fallback_keywords(topic)
+                keyword_sources[topic] = "fallback"
+                fallback_topics.append(topic)
+                topic_errors[topic] = error
+            else:
+                keywords_by_topic[topic], keyword_sources[topic] = result
+                quiz_pool.track(user.user_id, topic, keywords_by_topic[topic])
+
+        return KeywordsByTopicResponse(
+            keywords_by_topic=keywords_by_topic,
+            fallback_topics=fallback_topics,
+            keyword_sources=keyword_sources,
+            topic_errors=topic_errors
+        )
     
     except HTTPException:
         raise
@@ -309,7 +1398,7 @@ async def generate_keywords(request: LearningTopicsRequest):
         raise HTTPException(status_code=500, detail=f"Error generating keywords: {str(e)}")
 
 @app.post("/generate-quiz", response_model=QuizResponse)
-async def generate_quiz(request: QuizRequest):
+async def generate_quiz(request: QuizRequest, user: UserSpace = Depends(get_user_space)):
     """
     Generate quiz questions for a specific topic and its keywords using OpenAI API.
     Each quiz is automatically saved to the history file.
@@ -327,28 +1416,15 @@ async def generate_quiz(request: QuizRequest):
         # Generate unique quiz ID
         quiz_id = str(uuid.uuid4())
         
-        # Generate questions using OpenAI
-        questions = await generate_quiz_with_openai(request.topic, request.keywords, request.difficulty)
+        # Generate questions using the quiz cache or OpenAI
+        questions, usage = await generate_quiz_questions(user, request.topic, request.keywords, request.difficulty)
         
         if not questions:
             raise HTTPException(status_code=400, detail="No questions could be generated")
         
-        # Create quiz data for saving
-        generated_at = datetime.now().isoformat()
-        quiz_data = {
-            "quiz_id": quiz_id,
-            "topic": request.topic,
-            "keyword": request.keywords[0] if request.keywords else "general",  # Use first keyword as trigger
-            "questions": [question.dict() for question in questions],
-            "user_answers": [],  # Will be filled when user submits answers
-            "generated_at": generated_at,
-            "completed_at": None,
-            "score": None,
-            "total_questions": len(questions)
-        }
-        
         # Save quiz to history
-        save_quiz_to_history(quiz_data)
+        generated_at = datetime.now().isoformat()
+        await run_in_threadpool(save_generated_quiz, user, quiz_id, request, questions, generated_at, usage)
         
         return QuizResponse(
             topic=request.topic,
@@ -362,14 +1438,185 @@ async def generate_quiz(request: QuizRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
+@app.post("/generate-quiz/stream")
+async def generate_quiz_stream(request: QuizRequest, user: UserSpace = Depends(get_user_space)):
+    """
+    Generate a quiz like /generate-quiz, streamed as Server-Sent Events so the
+    first question can be shown while the rest are still being written:
+    a `quiz` event with the quiz_id, one `question` event per validated
+    question, then `done`. The quiz is saved to history when the stream ends.
+    """
+    if not openai_client.api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+    if not request.topic.strip():
+        raise HTTPException(status_code=400, detail="No topic provided")
+
+    if not request.keywords:
+        raise HTTPException(status_code=400, detail="No keywords provided")
+
+    # Errors can't change the status once the stream has started
+    await run_in_threadpool(llm_quota.check, user.user_id)
+
+    quiz_id = str(uuid.uuid4())
+    generated_at = datetime.now().isoformat()
+    # The dependency releases the user's space before the body is streamed
+    user_spaces.retain(user)
+
+    async def events():
+        try:
+            yield sse_event("quiz", {"quiz_id": quiz_id, "topic": request.topic, "generated_at": generated_at})
+            questions = []
+            usage = {}
+            async for question in stream_quiz_questions(user, request.topic, request.keywords, usage, request.difficulty):
+                yield sse_event("question", {"index": len(questions), **question.dict()})
+                questions.append(question)
+            await run_in_threadpool(save_generated_quiz, user, quiz_id, request, questions, generated_at, usage)
+            yield sse_event("done", {"quiz_id": quiz_id, "total_questions": len(questions)})
+        finally:
+            user_spaces.release(user)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-quiz/batch", response_model=BatchQuizResponse)
+async def generate_quiz_batch(request: BatchQuizRequest, user: UserSpace = Depends(get_user_space)):
+    """
+    Generate quizzes for several (topic, keywords, difficulty) items at once.
+    Items are served from the pool or cache where possible; the rest are
+    packed into as few completions as the token budget allows and split back
+    into one quiz per item. All quizzes are saved to history in one write.
+    """
+    try:
+        if not openai_client.api_key:
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+        if not request.items:
+            raise HTTPException(status_code=400, detail="No quiz items provided")
+
+        if len(request.items) > QUIZ_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {QUIZ_BATCH_MAX_ITEMS} quiz items per batch")
+
+        for number, item in enumerate(request.items, start=1):
+            if not item.topic.strip():
+                raise HTTPException(status_code=400, detail=f"No topic provided for item {number}")
+            if not item.keywords:
+                raise HTTPException(status_code=400, detail=f"No keywords provided for item {number}")
+
+        questions_by_item: Dict[int, Tuple[List[Question], Dict]] = {}
+        pending = []
+        for index, item in enumerate(request.items):
+            quiz_pool.track(user.user_id, item.topic, item.keywords)
+            ready = quiz_pool.take(item.topic, item.keywords, item.difficulty, seen=user.seen)
+            source = "pool"
+            if ready is None and QUIZ_CACHE_POLICY != "off":
+                seen = user.seen if QUIZ_CACHE_POLICY == "unseen" else None
+                ready = await run_in_threadpool(quiz_cache.lookup, item.topic, item.keywords, item.difficulty, seen=seen)
+                source = "cache"
+            if ready is not None:
+                questions_by_item[index] = ([Question(**q) for q in ready], served_usage(source))
+            else:
+                pending.append((index, item))
+
+        batches = pack_quiz_batches(pending)
+        if batches:
+            # Each completion is charged as it is sent; refuse up front if they won't all fit
+            await run_in_threadpool(llm_quota.check, user.user_id, len(batches))
+        results = await asyncio.gather(*(request_quiz_batch_from_openai(batch) for batch in batches), return_exceptions=True)
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Error generating quiz batch of {len(batch)}: {str(result)}")
+                continue
+            questions_by_item.update(result)
+
+        # Anything the batches didn't cover is generated on its own
+        missing = [index for index, _ in pending if index not in questions_by_item]
+        singles = await asyncio.gather(*(
+            generate_quiz_questions(user, request.items[index].topic, request.items[index].keywords, request.items[index].difficulty)
+            for index in missing
+        ), return_exceptions=True)
+        quota_errors = [result for result in singles if isinstance(result, QuotaExceededError)]
+        if quota_errors and len(quota_errors) == len(request.items):
+            # Nothing was generated or spent: report the quota rather than serve fallbacks
+            raise quota_errors[0]
+        for index, result in zip(missing, singles):
+            if isinstance(result, BaseException):
+                # One item failing doesn't fail the quizzes already generated
+                item = request.items[index]
+                result = await quiz_without_completion(item.topic, item.keywords, item.difficulty, result)
+            questions_by_item[index] = result
+
+        generated_at = datetime.now().isoformat()
+        quizzes = []
+        records = []
+        for index, item in enumerate(request.items):
+            quiz_id = str(uuid.uuid4())
+            questions, usage = questions_by_item[index]
+            records.append(build_quiz_record(quiz_id, item, questions, generated_at, usage))
+            quizzes.append(QuizResponse(topic=item.topic, questions=questions, generated_at=generated_at, quiz_id=quiz_id))
+
+        # Save every quiz to history in one write
+        with history_operation_duration.time(operation="add_many"):
+            await run_in_threadpool(user.store.add_many, records)
+
+        return BatchQuizResponse(quizzes=quizzes, completions=len(batches))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating quiz batch: {str(e)}")
+
+@app.post("/match-keywords", response_model=MatchKeywordsResponse)
+async def match_keywords(request: MatchKeywordsRequest):
+    """
+    Count tracked keywords in a batch of page text chunks with one pass per
+    chunk. The keyword set is compiled into an automaton once and reused by
+    later requests with the same topics.
+    """
+    try:
+        keywords = list(dict.fromkeys(k for topic_keywords in request.topics.values() for k in topic_keywords if k.strip()))
+        if not keywords:
+            raise HTTPException(status_code=400, detail="No keywords provided")
+        if len(keywords) > MATCH_MAX_KEYWORDS:
+            raise HTTPException(status_code=400, detail=f"At most {MATCH_MAX_KEYWORDS} keywords per request")
+        if sum(len(text) for text in request.texts) > MATCH_MAX_TEXT_CHARS:
+            raise HTTPException(status_code=413, detail=f"At most {MATCH_MAX_TEXT_CHARS} characters of text per request")
+
+        key, automaton, cached = keyword_matchers.get(keywords, request.case_sensitive, request.whole_word)
+        # Scanning is CPU work; keep it off the event loop
+        found = await run_in_threadpool(automaton.counts_by_keyword, request.texts)
+
+        fold = (lambda k: " ".join(k.split())) if request.case_sensitive else (lambda k: " ".join(k.lower().split()))
+        found_by_folded = {fold(k): n for k, n in found.items()}
+        matches = {}
+        for topic, topic_keywords in request.topics.items():
+            topic_matches = {k: found_by_folded[fold(k)] for k in topic_keywords if fold(k) in found_by_folded}
+            if topic_matches:
+                matches[topic] = topic_matches
+
+        return MatchKeywordsResponse(
+            matches=matches,
+            total_matches=sum(found.values()),
+            automaton_key=key,
+            automaton_cached=cached
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error matching keywords: {str(e)}")
+
 @app.post("/submit-quiz")
-async def submit_quiz(submission: QuizSubmission):
+async def submit_quiz(submission: QuizSubmission, user: UserSpace = Depends(get_user_space)):
     """
     Submit user answers for a quiz and update the saved quiz data.
     """
     try:
         # Update the quiz with user answers
-        update_quiz_submission(submission.quiz_id, submission)
+        await run_in_threadpool(update_quiz_submission, user, submission.quiz_id, submission)
         
         return {
             "message": "Quiz submission saved successfully",
@@ -381,62 +1628,279 @@ async def submit_quiz(submission: QuizSubmission):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error submitting quiz: {str(e)}")
 
-@app.get("/quiz-history", response_model=QuizHistoryResponse)
-async def get_quiz_history():
+@app.get("/quiz-history", response_model=None, responses={200: {"model": QuizHistoryResponse}})
+async def get_quiz_history(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to get every matching quiz"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sort by generated_at"),
+    topic: Optional[str] = None,
+    keyword: Optional[str] = None,
+    completed: Optional[bool] = None,
+    since: Optional[str] = Query(None, description="Only quizzes generated at or after this ISO timestamp"),
+    until: Optional[str] = Query(None, description="Only quizzes generated before this ISO timestamp"),
+    fields: Optional[str] = Query(None, description="Comma-separated SavedQuiz fields to return, e.g. quiz_id,topic,score"),
+    user: UserSpace = Depends(get_user_space),
+    if_none_match: Optional[str] = Header(None),
+):
     """
-    Get all saved quiz history for the Flutter frontend.
-    Returns all quizzes with their questions and user responses.
+    Get the user's saved quiz history for the Flutter frontend.
+    Returns quizzes with their questions and user responses, ordered by
+    generated_at. Use limit/cursor to page, the filters to narrow results and
+    fields to fetch only some fields (quiz_id is always included); leaving
+    out questions and user_answers skips loading them entirely.
+    Responses carry an ETag; sending it back in If-None-Match gets a 304
+    while the history is unchanged.
     """
     try:
-        history_data = load_quiz_history()
-        
-        saved_quizzes = []
-        for quiz_data in history_data:
-            # Convert dict back to SavedQuiz model
-            saved_quiz = SavedQuiz(
-                quiz_id=quiz_data.get("quiz_id", ""),
-                topic=quiz_data.get("topic", ""),
-                keyword=quiz_data.get("keyword", ""),
-                questions=[Question(**q) for q in quiz_data.get("questions", [])],
-                user_answers=[UserAnswer(**a) for a in quiz_data.get("user_answers", [])],
-                generated_at=quiz_data.get("generated_at", ""),
-                completed_at=quiz_data.get("completed_at"),
-                score=quiz_data.get("score"),
-                total_questions=quiz_data.get("total_questions", 0)
+        # Parsed rather than compared as strings: a Z suffix, an offset or a
+        # missing seconds field would otherwise sort wrongly
+        since_at, until_at = parse_timestamp(since), parse_timestamp(until)
+        for timestamp, parsed in ((since, since_at), (until, until_at)):
+            if timestamp is not None and parsed is None:
+                raise HTTPException(status_code=400, detail=f"Invalid timestamp: {timestamp}")
+
+        projection = None
+        if fields is not None:
+            projection = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in projection if field not in SavedQuiz.model_fields]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+            if "quiz_id" not in projection:
+                projection.insert(0, "quiz_id")
+
+        after = decode_history_cursor(cursor) if cursor else None
+
+        etag = history_etag(user, limit, cursor, order, topic, keyword, completed, since, until, projection)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        # Topic and keyword are looked up in the index; the rest is checked per quiz
+        def matches(meta: Dict) -> bool:
+            if completed is not None and bool(meta.get("completed_at")) != completed:
+                return False
+            if since_at is None and until_at is None:
+                return True
+            generated_at = parse_timestamp(meta.get("generated_at"))
+            return generated_at is not None and (
+                (since_at is None or generated_at >= since_at) and (until_at is None or generated_at < until_at)
             )
-            saved_quizzes.append(saved_quiz)
-        
-        return QuizHistoryResponse(
-            quizzes=saved_quizzes,
-            total_count=len(saved_quizzes)
-        )
-    
+
+        has_filters = any(value is not None for value in (completed, since, until))
+        predicate = matches if has_filters else None
+        quiz_store = user.store
+        load_started = time.perf_counter()
+
+        def select_page():
+            total_count = quiz_store.count_matching(predicate, topic=topic, keyword=keyword)
+            page_size = limit or max(total_count, 1)
+            # Fetch one extra to learn whether there is a next page
+            quiz_ids = quiz_store.page_ids(page_size + 1, after=after, descending=(order == "desc"),
+                                           predicate=predicate, topic=topic, keyword=keyword)
+            next_cursor = None
+            if len(quiz_ids) > page_size:
+                quiz_ids = quiz_ids[:page_size]
+                last = quiz_store.get_meta(quiz_ids[-1])
+                next_cursor = encode_history_cursor(last.get("generated_at", ""), last["quiz_id"])
+            return total_count, quiz_ids, next_cursor
+
+        # The index and the stores are read in the threadpool: a write in
+        # progress holds their locks while it waits for other workers
+        total_count, quiz_ids, next_cursor = await run_in_threadpool(select_page)
+
+        if projection is not None:
+            needs_body = any(field in ("questions", "user_answers") for field in projection)
+
+            def project() -> bytes:
+                quizzes = []
+                for quiz_id in quiz_ids:
+                    quiz_data = quiz_store.get(quiz_id) if needs_body else quiz_store.get_meta(quiz_id)
+                    if quiz_data is not None:
+                        quizzes.append({field: quiz_data.get(field) for field in projection})
+                history_operation_duration.observe(time.perf_counter() - load_started, operation="page")
+                with quiz_stage_duration.time(stage="history_serialize"):
+                    return dumps_json({"quizzes": quizzes, "total_count": total_count, "next_cursor": next_cursor})
+
+            return json_bytes_response(await run_in_threadpool(project), etag)
+
+        if HISTORY_VALIDATE:
+            loaded = await run_in_threadpool(
+                lambda: [quiz_data for quiz_data in map(quiz_store.get, quiz_ids) if quiz_data is not None]
+            )
+            history_operation_duration.observe(time.perf_counter() - load_started, operation="page")
+            with quiz_stage_duration.time(stage="history_models"):
+                saved_quizzes = [saved_quiz_from_dict(quiz_data) for quiz_data in loaded]
+            response = QuizHistoryResponse(quizzes=saved_quizzes, total_count=total_count, next_cursor=next_cursor)
+            return json_bytes_response(response.model_dump_json().encode(), etag)
+
+        tail = b'],"total_count":' + dumps_json(total_count) + b',"next_cursor":' + dumps_json(next_cursor) + b"}"
+
+        def serialize(ids: List[str]) -> bytes:
+            quizzes = [saved_quiz_fields(quiz_data) for quiz_data in map(quiz_store.get, ids) if quiz_data is not None]
+            # Serialize the array, then drop its brackets so chunks can be joined with commas
+            return dumps_json(quizzes)[1:-1]
+
+        if len(quiz_ids) <= HISTORY_STREAM_CHUNK:
+            with quiz_stage_duration.time(stage="history_serialize"):
+                content = b'{"quizzes":[' + await run_in_threadpool(serialize, quiz_ids) + tail
+            history_operation_duration.observe(time.perf_counter() - load_started, operation="page")
+            return json_bytes_response(content, etag)
+
+        def chunks():
+            try:
+                yield b'{"quizzes":['
+                first = True
+                for start in range(0, len(quiz_ids), HISTORY_STREAM_CHUNK):
+                    chunk = serialize(quiz_ids[start:start + HISTORY_STREAM_CHUNK])
+                    if chunk:
+                        yield chunk if first else b"," + chunk
+                        first = False
+                yield tail
+            finally:
+                user_spaces.release(user)
+
+        # The dependency releases the user's space before the body is streamed
+        user_spaces.retain(user)
+
+        # Large pages are sent as they are serialized instead of built up in memory
+        return StreamingResponse(chunks(), media_type="application/json",
+                                 headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving quiz history: {str(e)}")
 
+@app.get("/quiz-history/export")
+async def export_quiz_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    include_archived: bool = Query(True, description="Also export quizzes moved to the archive"),
+    user: UserSpace = Depends(get_user_space),
+):
+    """
+    Download the user's whole history as a file, streamed a chunk at a time.
+    NDJSON holds the quizzes exactly as stored (and is what /quiz-history/import
+    reads back); CSV and Parquet have one flat row per question.
+    """
+    try:
+        if format == "parquet" and not PARQUET_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed on the server")
+
+        quizzes = user.store.history() if include_archived else user.store.iter_stored()
+        if format == "ndjson":
+            body = ndjson_chunks(quizzes, dumps_json)
+        elif format == "csv":
+            body = csv_chunks(quizzes)
+        else:
+            body = parquet_chunks(quizzes)
+
+        def chunks():
+            try:
+                yield from body
+            finally:
+                user_spaces.release(user)
+
+        # The dependency releases the user's space before the body is streamed
+        user_spaces.retain(user)
+        filename = f"quiz-history-{user.user_id}.{format}"
+        return StreamingResponse(chunks(), media_type=EXPORT_FORMATS[format],
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting quiz history: {str(e)}")
+
+@app.post("/quiz-history/import")
+async def import_quiz_history(
+    request: Request,
+    on_conflict: str = Query("skip", pattern="^(skip|replace)$", description="What to do with quiz_ids already in history"),
+    user: UserSpace = Depends(get_user_space),
+):
+    """
+    Bulk-load quizzes from an NDJSON export, a JSON array of quizzes or a
+    /quiz-history response. The body is parsed as it arrives and saved
+    IMPORT_BATCH quizzes per transaction. Quizzes are deduplicated by
+    quiz_id, within the file and against history (archive included); with
+    on_conflict=replace the imported copy wins instead of the existing one.
+    """
+    try:
+        # A /quiz-history response wraps the quizzes; they are streamed out of it all the same
+        parser = JSONArrayStreamParser(unwrap="quizzes")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        seen = set()
+        batch: List[Dict] = []
+        counts = {"imported": 0, "replaced": 0, "skipped_duplicates": 0, "invalid": 0}
+
+        def exists(quiz_id: str) -> bool:
+            return user.store.get_meta(quiz_id) is not None or user.store.archive.contains(quiz_id)
+
+        def accept(obj: Dict):
+            try:
+                quiz = SavedQuiz(**obj).model_dump()
+            except (ValidationError, TypeError):
+                counts["invalid"] += 1
+                return
+            quiz_id = quiz["quiz_id"]
+            if quiz_id in seen:
+                counts["skipped_duplicates"] += 1
+                return
+            seen.add(quiz_id)
+            if exists(quiz_id):
+                if on_conflict == "skip":
+                    counts["skipped_duplicates"] += 1
+                    return
+                counts["replaced"] += 1
+                if user.store.get_meta(quiz_id) is None:
+                    # Archived: drop the old copy so the import doesn't leave two
+                    user.store.delete(quiz_id)
+            batch.append(quiz)
+
+        def consume(text: str):
+            for obj in parser.feed(text):
+                accept(obj)
+
+        async def flush():
+            if batch:
+                await run_in_threadpool(user.store.add_many, list(batch))
+                counts["imported"] += len(batch)
+                batch.clear()
+
+        async for data in request.stream():
+            await run_in_threadpool(consume, decoder.decode(data))
+            if len(batch) >= IMPORT_BATCH:
+                await flush()
+        await run_in_threadpool(consume, decoder.decode(b"", final=True))
+        await flush()
+
+        # Elements that weren't objects, objects that didn't parse and one cut off at the end
+        counts["invalid"] += parser.skipped + parser.errors + int(parser.incomplete)
+        return counts
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing quiz history: {str(e)}")
+
 @app.get("/quiz-history/{quiz_id}")
-async def get_quiz_by_id(quiz_id: str):
+async def get_quiz_by_id(quiz_id: str, user: UserSpace = Depends(get_user_space),
+                         if_none_match: Optional[str] = Header(None)):
     """
-    Get a specific quiz by its ID.
+    Get a specific quiz by its ID, with an ETag like /quiz-history.
     """
     try:
-        history_data = load_quiz_history()
-        
-        for quiz_data in history_data:
-            if quiz_data.get("quiz_id") == quiz_id:
-                return SavedQuiz(
-                    quiz_id=quiz_data.get("quiz_id", ""),
-                    topic=quiz_data.get("topic", ""),
-                    keyword=quiz_data.get("keyword", ""),
-                    questions=[Question(**q) for q in quiz_data.get("questions", [])],
-                    user_answers=[UserAnswer(**a) for a in quiz_data.get("user_answers", [])],
-                    generated_at=quiz_data.get("generated_at", ""),
-                    completed_at=quiz_data.get("completed_at"),
-                    score=quiz_data.get("score"),
-                    total_questions=quiz_data.get("total_questions", 0)
-                )
-        
-        raise HTTPException(status_code=404, detail="Quiz not found")
+        etag = history_etag(user, quiz_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        with history_operation_duration.time(operation="get"):
+            quiz_data = await run_in_threadpool(user.store.get, quiz_id)
+
+        if quiz_data is None:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+
+        if HISTORY_VALIDATE:
+            return json_bytes_response(saved_quiz_from_dict(quiz_data).model_dump_json().encode(), etag)
+        return json_bytes_response(dumps_json(saved_quiz_fields(quiz_data)), etag)
     
     except HTTPException:
         raise
@@ -444,22 +1908,16 @@ async def get_quiz_by_id(quiz_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving quiz: {str(e)}")
 
 @app.delete("/quiz-history/{quiz_id}")
-async def delete_quiz(quiz_id: str):
+async def delete_quiz(quiz_id: str, user: UserSpace = Depends(get_user_space)):
     """
     Delete a specific quiz from history.
     """
     try:
-        history_data = load_quiz_history()
-        original_length = len(history_data)
-        
-        # Filter out the quiz with the specified ID
-        history_data = [quiz for quiz in history_data if quiz.get("quiz_id") != quiz_id]
-        
-        if len(history_data) == original_length:
+        with history_operation_duration.time(operation="delete"):
+            deleted = await run_in_threadpool(user.store.delete, quiz_id)
+        if not deleted:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
-        save_quiz_history(history_data)
-        
         return {"message": "Quiz deleted successfully", "quiz_id": quiz_id}
     
     except HTTPException:
@@ -467,49 +1925,201 @@ async def delete_quiz(quiz_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting quiz: {str(e)}")
 
+@app.get("/quiz-archive", response_model=QuizHistoryResponse)
+async def get_quiz_archive(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sort by generated_at"),
+    topic: Optional[str] = None,
+    since: Optional[str] = Query(None, description="Only quizzes generated at or after this ISO timestamp"),
+    until: Optional[str] = Query(None, description="Only quizzes generated before this ISO timestamp"),
+    user: UserSpace = Depends(get_user_space),
+):
+    """
+    Page through the user's archived quizzes like /quiz-history. Only the
+    page requested is read from cold storage and decompressed.
+    """
+    try:
+        # The archive compares generated_at as stored (the server's local time,
+        # isoformat), so bounds are parsed like /quiz-history's and written the same way
+        since_at, until_at = parse_timestamp(since), parse_timestamp(until)
+        for timestamp, parsed in ((since, since_at), (until, until_at)):
+            if timestamp is not None and parsed is None:
+                raise HTTPException(status_code=400, detail=f"Invalid timestamp: {timestamp}")
+        since_key, until_key = (
+            parsed.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None).isoformat() if parsed else None
+            for parsed in (since_at, until_at)
+        )
+
+        archive = user.store.archive
+        after = decode_history_cursor(cursor) if cursor else None
+        total_count = await run_in_threadpool(archive.count_matching, topic, since_key, until_key)
+        # Fetch one extra to learn whether there is a next page
+        quizzes = await run_in_threadpool(
+            archive.query, limit + 1, after, order == "desc", topic, since_key, until_key
+        )
+        next_cursor = None
+        if len(quizzes) > limit:
+            quizzes = quizzes[:limit]
+            next_cursor = encode_history_cursor(quizzes[-1].get("generated_at", ""), quizzes[-1]["quiz_id"])
+
+        return QuizHistoryResponse(
+            quizzes=[saved_quiz_from_dict(quiz_data) for quiz_data in quizzes],
+            total_count=total_count,
+            next_cursor=next_cursor,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving quiz archive: {str(e)}")
+
+@app.post("/quiz-archive/run")
+async def run_quiz_archival(
+    older_than_days: Optional[float] = Query(None, ge=0, description="Defaults to ARCHIVE_AFTER_DAYS"),
+    user: UserSpace = Depends(get_user_space),
+):
+    """Archive the user's quizzes completed more than older_than_days ago now"""
+    try:
+        days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        if days <= 0 and older_than_days is None:
+            raise HTTPException(status_code=400, detail="Archiving is off; pass older_than_days")
+        archived = await run_in_threadpool(archive_completed, user, days)
+        return {"archived": archived, "archive": await run_in_threadpool(user.store.archive.stats)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error archiving quizzes: {str(e)}")
+
+@app.get("/due", response_model=DueKeywordsResponse)
+async def get_due_keywords(
+    limit: int = Query(20, ge=1, le=500),
+    topic: Optional[str] = None,
+    include_new: bool = Query(False, description="Also return keywords quizzed but never answered"),
+    user: UserSpace = Depends(get_user_space),
+):
+    """
+    Keywords due for review under SM-2 spaced repetition, most urgent first.
+    Scheduling state is kept per keyword and updated on every submission,
+    so this never rescans quiz history.
+    """
+    try:
+        due, total_due = user.scheduler.due(limit=limit, topic=topic, include_new=include_new)
+        return DueKeywordsResponse(due=due, total_due=total_due)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving due keywords: {str(e)}")
+
+@app.post("/due/recompute")
+async def recompute_due_keywords(user: UserSpace = Depends(get_user_space)):
+    """Rebuild the user's spaced-repetition state from their full quiz history"""
+    try:
+        # history() includes archived quizzes, whose reviews still count. It is
+        # read lazily so submissions made while it's read are replayed, not lost
+        return await run_in_threadpool(user.scheduler.recompute, user.store.history())
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recomputing schedule: {str(e)}")
+
 @app.get("/quiz-stats")
-async def get_quiz_stats():
+async def get_quiz_stats(user: UserSpace = Depends(get_user_space)):
     """
     Get quiz statistics for analytics.
+    Totals plus per-topic and per-keyword accuracy and daily/weekly activity,
+    all maintained incrementally as quizzes are generated, submitted and deleted.
     """
     try:
-        history_data = load_quiz_history()
-        
-        total_quizzes = len(history_data)
-        completed_quizzes = len([q for q in history_data if q.get("completed_at")])
-        
-        # Calculate average score for completed quizzes
-        completed_with_scores = [q for q in history_data if q.get("score") is not None and q.get("total_questions", 0) > 0]
-        avg_score_percentage = 0
-        if completed_with_scores:
-            total_percentage = sum((q["score"] / q["total_questions"]) * 100 for q in completed_with_scores)
-            avg_score_percentage = total_percentage / len(completed_with_scores)
-        
-        # Topic breakdown
-        topic_counts = {}
-        for quiz in history_data:
-            topic = quiz.get("topic", "Unknown")
-            topic_counts[topic] = topic_counts.get(topic, 0) + 1
-        
-        return {
-            "total_quizzes": total_quizzes,
-            "completed_quizzes": completed_quizzes,
-            "pending_quizzes": total_quizzes - completed_quizzes,
-            "average_score_percentage": round(avg_score_percentage, 2),
-            "topics": topic_counts
-        }
+        return user.stats.summary()
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving quiz stats: {str(e)}")
 
+@app.get("/me")
+async def get_current_user(user: UserSpace = Depends(get_user_space)):
+    """The calling user, their LLM quota use and how many quizzes they have"""
+    return {
+        "user_id": user.user_id,
+        "quizzes": await run_in_threadpool(user.store.count),
+        "archived_quizzes": await run_in_threadpool(user.store.archive.count),
+        "llm_quota": llm_quota.usage(user.user_id),
+    }
+
+@app.get("/users")
+async def get_user_spaces_stats():
+    """Open user stores and quota rejections across all users"""
+    return {"spaces": user_spaces.stats(), "quota_rejections": llm_quota.rejected}
+
+@app.get("/quiz-cache")
+async def get_quiz_cache_stats():
+    """Quiz cache hit/miss counts and completion tokens saved"""
+    return {"policy": QUIZ_CACHE_POLICY, **quiz_cache.stats()}
+
+@app.get("/keyword-cache")
+async def get_keyword_cache_stats():
+    """How many topics were answered by the topic cache, the local engine or OpenAI"""
+    return {"engine": keyword_engine.stats(), "cache": topic_keyword_cache.stats(), "matcher": keyword_matchers.stats()}
+
+@app.get("/quiz-pool")
+async def get_quiz_pool_stats():
+    """Pre-generated quiz pool sizes, refill activity and token budget use"""
+    return quiz_pool.stats()
+
+@app.get("/upstream")
+async def get_upstream_stats():
+    """
+    Upstream OpenAI call counts (including calls coalesced into one already in
+    flight), parse outcomes, resilience state, per-template prompt comparison
+    and the learned quiz token budget.
+    """
+    return {
+        "single_flight": upstream_flights.stats(),
+        "quiz_parsing": quiz_parse_stats.stats(),
+        "resilience": upstream_guard.stats(),
+        "prompts": {
+            "quiz_variants": quiz_prompts.variants(),
+            "keyword_variants": keyword_prompts.variants(),
+            "templates": prompt_stats.stats(),
+        },
+        "token_budget": token_budget.stats(),
+    }
+
+@app.get("/token-usage")
+async def get_token_usage(days: int = Query(30, ge=1, le=366), topic: Optional[str] = None):
+    """
+    Prompt and completion tokens spent on OpenAI over the last days, per day,
+    topic, purpose (keywords, quiz, batch) and prompt template, across all
+    users and worker processes.
+    """
+    try:
+        return await run_in_threadpool(token_ledger.report, days, topic)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving token usage: {str(e)}")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: request, upstream and history latencies, token use and fallbacks"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """
+    Health check endpoint. "degraded" means quizzes currently come from the
+    pool, cache or fallbacks because OpenAI is unreachable or not configured.
+    """
     api_key_status = "configured" if openai_client.api_key else "missing"
+    breaker = upstream_guard.breaker.stats()
     return {
-        "status": "healthy", 
+        "status": "healthy" if api_key_status == "configured" and breaker["state"] == "closed" else "degraded",
         "timestamp": datetime.now().isoformat(),
-        "openai_api_key": api_key_status
+        "openai_api_key": api_key_status,
+        "worker": {"pid": os.getpid(), "workers": WORKERS, "shared_state": SHARED_STATE},
+        "upstream": {
+            "circuit_breaker": breaker["state"],
+            "consecutive_failures": breaker["consecutive_failures"],
+            "retry_in": breaker["retry_in"],
+            "rate_limited_for": upstream_guard.limiter.stats()["paused_for"],
+        }
     }
 
 @app.get("/test-openai")
@@ -519,7 +2129,8 @@ async def test_openai():
         if not openai_client.api_key:
             return {"status": "error", "message": "OpenAI API key not configured"}
         
-        response = openai_client.chat.completions.create(
+        response = await create_chat_completion(
+            KEYWORDS_TIMEOUT,
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": "Say hello"}],
             max_tokens=10
@@ -531,4 +2142,9 @@ async def test_openai():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WORKERS > 1:
+        # Each worker imports the app itself, so it is passed by name
+        uvicorn.run("fastapiserver:app", host="0.0.0.0", port=8000, workers=WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
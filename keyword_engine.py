@@ -0,0 +1,287 @@
+"""
+Offline keyword extraction for /generate-keywords.
+
+KeywordEngine answers a topic from two local sources before anyone asks
+the model:
+
+- a precomputed topic -> keyword index (keyword_index.json ships with the
+  common topics; a user-supplied JSON file in the same format can add more),
+  matched on the topic name or one of its aliases
+- an optional corpus directory of .txt/.md documents. Candidate phrases are
+  split out of the documents that mention the topic RAKE-style (at stopwords
+  and punctuation) and ranked by TF-IDF: frequent in those documents, rare
+  across the whole corpus, so terms that appear everywhere don't crowd out
+  the topic-specific ones. Each document is tokenized once when the corpus
+  is loaded, and corpus answers (misses included) are remembered per topic.
+
+TopicKeywordCache persists every topic's keywords (local or from OpenAI) in
+SQLite, so a topic any user (served by any worker process) has looked up
+before is answered without a completion.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+STOPWORDS = frozenset("""
+a about above after again against all almost also although always am among an and another any are
+around as at be because been before being below between both but by can cannot could did do does
+doing done down during each either else enough etc even ever every few for from further get gets
+getting given gives go goes had has have having he her here hers him his how however i if in into
+is it its itself just least less let like likely made make makes many may me might more most much
+must my neither no nor not now of off often on once one only or other others our out over own per
+perhaps rather really same see seen several shall she should show shown since so some such than
+that the their them then there these they this those though through thus to too toward under
+until up upon us use used uses using usually very via was we well were what when where whether
+which while who whom whose why will with within without would yet you your
+""".split())
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+_PHRASE_BREAK = re.compile(r"[^\w\s+#.\-]|\.\s|\n")
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+def candidate_phrases(text: str, max_words: int = 3) -> List[str]:
+    """RAKE-style candidates: runs of up to max_words words between stopwords and punctuation"""
+    phrases = []
+    for fragment in _PHRASE_BREAK.split(text.lower()):
+        current = []
+        for word in _words(fragment):
+            if word in STOPWORDS or word.isdigit() or len(word) < 2:
+                if current:
+                    phrases.append(" ".join(current))
+                current = []
+            else:
+                current.append(word)
+        if current:
+            phrases.append(" ".join(current))
+    return [p for p in phrases if len(p.split()) <= max_words]
+
+class KeywordEngine:
+    """Topic -> keywords from a precomputed index and an optional document corpus"""
+
+    def __init__(self, index_paths: List[str] = (), corpus_dir: Optional[str] = None,
+                 max_keywords: int = 15, min_keywords: int = 5, max_corpus_topics: int = 1024):
+        self.max_keywords = max_keywords
+        self.min_keywords = min_keywords
+        self.max_corpus_topics = max_corpus_topics
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[str]] = {}
+        self._indexed_topics = set()
+        # Per document: its words joined by single spaces (for phrase lookups),
+        # its set of words, its non-stopword counts and its candidate phrase counts
+        self._documents: List[str] = []
+        self._document_words: List[set] = []
+        self._document_terms: List[Counter] = []
+        self._document_phrases: List[Counter] = []
+        self._document_frequency = Counter()
+        # Topic -> corpus keywords, or None when the corpus doesn't cover it
+        self._corpus_answers: "OrderedDict[str, Optional[List[str]]]" = OrderedDict()
+        self.index_hits = 0
+        self.corpus_hits = 0
+        self.misses = 0
+        for path in index_paths:
+            self.load_index(path)
+        if corpus_dir:
+            self.load_corpus(corpus_dir)
+
+    def load_index(self, path: str):
+        """Merge a {"topic": {"aliases": [...], "keywords": [...]}} file into the index"""
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error loading keyword index {path}: {str(e)}")
+            return
+        for topic, entry in entries.items():
+            self._indexed_topics.add(_normalize(topic))
+            keywords = entry["keywords"] if isinstance(entry, dict) else entry
+            for name in [topic] + (entry.get("aliases", []) if isinstance(entry, dict) else []):
+                self._index[_normalize(name)] = list(keywords)
+
+    def load_corpus(self, corpus_dir: str):
+        """Read every .txt/.md document under corpus_dir and count document frequencies"""
+        for root, _, files in os.walk(corpus_dir):
+            for name in sorted(files):
+                if not name.endswith((".txt", ".md")):
+                    continue
+                try:
+                    with open(os.path.join(root, name), 'r', encoding='utf-8', errors='ignore') as f:
+                        text = f.read()
+                except OSError as e:
+                    logging.getLogger(__name__).warning(f"Error reading corpus document {name}: {str(e)}")
+                    continue
+                words = _words(text)
+                self._documents.append(" ".join(words))
+                self._document_words.append(set(words))
+                self._document_terms.append(Counter(w for w in words if w not in STOPWORDS))
+                self._document_phrases.append(Counter(candidate_phrases(text)))
+                self._document_frequency.update(set(words))
+        with self._lock:
+            self._corpus_answers.clear()
+
+    def _idf(self, word: str) -> float:
+        return math.log((1 + len(self._documents)) / (1 + self._document_frequency[word])) + 1
+
+    def _from_corpus(self, topic: str) -> Optional[List[str]]:
+        topic_words = [w for w in _words(topic) if w not in STOPWORDS]
+        if not topic_words or not self._documents:
+            return None
+        phrase = " ".join(topic_words)
+        relevant = [
+            position for position, (text, words) in enumerate(zip(self._documents, self._document_words))
+            if all(w in words for w in topic_words) and phrase in text
+        ]
+        if not relevant:
+            return None
+
+        term_frequency, phrase_counts = Counter(), Counter()
+        for position in relevant:
+            term_frequency.update(self._document_terms[position])
+            phrase_counts.update(self._document_phrases[position])
+        scores = {}
+        for candidate, count in phrase_counts.items():
+            words = candidate.split()
+            weight = sum(term_frequency[w] * self._idf(w) for w in words) / len(words)
+            # Multi-word terms and repeated phrases are more likely real concepts
+            scores[candidate] = weight * (1 + 0.5 * (len(words) - 1)) * (1 + math.log(count))
+        ranked = [c for c, _ in sorted(scores.items(), key=lambda item: -item[1])
+                  if not set(c.split()) <= set(topic_words)]
+        keywords = []
+        for candidate in ranked:
+            # Skip phrases contained in (or containing) one already picked
+            if any(candidate in k or k in candidate for k in keywords):
+                continue
+            keywords.append(candidate)
+            if len(keywords) >= self.max_keywords:
+                break
+        return keywords if len(keywords) >= self.min_keywords else None
+
+    def _corpus_keywords(self, topic: str) -> Optional[List[str]]:
+        """_from_corpus, remembered for the max_corpus_topics most recent topics"""
+        key = _normalize(topic)
+        with self._lock:
+            if key in self._corpus_answers:
+                self._corpus_answers.move_to_end(key)
+                return self._corpus_answers[key]
+        found = self._from_corpus(topic)
+        with self._lock:
+            self._corpus_answers[key] = found
+            while len(self._corpus_answers) > self.max_corpus_topics:
+                self._corpus_answers.popitem(last=False)
+        return found
+
+    def keywords(self, topic: str) -> Optional[List[str]]:
+        """Keywords for a topic, or None if neither the index nor the corpus knows it"""
+        indexed = self._index.get(_normalize(topic))
+        if indexed:
+            with self._lock:
+                self.index_hits += 1
+            return indexed[:self.max_keywords]
+        found = self._corpus_keywords(topic)
+        with self._lock:
+            if found:
+                self.corpus_hits += 1
+            else:
+                self.misses += 1
+        return list(found) if found else None
+
+    def stats(self) -> Dict:
+        return {
+            "indexed_topics": len(self._indexed_topics),
+            "corpus_documents": len(self._documents),
+            "index_hits": self.index_hits,
+            "corpus_hits": self.corpus_hits,
+            "misses": self.misses,
+            "corpus_topics_remembered": len(self._corpus_answers),
+        }
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topic_keywords (
+    topic_key TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class TopicKeywordCache:
+    """Persistent topic -> keywords map shared by every user of the server"""
+
+    def __init__(self, path: str, ttl: float = 0):
+        self.ttl = ttl  # 0 keeps entries forever
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Tuple[List[str], float]] = {}
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        for topic_key, keywords, created_at in self._conn.execute(
+            "SELECT topic_key, keywords, created_at FROM topic_keywords"
+        ):
+            self._memory[topic_key] = (json.loads(keywords), created_at)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, topic: str) -> Optional[List[str]]:
+        key = _normalize(topic)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                # Another worker process may have added it since we loaded
+                row = self._conn.execute(
+                    "SELECT keywords, created_at FROM topic_keywords WHERE topic_key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = self._memory[key] = (json.loads(row[0]), row[1])
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._memory[key]
+                self._conn.execute("DELETE FROM topic_keywords WHERE topic_key = ?", (key,))
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE topic_keywords SET hits = hits + 1 WHERE topic_key = ?", (key,))
+            return list(entry[0])
+
+    def put(self, topic: str, keywords: List[str], source: str):
+        key = _normalize(topic)
+        now = time.time()
+        with self._lock:
+            self._memory[key] = (list(keywords), now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO topic_keywords (topic_key, topic, keywords, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, topic, json.dumps(keywords), source, now),
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            sources = dict(self._conn.execute("SELECT source, COUNT(*) FROM topic_keywords GROUP BY source").fetchall())
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "topics": len(self._memory),
+                "topics_by_source": sources,
+            }
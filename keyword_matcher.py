@@ -0,0 +1,182 @@
+"""
+Multi-pattern keyword matching for page text (/match-keywords).
+
+KeywordAutomaton compiles a keyword set into one Aho-Corasick automaton, so
+a chunk of page text is scanned once no matter how many keywords are
+tracked, instead of once per keyword regex.
+
+With whole-word matching (the default) the automaton runs over word tokens
+(runs of letters/digits, and single punctuation characters), which keeps
+"learn" from matching inside "learning" while still finding "c++" or
+"node.js". Matches are checked against the keyword's spacing, so
+"machine learning" matches across any whitespace but not "machinelearning".
+Without whole-word matching it runs over characters and finds substrings.
+Like a regex with the g flag, overlapping occurrences of the same keyword
+are only counted once.
+
+MatcherCache keeps compiled automata keyed by a hash of the normalized
+keyword set and options, so a topic set is compiled once and reused by
+every later request.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a fixed keyword set"""
+
+    def __init__(self, keywords: Iterable[str], case_sensitive: bool = False, whole_word: bool = True):
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        self.keywords: List[str] = []
+        self._lengths: List[int] = []
+        self._spacing: List[Tuple[bool, ...]] = []
+        # Trie nodes: goto transitions, failure links, and keyword ids ending at each node
+        self._goto: List[Dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        seen = set()
+        for keyword in keywords:
+            folded = self._fold(keyword.strip())
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            symbols, spacing = self._symbols(folded)
+            if not symbols:
+                continue
+            self._insert(symbols, len(self.keywords))
+            self.keywords.append(keyword.strip())
+            self._lengths.append(len(symbols))
+            self._spacing.append(spacing)
+        self._link()
+
+    def _fold(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def _symbols(self, text: str) -> Tuple[Sequence, Tuple[bool, ...]]:
+        """Keyword symbols and, for tokens, whether whitespace separates each pair"""
+        if not self.whole_word:
+            return text, ()
+        matches = list(_TOKEN.finditer(text))
+        spacing = tuple(matches[i + 1].start() > matches[i].end() for i in range(len(matches) - 1))
+        return [m.group() for m in matches], spacing
+
+    def _insert(self, symbols: Sequence, keyword_id: int):
+        node = 0
+        for symbol in symbols:
+            next_node = self._goto[node].get(symbol)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][symbol] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append(keyword_id)
+
+    def _link(self):
+        """Breadth-first pass setting failure links and merging outputs"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(symbol, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def count(self, texts: Iterable[str]) -> List[int]:
+        """Occurrences of each keyword (by position in self.keywords) across texts"""
+        counts = [0] * len(self.keywords)
+        goto, fail, out = self._goto, self._fail, self._out
+        for text in texts:
+            text = self._fold(text)
+            if self.whole_word:
+                spans = [m.span() for m in _TOKEN.finditer(text)]
+                symbols = [text[start:end] for start, end in spans]
+            else:
+                symbols = text
+            # Index just past the last counted occurrence of each keyword
+            last_end = {}
+            node = 0
+            for position, symbol in enumerate(symbols):
+                while node and symbol not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(symbol, 0)
+                for keyword_id in out[node]:
+                    start = position - self._lengths[keyword_id] + 1
+                    if start < last_end.get(keyword_id, 0):
+                        continue
+                    if self.whole_word and not self._spaced_like_keyword(spans, start, keyword_id):
+                        continue
+                    last_end[keyword_id] = position + 1
+                    counts[keyword_id] += 1
+        return counts
+
+    def _spaced_like_keyword(self, spans: List[Tuple[int, int]], start: int, keyword_id: int) -> bool:
+        for offset, spaced in enumerate(self._spacing[keyword_id]):
+            if (spans[start + offset + 1][0] > spans[start + offset][1]) != spaced:
+                return False
+        return True
+
+    def counts_by_keyword(self, texts: Iterable[str]) -> Dict[str, int]:
+        """Non-zero occurrence counts keyed by keyword"""
+        return {self.keywords[i]: n for i, n in enumerate(self.count(texts)) if n}
+
+class MatcherCache:
+    """LRU of compiled automata keyed by keyword set and matching options"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._automata: "OrderedDict[str, KeywordAutomaton]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.compile_seconds = 0.0
+
+    @staticmethod
+    def key(keywords: Iterable[str], case_sensitive: bool, whole_word: bool) -> str:
+        normalized = sorted({" ".join(k.split()) if case_sensitive else " ".join(k.lower().split())
+                             for k in keywords})
+        raw = json.dumps([normalized, case_sensitive, whole_word])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, keywords: List[str], case_sensitive: bool = False,
+            whole_word: bool = True) -> Tuple[str, KeywordAutomaton, bool]:
+        """The automaton for this keyword set, its cache key and whether it was cached"""
+        key = self.key(keywords, case_sensitive, whole_word)
+        with self._lock:
+            automaton = self._automata.get(key)
+            if automaton is not None:
+                self._automata.move_to_end(key)
+                self.hits += 1
+                return key, automaton, True
+        started = time.perf_counter()
+        automaton = KeywordAutomaton(keywords, case_sensitive, whole_word)
+        with self._lock:
+            self.compile_seconds += time.perf_counter() - started
+            self.misses += 1
+            self._automata[key] = automaton
+            while len(self._automata) > self.max_entries:
+                self._automata.popitem(last=False)
+        return key, automaton, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._automata),
+                "compile_seconds": round(self.compile_seconds, 4),
+            }
@@ -0,0 +1,215 @@
+"""
+Versioned prompt templates for keyword and quiz completions.
+
+Each template has a name that is recorded with every completion it was
+used for (in the token ledger, the prompt stats and the saved quiz), so a
+change of wording can be judged on numbers instead of impressions. The v1
+templates are the original prompts, unchanged. The v2 templates ask for the
+same output in far fewer tokens: one compact JSON example instead of an
+indented one, and the rules in a few short lines.
+
+PromptSelector picks a template per completion from weighted variants
+("quiz-v1:1,quiz-v2:1" sends half the traffic to each), and PromptStats
+keeps per-template completions, latency, prompt and completion tokens,
+parse success and truncations for comparing them (GET /upstream).
+"""
+
+import json
+import random
+import threading
+from collections import Counter
+from typing import Callable, Dict, List
+
+from token_accounting import count_tokens
+
+def get_difficulty_instruction(difficulty: str) -> str:
+    # Set difficulty instruction based on input
+    if difficulty == "big":
+        return "The question should be hard/difficult and take some thought to solve. Give some context for the question."
+    elif difficulty == "small":
+        return "The question should be simple and easy to answer."
+    else:  # medium
+        return "The question should be medium difficulty."
+
+class PromptTemplate:
+    """A named system message plus a user message rendered from keyword arguments"""
+
+    def __init__(self, name: str, system: str, render: Callable[..., str], example_question: str = ""):
+        self.name = name
+        self.system = system
+        self.render = render
+        # Completion tokens of one question written the way this template shows it
+        self.question_tokens = count_tokens(example_question) if example_question else 0
+
+    def messages(self, **fields) -> List[Dict]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.render(**fields)},
+        ]
+
+def keywords_v1(topic: str) -> str:
+    return f"""Generate a list of 10-15 important keywords or key terms that someone learning about "{topic}" should encounter and understand.
+
+These keywords should be:
+- Core concepts, terms, or technologies related to {topic}
+- Things that would commonly appear in articles, tutorials, or discussions about {topic}
+- Fundamental building blocks of knowledge in this area
+
+Return only the keywords as a simple comma-separated list, no explanations or numbering.
+
+Example format: keyword1, keyword2, keyword3, etc."""
+
+def keywords_v2(topic: str) -> str:
+    return (f'List 10-15 keywords someone learning about "{topic}" will meet: core concepts, common terms, '
+            f'building blocks. Reply with only a comma-separated list.')
+
+def quiz_v1(topic: str, keywords: List[str], difficulty: str, count: str = "3-5", avoid: List[str] = (),
+            wrap_object: bool = False) -> str:
+    keywords_str = ", ".join(keywords)
+    difficulty_instruction = get_difficulty_instruction(difficulty)
+    output_instruction = ""
+    if wrap_object:
+        output_instruction += '\n- Wrap the array in a JSON object under a "questions" key: {"questions": [...]}'
+    if avoid:
+        output_instruction += "\n- Do not repeat any of these existing questions: " + " | ".join(avoid)
+
+    return f"""You are a kind and curious tutor that helps the user learn {topic}.
+You never give the full answer immediately. Create multiple choice quiz questions about "{topic}" focusing on these keywords: {keywords_str}
+
+{difficulty_instruction}
+
+Generate {count} multiple choice questions. Each question should have 4 answer choices.
+
+Format your response as a JSON array like this:
+[
+  {{
+    "question": "The quiz question text here?",
+    "choice1": "First answer option text",
+    "choice2": "Second answer option text",
+    "choice3": "Third answer option text",
+    "choice4": "Fourth answer option text",
+    "correct": "A",
+    "keyword": "relevant_keyword",
+    "difficulty": "{difficulty}"
+  }},
+  ...
+]
+
+Important:
+- The question should test understanding of the keyword in context
+- choice1 through choice4 should contain ONLY the answer text (no A, B, C, D labels)
+- correct should be the letter (A, B, C, or D) of the correct answer
+- choice1 corresponds to A, choice2 to B, choice3 to C, choice4 to D
+- Make the incorrect options plausible but clearly wrong
+- Questions should be educational and test real understanding{output_instruction}"""
+
+QUESTION_EXAMPLE = {
+    "question": "The quiz question text here?",
+    "choice1": "First answer option text",
+    "choice2": "Second answer option text",
+    "choice3": "Third answer option text",
+    "choice4": "Fourth answer option text",
+    "correct": "A",
+    "keyword": "relevant_keyword",
+    "difficulty": "medium",
+}
+
+def quiz_v2(topic: str, keywords: List[str], difficulty: str, count: str = "3-5", avoid: List[str] = (),
+            wrap_object: bool = False) -> str:
+    example = json.dumps(dict(QUESTION_EXAMPLE, difficulty=difficulty), separators=(",", ":"))
+    shape = 'a JSON object {"questions":[...]}' if wrap_object else "a JSON array"
+    avoid_line = "\nDo not repeat these existing questions: " + " | ".join(avoid) if avoid else ""
+    return f"""Generate {count} multiple choice questions about "{topic}" focusing on these keywords: {", ".join(keywords)}
+{get_difficulty_instruction(difficulty)}
+Reply with only {shape} of objects like:
+{example}
+choice1-4 are answer text only; correct is the letter (A-D) of the right one. Wrong choices must be plausible. Test understanding, not recall.{avoid_line}"""
+
+KEYWORD_PROMPTS = {
+    "keywords-v1": PromptTemplate(
+        "keywords-v1", "You are an expert educator who creates comprehensive learning keyword lists.", keywords_v1,
+    ),
+    "keywords-v2": PromptTemplate("keywords-v2", "You are an expert educator.", keywords_v2),
+}
+
+QUIZ_PROMPTS = {
+    "quiz-v1": PromptTemplate(
+        "quiz-v1",
+        "You are an expert educator who creates comprehensive multiple choice quizzes. Always respond with valid JSON.",
+        quiz_v1,
+        example_question=json.dumps(QUESTION_EXAMPLE, indent=2).replace("\n", "\n  ") + ",",
+    ),
+    "quiz-v2": PromptTemplate(
+        "quiz-v2",
+        "You write multiple choice quizzes as JSON.",
+        quiz_v2,
+        example_question=json.dumps(QUESTION_EXAMPLE, separators=(",", ":")) + ",",
+    ),
+}
+
+class PromptSelector:
+    """Weighted choice between template variants, e.g. "quiz-v1:1,quiz-v2:1" """
+
+    def __init__(self, templates: Dict[str, PromptTemplate], variants: str):
+        self.templates = []
+        self.weights = []
+        for entry in variants.split(","):
+            name, _, weight = entry.strip().partition(":")
+            if not name:
+                continue
+            if name not in templates:
+                raise ValueError(f"Unknown prompt template {name!r} (known: {', '.join(templates)})")
+            self.templates.append(templates[name])
+            self.weights.append(float(weight) if weight else 1.0)
+        if not self.templates or sum(self.weights) <= 0:
+            raise ValueError(f"No prompt template selected by {variants!r}")
+
+    def choose(self) -> PromptTemplate:
+        if len(self.templates) == 1:
+            return self.templates[0]
+        return random.choices(self.templates, weights=self.weights)[0]
+
+    def variants(self) -> Dict[str, float]:
+        total = sum(self.weights)
+        return {template.name: round(weight / total, 4) for template, weight in zip(self.templates, self.weights)}
+
+class PromptStats:
+    """Per-template completion outcomes for comparing prompt variants"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Counter] = {}
+
+    def record(self, template: str, seconds: float, prompt_tokens: int, completion_tokens: int,
+               parsed: bool, items: int = 0, truncated: bool = False):
+        """
+        One completion with this template. parsed means its whole output was
+        valid (not cut off or only partly recoverable); items counts what it produced.
+        """
+        with self._lock:
+            counts = self._counts.setdefault(template, Counter())
+            counts["completions"] += 1
+            counts["milliseconds"] += seconds * 1000
+            counts["prompt_tokens"] += prompt_tokens
+            counts["completion_tokens"] += completion_tokens
+            counts["parsed"] += 1 if parsed else 0
+            counts["items"] += items
+            counts["truncated"] += 1 if truncated else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            result = {}
+            for template, counts in sorted(self._counts.items()):
+                completions = counts["completions"]
+                result[template] = {
+                    "completions": completions,
+                    "avg_latency_ms": round(counts["milliseconds"] / completions, 1),
+                    "avg_prompt_tokens": round(counts["prompt_tokens"] / completions, 1),
+                    "avg_completion_tokens": round(counts["completion_tokens"] / completions, 1),
+                    "avg_total_tokens": round((counts["prompt_tokens"] + counts["completion_tokens"]) / completions, 1),
+                    "parse_success_rate": round(counts["parsed"] / completions, 4),
+                    "avg_items": round(counts["items"] / completions, 2),
+                    "tokens_per_item": round(counts["completion_tokens"] / counts["items"], 1) if counts["items"] else None,
+                    "truncated": counts["truncated"],
+                }
+            return result
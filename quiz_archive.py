@@ -0,0 +1,289 @@
+"""
+Cold storage for quizzes that are long finished.
+
+IndexedQuizStore.archive_quizzes() moves completed quizzes out of the hot
+store into a QuizArchive (quiz_archive.db next to the user's history), so
+the resident index, rebuilds and history pages only cover recent quizzes.
+Archived quizzes still count for /quiz-stats and /due: observers are not
+told they left, and a rebuild replays them from here.
+
+Each archived quiz is one SQLite row holding the columns queries filter on
+and the full quiz as zlib-compressed JSON. A quiz is only a couple of KB,
+too small for compression to learn its field names and boilerplate, so
+rows are compressed against a preset dictionary of them (about a quarter
+smaller than plain zlib). The codec number is stored per row; a new
+dictionary must get a new number so old rows still decompress.
+
+Removing an archived quiz also records it in archive_removals, a change
+log like QuizStore's quiz_changes: other processes sharing the archive
+read the quizzes they haven't seen removed with external_removals() and
+pass them on to their observers.
+"""
+
+import json
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_quizzes (
+    quiz_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    completed_at TEXT,
+    score INTEGER,
+    total_questions INTEGER NOT NULL,
+    archived_at TEXT NOT NULL,
+    raw_size INTEGER NOT NULL,
+    codec INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archived_order ON archived_quizzes(generated_at, quiz_id);
+CREATE INDEX IF NOT EXISTS idx_archived_topic ON archived_quizzes(topic, generated_at);
+CREATE TABLE IF NOT EXISTS archive_removals (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    quiz_id TEXT NOT NULL,
+    codec INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+# How many removals are kept for processes that haven't caught up yet
+REMOVALS_KEEP = 1000
+
+# Codec 1: zlib with this preset dictionary. Never edit it; add a new codec instead.
+ZDICT_V1 = (
+    b'{"quiz_id": "", "topic": "", "keyword": "", "questions": [{"question": "", "choice1": "", '
+    b'"choice2": "", "choice3": "", "choice4": "", "correct": "A", "keyword": "", "difficulty": "medium"}, '
+    b'{"question": "", "choice1": "", "choice2": "", "choice3": "", "choice4": "", "correct": "B", '
+    b'"keyword": "", "difficulty": "small"}], "user_answers": [{"question_index": 0, "selected_answer": "A", '
+    b'"is_correct": true}, {"question_index": 1, "selected_answer": "C", "is_correct": false}], '
+    b'"generated_at": "2026-", "completed_at": "2026-", "score": 1, "total_questions": 3, '
+    b'"usage": {"source": "openai", "prompt": "quiz-v1", "prompt_tokens": 1, "completion_tokens": 1, "completions": 1}}'
+)
+CODEC = 1
+ZDICTS = {1: ZDICT_V1}
+
+def compress(raw: bytes) -> bytes:
+    compressor = zlib.compressobj(9, zdict=ZDICTS[CODEC])
+    return compressor.compress(raw) + compressor.flush()
+
+def decompress(data: bytes, codec: int) -> bytes:
+    decompressor = zlib.decompressobj(zdict=ZDICTS[codec])
+    return decompressor.decompress(data) + decompressor.flush()
+
+class QuizArchive:
+    """Archived quizzes, compressed, in their own SQLite database"""
+
+    def __init__(self, path: str, busy_timeout: float = 10.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Removal log position this connection has caught up to, the removals
+        # it made itself since, and the latest removal reflected in either
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._synced = self._last_removal()
+        self._own: List[int] = []
+        self._applied = self._synced
+
+    def _last_removal(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM archive_removals").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _load(row) -> Dict:
+        return json.loads(decompress(row[0], row[1]))
+
+    def put_many(self, quizzes: Iterable[Dict], archived_at: str):
+        """Archive quizzes in one transaction, replacing any archived under the same ID"""
+        rows = []
+        for quiz in quizzes:
+            raw = json.dumps(quiz).encode()
+            rows.append((
+                quiz["quiz_id"], quiz.get("topic", ""), quiz.get("keyword", ""), quiz.get("generated_at", ""),
+                quiz.get("completed_at"), quiz.get("score"), quiz.get("total_questions", 0),
+                archived_at, len(raw), CODEC, compress(raw),
+            ))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO archived_quizzes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, codec FROM archived_quizzes WHERE quiz_id = ?", (quiz_id,)
+            ).fetchone()
+        return self._load(row) if row else None
+
+    def contains(self, quiz_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM archived_quizzes WHERE quiz_id = ?", (quiz_id,)
+            ).fetchone() is not None
+
+    def remove(self, quiz_id: str) -> Optional[Dict]:
+        """Delete an archived quiz and log its removal. Returns the quiz, or None if it wasn't archived"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data, codec FROM archived_quizzes WHERE quiz_id = ?", (quiz_id,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM archived_quizzes WHERE quiz_id = ?", (quiz_id,))
+                    seq = self._conn.execute(
+                        "INSERT INTO archive_removals (quiz_id, codec, data) VALUES (?, ?, ?)",
+                        (quiz_id, row[1], row[0]),
+                    ).lastrowid
+                    if seq % 100 == 0:
+                        self._conn.execute("DELETE FROM archive_removals WHERE seq <= ?", (seq - REMOVALS_KEEP,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            self._own.append(seq)
+            self._applied = max(self._applied, seq)
+        return self._load(row)
+
+    @property
+    def version(self) -> int:
+        """Latest removal this connection has made or caught up with"""
+        return self._applied
+
+    def changed_elsewhere(self) -> bool:
+        """Whether another connection has committed since external_removals() last ran"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+
+    def external_removals(self) -> Optional[List[Dict]]:
+        """
+        Quizzes other connections removed since the last call, oldest first.
+        None means the log no longer reaches back that far.
+        """
+        with self._lock:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            oldest = self._conn.execute("SELECT MIN(seq) FROM archive_removals").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT seq, data, codec FROM archive_removals WHERE seq > ? ORDER BY seq", (self._synced,)
+            ).fetchall()
+            truncated = oldest is not None and oldest > self._synced + 1
+            own = set(self._own)
+            if rows:
+                self._synced = rows[-1][0]
+                self._applied = max(self._applied, self._synced)
+            self._own = [seq for seq in self._own if seq > self._synced]
+        if truncated:
+            return None
+        return [self._load(row[1:]) for row in rows if row[0] not in own]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archived_quizzes").fetchone()[0]
+
+    @staticmethod
+    def _filters(topic: Optional[str], since: Optional[str], until: Optional[str]) -> Tuple[List[str], List]:
+        clauses, params = [], []
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        if since is not None:
+            clauses.append("generated_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("generated_at < ?")
+            params.append(until)
+        return clauses, params
+
+    def query(self, limit: int, after: Optional[Tuple[str, str]] = None, descending: bool = False,
+              topic: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """
+        Up to limit archived quizzes ordered by (generated_at, quiz_id),
+        starting strictly after the given key, with optional topic and
+        generated_at range filters. Only the page is decompressed.
+        """
+        clauses, params = self._filters(topic, since, until)
+        if after is not None:
+            clauses.append("(generated_at, quiz_id) < (?, ?)" if descending else "(generated_at, quiz_id) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data, codec FROM archived_quizzes {where} "
+                f"ORDER BY generated_at {direction}, quiz_id {direction} LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [self._load(row) for row in rows]
+
+    def count_matching(self, topic: Optional[str] = None, since: Optional[str] = None,
+                       until: Optional[str] = None) -> int:
+        clauses, params = self._filters(topic, since, until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM archived_quizzes {where}", params).fetchone()[0]
+
+    def replay(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """
+        Every archived quiz, read in one transaction, after which the removal
+        log counts as caught up. For rebuilding observers from scratch.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                self._synced = self._last_removal()
+                self._applied = max(self._applied, self._synced)
+                self._own = []
+                after = None
+                while True:
+                    rows = self._conn.execute(
+                        "SELECT data, codec, generated_at, quiz_id FROM archived_quizzes "
+                        "WHERE (generated_at, quiz_id) > (?, ?) ORDER BY generated_at, quiz_id LIMIT ?",
+                        (after or ("", "")) + (chunk_size,),
+                    ).fetchall()
+                    for row in rows:
+                        yield self._load(row)
+                    if len(rows) < chunk_size:
+                        break
+                    after = (rows[-1][2], rows[-1][3])
+            finally:
+                self._conn.execute("COMMIT")
+
+    def iter_all(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """Every archived quiz in (generated_at, quiz_id) order, read chunk_size at a time"""
+        after = None
+        while True:
+            chunk = self.query(chunk_size, after)
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            after = (chunk[-1].get("generated_at", ""), chunk[-1]["quiz_id"])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            quizzes, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM archived_quizzes"
+            ).fetchone()
+        return {
+            "quizzes": quizzes,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": round(raw / stored, 2) if stored else None,
+        }
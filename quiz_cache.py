@@ -0,0 +1,263 @@
+"""
+Content-addressed cache of generated quiz questions.
+
+Entries are keyed by a hash of the normalized request (topic, sorted
+keywords, difficulty and prompt version) and hold the questions one
+completion produced. A small in-memory LRU sits in front of a SQLite tier
+that survives restarts; both honour the same TTL.
+
+Lookups prefer questions the user hasn't seen yet: SeenQuestions observes
+quiz history and remembers every question already shown. When the exact
+entry can't supply enough unseen questions, other fresh entries for the same
+topic and difficulty are searched for questions on the requested keywords.
+
+Several server processes can share one cache file: store() merges new
+questions into the entry on disk inside a write transaction, so one
+process's additions are never overwritten by another's stale memory copy.
+
+Lookups don't write: the time each entry was last used (which decides what
+is evicted from disk) is collected in memory and written in one transaction
+every `touch_interval` seconds, and before store() evicts anything.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def question_fingerprint(question: Dict) -> str:
+    """Stable identity of a question, independent of whitespace and case"""
+    return hashlib.sha1(_normalize(question.get("question", "")).encode()).hexdigest()
+
+class SeenQuestions:
+    """IndexedQuizStore observer tracking which questions are already in history"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = Counter()
+
+    def reset(self):
+        with self._lock:
+            self._seen.clear()
+
+    def quiz_added(self, quiz: Dict):
+        with self._lock:
+            for question in quiz.get("questions", []):
+                self._seen[question_fingerprint(question)] += 1
+
+    def quiz_removed(self, quiz: Dict):
+        with self._lock:
+            for question in quiz.get("questions", []):
+                fingerprint = question_fingerprint(question)
+                self._seen[fingerprint] -= 1
+                if self._seen[fingerprint] <= 0:
+                    del self._seen[fingerprint]
+
+    def __contains__(self, question: Dict) -> bool:
+        with self._lock:
+            return question_fingerprint(question) in self._seen
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quiz_cache (
+    cache_key TEXT PRIMARY KEY,
+    topic_key TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quiz_cache_topic ON quiz_cache(topic_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_quiz_cache_last_used ON quiz_cache(last_used);
+"""
+
+class QuizCache:
+    """Two-tier (memory LRU + SQLite) cache of generated questions"""
+
+    def __init__(self, path: str, prompt_version: str, ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 256, max_disk_entries: int = 10000, touch_interval: float = 30.0):
+        self.prompt_version = prompt_version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        # cache_key -> last_used not yet written to disk
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.time()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.hits = 0
+        self.related_hits = 0  # Served partly from entries for other keyword sets
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_touches(time.time())
+            self._conn.close()
+
+    def topic_key(self, topic: str, difficulty: str) -> str:
+        return json.dumps([_normalize(topic), _normalize(difficulty), self.prompt_version])
+
+    def cache_key(self, topic: str, keywords: List[str], difficulty: str) -> str:
+        normalized = sorted({_normalize(keyword) for keyword in keywords})
+        raw = json.dumps([self.topic_key(topic, difficulty), normalized])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _fresh(self, entry: Dict, now: float) -> bool:
+        return now - entry["created_at"] < self.ttl
+
+    def _remember(self, key: str, entry: Dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._memory.get(key)
+        if entry is None:
+            row = self._conn.execute(
+                "SELECT keywords, questions, tokens, created_at FROM quiz_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = {"keywords": json.loads(row[0]), "questions": json.loads(row[1]),
+                     "tokens": row[2], "created_at": row[3]}
+        if not self._fresh(entry, now):
+            self._memory.pop(key, None)
+            self._conn.execute("DELETE FROM quiz_cache WHERE cache_key = ?", (key,))
+            return None
+        self._remember(key, entry)
+        self._touched[key] = now
+        if now - self._flushed_at >= self.touch_interval:
+            self._flush_touches(now)
+        return entry
+
+    def _flush_touches(self, now: float):
+        """Write the pending last_used times, in one transaction unless already in one"""
+        self._flushed_at = now
+        if not self._touched:
+            return
+        rows = [(used, key) for key, used in self._touched.items()]
+        self._touched.clear()
+        if self._conn.in_transaction:
+            self._conn.executemany("UPDATE quiz_cache SET last_used = ? WHERE cache_key = ?", rows)
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("UPDATE quiz_cache SET last_used = ? WHERE cache_key = ?", rows)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def lookup(self, topic: str, keywords: List[str], difficulty: str, seen=None,
+               min_questions: int = 3, max_questions: int = 5) -> Optional[List[Dict]]:
+        """
+        Up to max_questions cached questions not in seen, or None if fewer
+        than min_questions are available.
+        """
+        now = time.time()
+        wanted = {_normalize(keyword) for keyword in keywords}
+        key = self.cache_key(topic, keywords, difficulty)
+        with self._lock:
+            picked, fingerprints, saved = [], set(), 0.0
+
+            def take(entry: Dict, keyword_filter: bool):
+                nonlocal saved
+                per_question = entry["tokens"] / max(len(entry["questions"]), 1)
+                for question in entry["questions"]:
+                    if len(picked) >= max_questions:
+                        return
+                    fingerprint = question_fingerprint(question)
+                    if fingerprint in fingerprints or (seen is not None and question in seen):
+                        continue
+                    if keyword_filter and _normalize(question.get("keyword", "")) not in wanted:
+                        continue
+                    picked.append(question)
+                    fingerprints.add(fingerprint)
+                    saved += per_question
+
+            exact = self._load(key, now)
+            if exact is not None:
+                take(exact, keyword_filter=False)
+            from_exact = len(picked)
+            if len(picked) < min_questions:
+                # Reuse questions on the same keywords from related requests
+                rows = self._conn.execute(
+                    "SELECT cache_key, keywords, questions, tokens, created_at FROM quiz_cache "
+                    "WHERE topic_key = ? AND created_at > ? AND cache_key != ? ORDER BY last_used DESC LIMIT 50",
+                    (self.topic_key(topic, difficulty), now - self.ttl, key),
+                ).fetchall()
+                for row in rows:
+                    if wanted & set(json.loads(row[1])):
+                        take({"questions": json.loads(row[2]), "tokens": row[3]}, keyword_filter=True)
+                    if len(picked) >= max_questions:
+                        break
+
+            if len(picked) < min_questions:
+                self.misses += 1
+                return None
+            if from_exact == len(picked):
+                self.hits += 1
+            else:
+                self.related_hits += 1
+            self.tokens_saved += int(saved)
+            return picked
+
+    def store(self, topic: str, keywords: List[str], difficulty: str, questions: List[Dict], tokens: int):
+        """Add a completion's questions to the entry for this request"""
+        now = time.time()
+        key = self.cache_key(topic, keywords, difficulty)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Merge into the disk copy, which may hold another process's additions
+                self._memory.pop(key, None)
+                entry = self._load(key, now)
+                if entry is None:
+                    entry = {"keywords": sorted({_normalize(k) for k in keywords}), "questions": [],
+                             "tokens": 0, "created_at": now}
+                known = {question_fingerprint(q) for q in entry["questions"]}
+                entry["questions"] = entry["questions"] + [q for q in questions if question_fingerprint(q) not in known]
+                entry["tokens"] += tokens
+                self._remember(key, entry)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO quiz_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, self.topic_key(topic, difficulty), json.dumps(entry["keywords"]),
+                     json.dumps(entry["questions"]), entry["tokens"], entry["created_at"], now),
+                )
+                overflow = self._conn.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    # Evict by up-to-date use times
+                    self._flush_touches(now)
+                    self._conn.execute(
+                        "DELETE FROM quiz_cache WHERE cache_key IN "
+                        "(SELECT cache_key FROM quiz_cache ORDER BY last_used LIMIT ?)", (overflow,)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.related_hits + self.misses
+            return {
+                "hits": self.hits,
+                "related_hits": self.related_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.related_hits) / lookups, 4) if lookups else 0,
+                "tokens_saved": self.tokens_saved,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._conn.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0],
+            }
@@ -0,0 +1,144 @@
+"""
+Streaming export of quiz history.
+
+Every format is produced from an iterator of quizzes and yields bytes a
+chunk at a time, so an export never holds the whole history in memory.
+
+- NDJSON: one stored quiz per line, exactly as stored. Lossless, and the
+  format POST /quiz-history/import reads back.
+- CSV and Parquet: columnar-friendly flat rows, one per question, with the
+  quiz's metadata repeated and the user's answer to that question joined
+  in. Quizzes without questions have no rows. Parquet needs pyarrow
+  (pip install pyarrow); each chunk of rows becomes one row group.
+"""
+
+import csv
+import io
+from typing import Dict, Iterable, Iterator, List
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional; only the Parquet export needs it
+    pyarrow = None
+
+PARQUET_AVAILABLE = pyarrow is not None
+
+COLUMNS = (
+    "quiz_id", "topic", "quiz_keyword", "generated_at", "completed_at", "score", "total_questions",
+    "question_index", "question", "keyword", "difficulty", "choice1", "choice2", "choice3", "choice4",
+    "correct", "selected_answer", "is_correct",
+)
+
+def flat_rows(quiz: Dict) -> List[Dict]:
+    """One row per question of a quiz"""
+    answers = {answer.get("question_index"): answer for answer in quiz.get("user_answers", [])}
+    rows = []
+    for index, question in enumerate(quiz.get("questions", [])):
+        answer = answers.get(index, {})
+        rows.append({
+            "quiz_id": quiz.get("quiz_id", ""),
+            "topic": quiz.get("topic", ""),
+            "quiz_keyword": quiz.get("keyword", ""),
+            "generated_at": quiz.get("generated_at", ""),
+            "completed_at": quiz.get("completed_at"),
+            "score": quiz.get("score"),
+            "total_questions": quiz.get("total_questions", 0),
+            "question_index": index,
+            "question": question.get("question", ""),
+            "keyword": question.get("keyword", ""),
+            "difficulty": question.get("difficulty", ""),
+            "choice1": question.get("choice1", ""),
+            "choice2": question.get("choice2", ""),
+            "choice3": question.get("choice3", ""),
+            "choice4": question.get("choice4", ""),
+            "correct": question.get("correct", ""),
+            "selected_answer": answer.get("selected_answer"),
+            "is_correct": answer.get("is_correct"),
+        })
+    return rows
+
+def _row_chunks(quizzes: Iterable[Dict], chunk_rows: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for quiz in quizzes:
+        chunk.extend(flat_rows(quiz))
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def ndjson_chunks(quizzes: Iterable[Dict], dumps, chunk_quizzes: int = 200) -> Iterator[bytes]:
+    """Newline-delimited JSON, one quiz per line; dumps encodes a quiz to bytes"""
+    lines = []
+    for quiz in quizzes:
+        lines.append(dumps(quiz))
+        if len(lines) >= chunk_quizzes:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def csv_chunks(quizzes: Iterable[Dict], chunk_rows: int = 2000) -> Iterator[bytes]:
+    """CSV with a header row, one row per question"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for rows in _row_chunks(quizzes, chunk_rows):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer produced since the last take()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_schema():
+    string, integer = pyarrow.string(), pyarrow.int64()
+    types = {"score": integer, "total_questions": integer, "question_index": integer, "is_correct": pyarrow.bool_()}
+    return pyarrow.schema([(column, types.get(column, string)) for column in COLUMNS])
+
+def parquet_chunks(quizzes: Iterable[Dict], chunk_rows: int = 10000) -> Iterator[bytes]:
+    """Parquet file (zstd compressed), one row group per chunk_rows rows"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in _row_chunks(quizzes, chunk_rows):
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
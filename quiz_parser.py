@@ -0,0 +1,189 @@
+"""
+Parsing of the quiz JSON returned by the model.
+
+JSONArrayStreamParser is fed the completion text piece by piece (as it
+streams in) and hands back each array element as soon as its closing brace
+arrives, so callers can act on question 1 before the model has written
+question 2. It looks inside a wrapping {"questions": [...]} object too.
+
+parse_quiz_items recovers as many items as possible from a whole completion
+that isn't clean JSON: markdown code fences, trailing commas, a wrapping
+{"questions": [...]} object or a truncated final element. ParseStats counts
+how often each kind of repair was needed.
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+
+class QuizParseError(ValueError):
+    """The completion contained no usable quiz items"""
+
+def strip_trailing_commas(text: str) -> str:
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+class JSONArrayStreamParser:
+    """
+    Incrementally extract complete objects from a streamed JSON array.
+
+    Objects are taken from a bare array or from a sequence of top-level
+    objects (NDJSON). With unwrap set, a top-level object with that key
+    holding an array, such as {"questions": [...]}, is treated as a wrapper
+    and the objects in that array are extracted instead. errors counts
+    elements that weren't valid JSON, skipped the array elements that
+    weren't objects.
+    """
+
+    def __init__(self, unwrap: Optional[str] = None):
+        self.unwrap = unwrap
+        self._buffer: Optional[List[str]] = None
+        self._item_depth = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._key: Optional[List[str]] = None
+        self._last_key: Optional[str] = None
+        self._wrapped = False
+        self._expecting = False
+        self.errors = 0
+        self.skipped = 0
+
+    @property
+    def incomplete(self) -> bool:
+        """Whether an item was started but not finished, as when the text was cut off"""
+        return self._buffer is not None
+
+    def _in_items(self) -> bool:
+        """Whether the innermost open container is the array items come from"""
+        return self._stack == ["["] or (self._wrapped and self._stack == ["{", "["])
+
+    def feed(self, text: str) -> List[Dict]:
+        """Consume more completion text and return the objects it completed"""
+        completed = []
+        for char in text:
+            if self._buffer is not None:
+                self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key is not None:
+                        self._last_key = "".join(self._key)
+                        self._key = None
+                elif self._key is not None:
+                    self._key.append(char)
+                continue
+            if char.isspace():
+                continue
+            if self._expecting and self._buffer is None and char not in "{]":
+                self.skipped += 1
+            self._expecting = False
+            if char == '"':
+                self._in_string = True
+                if self.unwrap is not None and self._stack == ["{"]:
+                    self._key = []
+            elif char == "{":
+                if self._buffer is None and (not self._stack or self._in_items()):
+                    self._buffer = [char]
+                    self._item_depth = len(self._stack)
+                self._stack.append(char)
+            elif char == "[":
+                if (self.unwrap is not None and not self._wrapped and self._stack == ["{"]
+                        and self._last_key == self.unwrap):
+                    # The object being read is a wrapper, not an item
+                    self._wrapped = True
+                    self._buffer = None
+                self._stack.append(char)
+                self._expecting = self._in_items()
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._wrapped = False
+                    self._last_key = None
+                if char == "}" and self._buffer is not None and len(self._stack) == self._item_depth:
+                    try:
+                        item = json.loads(strip_trailing_commas("".join(self._buffer)))
+                    except ValueError:
+                        self.errors += 1
+                    else:
+                        if isinstance(item, dict):
+                            completed.append(item)
+                    self._buffer = None
+            elif char == ",":
+                self._expecting = self._buffer is None and self._in_items()
+        return completed
+
+def _unwrap(data, key: str):
+    """Accept a bare array or an object wrapping it under key"""
+    if isinstance(data, dict) and isinstance(data.get(key), list):
+        return data[key]
+    return data
+
+def parse_quiz_items(text: str, key: str = "questions") -> Tuple[List[Dict], str]:
+    """
+    Recover the array items from a completion. Returns the items and how they
+    were obtained: "clean", "repaired" (fences or trailing commas removed),
+    "partial" (only the complete elements of malformed or truncated output)
+    or "failed" (nothing usable).
+    """
+    stripped = _FENCE.sub("", text.strip())
+    outcome = "clean" if stripped == text.strip() else "repaired"
+    for candidate in (stripped, strip_trailing_commas(stripped)):
+        try:
+            data = _unwrap(json.loads(candidate), key)
+        except ValueError:
+            outcome = "repaired"
+            continue
+        if isinstance(data, list):
+            return [item for item in data if isinstance(item, dict)], outcome
+
+    # Salvage every complete element; the wrapper object, if any, is skipped
+    start = stripped.find("[")
+    parser = JSONArrayStreamParser()
+    items = parser.feed(stripped[start + 1:] if start >= 0 else stripped)
+    return items, "partial" if items else "failed"
+
+class ParseStats:
+    """Counters describing how model output had to be parsed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = Counter()
+        self.items = Counter()
+
+    def record(self, outcome: str, valid: int = 0, invalid: int = 0):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.items["valid"] += valid
+            self.items["invalid"] += invalid
+
+    def record_rerequest(self, recovered: int):
+        with self._lock:
+            self.items["rerequests"] += 1
+            self.items["recovered_by_rerequest"] += recovered
+
+    def stats(self) -> Dict:
+        with self._lock:
+            completions = sum(self.outcomes.values())
+            not_clean = completions - self.outcomes["clean"]
+            return {
+                "completions": completions,
+                "outcomes": dict(self.outcomes),
+                "failure_rate": round(self.outcomes["failed"] / completions, 4) if completions else 0,
+                "needed_repair_rate": round(not_clean / completions, 4) if completions else 0,
+                # Completions that a plain json.loads would have thrown away
+                "completions_salvaged": self.outcomes["repaired"] + self.outcomes["partial"],
+                "valid_items": self.items["valid"],
+                "invalid_items": self.items["invalid"],
+                "rerequests": self.items["rerequests"],
+                "questions_recovered_by_rerequest": self.items["recovered_by_rerequest"],
+            }
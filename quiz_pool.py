@@ -0,0 +1,273 @@
+"""
+Pool of pre-generated quizzes kept ready for the users' tracked topics.
+
+Each user tracks the topics they ask about. For every tracked topic and
+difficulty the pool holds up to `size` ready quizzes, each focused on one of
+a tracking user's keywords (rotating through them). Whenever a pool drops to
+`low_watermark` it is queued for refill and a fixed number of background
+workers generate quizzes until it is full again, charging each completion to
+a tracking user with hourly token budget left. /generate-quiz takes a
+matching quiz the user hasn't seen from the pool when one is ready instead
+of waiting on a live completion; quizzes a user has seen stay for others.
+
+A user's topic stops being tracked once they haven't asked for it within
+`topic_ttl`, and pooled quizzes older than that are dropped, so neither the
+tracked set nor the pools grow without bound.
+
+Tracked topics are saved to a small JSON file so pools refill after a restart.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _usable_keywords(keywords) -> List[str]:
+    """Keywords a quiz can be generated for: non-blank strings"""
+    return [k for k in keywords if isinstance(k, str) and k.strip()]
+
+class QuizPool:
+    """Per-(topic, difficulty) buffers of ready quizzes with background refill"""
+
+    def __init__(self, generate: Callable[[str, List[str], str], Awaitable[Tuple[List[Dict], int]]],
+                 state_path: str, size: int = 0, low_watermark: int = 1, workers: int = 2,
+                 tokens_per_hour: int = 20000, difficulties=("small", "medium", "big"),
+                 check_interval: float = 60.0, topic_ttl: float = 7 * 24 * 3600, default_user: str = "default"):
+        self.generate = generate
+        self.state_path = state_path
+        self.size = size
+        self.low_watermark = low_watermark
+        self.workers = workers
+        self.tokens_per_hour = tokens_per_hour  # per user
+        self.difficulties = list(difficulties)
+        self.check_interval = check_interval
+        self.topic_ttl = topic_ttl
+        # user_id -> topic key -> {"topic", "keywords", "next", "requested_at"}
+        self._topics: Dict[str, Dict[str, Dict]] = {}
+        # Pooled entries: {"keyword", "questions", "created_at"}
+        self._pools: Dict[Tuple[str, str], deque] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued = set()
+        self._tasks: List[asyncio.Task] = []
+        self._spent: Dict[str, deque] = {}  # user_id -> (timestamp, tokens) over the last hour
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+        self.failures = 0
+        self.budget_skips = 0
+        self.expired = 0
+        self._load_state(default_user)
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _load_state(self, default_user: str):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    for entry in json.load(f):
+                        # A topic without keywords has nothing to pre-generate
+                        keywords = _usable_keywords(entry.get("keywords") or [])
+                        if keywords:
+                            # Files from before per-user tracking belong to the default user
+                            topics = self._topics.setdefault(entry.get("user_id", default_user), {})
+                            topics[_normalize(entry["topic"])] = {
+                                "topic": entry["topic"], "keywords": keywords, "next": 0,
+                                "requested_at": entry.get("requested_at", time.time()),
+                            }
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Error loading tracked topics: {str(e)}")
+
+    def _save_state(self):
+        try:
+            with open(self.state_path, 'w') as f:
+                json.dump([
+                    {"user_id": user_id, "topic": t["topic"], "keywords": t["keywords"], "requested_at": t["requested_at"]}
+                    for user_id, topics in self._topics.items() for t in topics.values()
+                ], f)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error saving tracked topics: {str(e)}")
+
+    def track(self, user_id: str, topic: str, keywords: List[str]):
+        """Start (or keep) pre-generating quizzes for a user's topic and its keywords"""
+        keywords = _usable_keywords(keywords)
+        if not self.enabled or not keywords:
+            return
+        key = _normalize(topic)
+        topics = self._topics.setdefault(user_id, {})
+        tracked = topics.get(key)
+        if tracked is None:
+            tracked = topics[key] = {"topic": topic, "keywords": [], "next": 0, "requested_at": 0.0}
+        now = time.time()
+        new_keywords = [k for k in keywords if k not in tracked["keywords"]]
+        # The saved request time only needs to be about right for expiry after a restart
+        stale = now - tracked["requested_at"] > self.check_interval
+        tracked["requested_at"] = now
+        if new_keywords:
+            tracked["keywords"] = tracked["keywords"] + new_keywords
+        if new_keywords or stale:
+            self._save_state()
+        for difficulty in self.difficulties:
+            self._schedule(key, difficulty)
+
+    def take(self, topic: str, keywords: List[str], difficulty: str, seen=None) -> Optional[List[Dict]]:
+        """
+        A ready quiz on one of the keywords without questions in seen, or None
+        if the pool has none. Quizzes skipped as seen stay for other users.
+        """
+        if not self.enabled:
+            return None
+        key = (_normalize(topic), difficulty)
+        pool = self._pools.get(key)
+        wanted = {_normalize(keyword) for keyword in keywords}
+        picked = None
+        if pool:
+            for entry in list(pool):
+                if _normalize(entry["keyword"]) not in wanted:
+                    continue
+                if seen is None or not any(q in seen for q in entry["questions"]):
+                    pool.remove(entry)
+                    picked = entry["questions"]
+                    break
+        if picked is None:
+            self.empty += 1
+        else:
+            self.served += 1
+        self._schedule(*key)
+        return picked
+
+    def _trackers(self, topic_key: str) -> List[Tuple[str, Dict]]:
+        """(user_id, tracked entry) of every user tracking a topic"""
+        return [(user_id, topics[topic_key]) for user_id, topics in self._topics.items() if topic_key in topics]
+
+    def _schedule(self, topic_key: str, difficulty: str):
+        key = (topic_key, difficulty)
+        if self._queue is None or key in self._queued or not self._trackers(topic_key):
+            return
+        if len(self._pools.get(key, ())) <= self.low_watermark:
+            self._queued.add(key)
+            self._queue.put_nowait(key)
+
+    def _tokens_last_hour(self, user_id: str) -> int:
+        spent = self._spent.get(user_id)
+        if spent is None:
+            return 0
+        cutoff = time.time() - 3600
+        while spent and spent[0][0] < cutoff:
+            spent.popleft()
+        if not spent:
+            del self._spent[user_id]
+            return 0
+        return sum(tokens for _, tokens in spent)
+
+    def _expire(self):
+        """Stop tracking topics not requested within topic_ttl and drop pooled quizzes older than it"""
+        cutoff = time.time() - self.topic_ttl
+        expired = 0
+        for user_id, topics in list(self._topics.items()):
+            for topic_key, tracked in list(topics.items()):
+                if tracked["requested_at"] < cutoff:
+                    del topics[topic_key]
+                    expired += 1
+            if not topics:
+                del self._topics[user_id]
+        for key, pool in list(self._pools.items()):
+            if not self._trackers(key[0]):
+                del self._pools[key]
+                continue
+            while pool and pool[0]["created_at"] < cutoff:
+                pool.popleft()
+        if expired:
+            self.expired += expired
+            self._save_state()
+
+    async def _refill(self, key: Tuple[str, str]):
+        topic_key, difficulty = key
+        pool = self._pools.setdefault(key, deque())
+        while len(pool) < self.size:
+            trackers = self._trackers(topic_key)
+            if not trackers:
+                return
+            # Charge the tracking user with the most budget left
+            user_id, tracked = min(trackers, key=lambda tracker: self._tokens_last_hour(tracker[0]))
+            if self._tokens_last_hour(user_id) >= self.tokens_per_hour:
+                self.budget_skips += 1
+                return
+            keyword = tracked["keywords"][tracked["next"] % len(tracked["keywords"])]
+            tracked["next"] += 1
+            try:
+                questions, tokens = await self.generate(tracked["topic"], [keyword], difficulty)
+            except Exception as e:
+                self.failures += 1
+                logging.getLogger(__name__).warning(f"Error pre-generating quiz for {tracked['topic']}: {str(e)}")
+                return
+            self._spent.setdefault(user_id, deque()).append((time.time(), tokens))
+            self.generated += 1
+            if questions:
+                pool.append({"keyword": keyword, "questions": questions, "created_at": time.time()})
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await self._refill(key)
+            except Exception as e:
+                # A bad entry mustn't stop the worker refilling every other pool
+                self.failures += 1
+                logging.getLogger(__name__).warning(f"Error refilling quiz pool {key}: {str(e)}")
+            finally:
+                self._queued.discard(key)
+
+    def _schedule_all(self):
+        for topic_key in {key for topics in self._topics.values() for key in topics}:
+            for difficulty in self.difficulties:
+                self._schedule(topic_key, difficulty)
+
+    async def _maintenance(self):
+        # Expire idle topics, and retry pools skipped for budget or failures once the hour rolls over
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self._expire()
+            self._schedule_all()
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+        self._expire()
+        self._schedule_all()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "served": self.served,
+            "empty": self.empty,
+            "generated": self.generated,
+            "failures": self.failures,
+            "budget_skips": self.budget_skips,
+            "expired_topics": self.expired,
+            "tokens_last_hour": sum(self._tokens_last_hour(user_id) for user_id in list(self._spent)),
+            "tokens_per_hour": self.tokens_per_hour,
+            "tracked_topics": sum(len(topics) for topics in self._topics.values()),
+            "users": {
+                user_id: {"tracked_topics": len(self._topics.get(user_id, ())),
+                          "tokens_last_hour": self._tokens_last_hour(user_id)}
+                for user_id in sorted(set(self._topics) | set(self._spent))
+            },
+            "ready": {f"{topic}/{difficulty}": len(pool) for (topic, difficulty), pool in self._pools.items()},
+        }
@@ -0,0 +1,319 @@
+"""
+Spaced-repetition scheduling (SM-2) of keywords for /due.
+
+ReviewScheduler is registered as an IndexedQuizStore observer. Every
+completed quiz is a review of each keyword its questions covered, graded
+0-5 from the share of that keyword's questions answered correctly. Each
+(topic, keyword) keeps SM-2 memory state (easiness, repetitions, interval)
+and the review that produced it, so /due only sorts the current state of
+each keyword and never rescans history.
+
+A review newer than the keyword's latest one is applied as a single SM-2
+step. Reviews arriving out of order, or removed with their quiz, replay
+that keyword's own reviews. recompute() rebuilds all state from a full
+history in one batch, off the lock, and swaps it in.
+
+Timestamps are compared in UTC: clients send UTC (Z suffix or an offset)
+and timestamps without an offset are the server's own local time.
+"""
+
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MIN_EASINESS = 1.3
+INITIAL_EASINESS = 2.5
+# Intervals grow geometrically; cap them (as Anki does) so due dates stay representable
+MAX_INTERVAL_DAYS = 36500.0
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+    """ISO timestamp as naive UTC; one without an offset is taken as the server's local time"""
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        # astimezone() reads a naive datetime as local time
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def utc_now() -> datetime:
+    """The current time as naive UTC, comparable with parse_timestamp()"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def format_utc(moment: datetime) -> str:
+    """A naive UTC datetime as ISO with an explicit +00:00 offset"""
+    return moment.replace(tzinfo=timezone.utc).isoformat()
+
+def grade(correct: int, total: int) -> int:
+    """SM-2 quality (0-5) for one keyword's questions in one quiz"""
+    if total <= 0:
+        return 0
+    ratio = correct / total
+    if ratio >= 1:
+        return 5
+    if ratio >= 0.75:
+        return 4
+    if ratio >= 0.5:
+        return 3
+    if ratio > 0:
+        return 2
+    return 1
+
+class _Memory:
+    """SM-2 state of one keyword plus the reviews it was computed from"""
+
+    def __init__(self):
+        # Sorted (reviewed_at, quiz_id, quality) tuples
+        self.reviews: List[Tuple[datetime, str, int]] = []
+        self.new_since: Optional[datetime] = None
+        self.reset()
+
+    def reset(self):
+        self.easiness = INITIAL_EASINESS
+        self.repetitions = 0
+        self.interval = 0.0
+        self.last_reviewed: Optional[datetime] = None
+        self.last_quality: Optional[int] = None
+
+    def step(self, reviewed_at: datetime, quality: int):
+        """Apply one SM-2 review"""
+        if quality >= 3:
+            if self.repetitions == 0:
+                self.interval = 1.0
+            elif self.repetitions == 1:
+                self.interval = 6.0
+            else:
+                self.interval = min(self.interval * self.easiness, MAX_INTERVAL_DAYS)
+            self.repetitions += 1
+        else:
+            self.repetitions = 0
+            self.interval = 1.0
+        self.easiness = max(MIN_EASINESS, self.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.last_reviewed = reviewed_at
+        self.last_quality = quality
+
+    def replay(self):
+        self.reset()
+        for reviewed_at, _, quality in self.reviews:
+            self.step(reviewed_at, quality)
+
+    @property
+    def due_at(self) -> Optional[datetime]:
+        if self.last_reviewed is None:
+            return self.new_since
+        return self.last_reviewed + timedelta(days=self.interval)
+
+class ReviewScheduler:
+    """IndexedQuizStore observer keeping SM-2 state per (topic, keyword)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._memory: Dict[Tuple[str, str], _Memory] = {}
+        # quiz_id -> generated_at of every quiz with questions on each keyword
+        self._introduced: Dict[Tuple[str, str], Dict[str, datetime]] = {}
+        # Changes seen by each recompute() in progress, replayed onto its result
+        self._recordings: List[List[Tuple[str, Optional[Dict]]]] = []
+        self.incremental_updates = 0
+        self.replays = 0
+
+    def _record(self, event: str, quiz: Optional[Dict]):
+        for recording in self._recordings:
+            recording.append((event, quiz))
+
+    def reset(self):
+        with self._lock:
+            self._record("reset", None)
+            self._memory.clear()
+            self._introduced.clear()
+
+    @staticmethod
+    def _reviews(quiz: Dict) -> Dict[Tuple[str, str], int]:
+        """SM-2 quality per (topic, keyword) reviewed in a completed quiz"""
+        questions = quiz.get("questions", [])
+        totals: Dict[Tuple[str, str], List[int]] = {}
+        for answer in quiz.get("user_answers", []):
+            index = answer.get("question_index", -1)
+            if not 0 <= index < len(questions):
+                continue
+            key = (quiz.get("topic", ""), questions[index].get("keyword", ""))
+            counts = totals.setdefault(key, [0, 0])
+            counts[0] += 1 if answer.get("is_correct") else 0
+            counts[1] += 1
+        return {key: grade(correct, total) for key, (correct, total) in totals.items()}
+
+    def quiz_added(self, quiz: Dict):
+        with self._lock:
+            self._record("quiz_added", quiz)
+            self._apply(quiz, replay=True)
+
+    def quiz_removed(self, quiz: Dict):
+        with self._lock:
+            self._record("quiz_removed", quiz)
+            self._remove(quiz)
+
+    def _remove(self, quiz: Dict):
+        """Forget a quiz's introductions and reviews; a no-op for parts not recorded"""
+        quiz_id = quiz["quiz_id"]
+        for key in self._introductions(quiz):
+            introduced = self._introduced.get(key, {})
+            introduced.pop(quiz_id, None)
+            if not introduced:
+                self._introduced.pop(key, None)
+            self._refresh_new(key)
+        reviewed_at = parse_timestamp(quiz.get("completed_at"))
+        for key, quality in self._reviews(quiz).items():
+            memory = self._memory.get(key)
+            if memory is None or reviewed_at is None:
+                continue
+            entry = (reviewed_at, quiz_id, quality)
+            position = bisect.bisect_left(memory.reviews, entry)
+            if position < len(memory.reviews) and memory.reviews[position] == entry:
+                del memory.reviews[position]
+                memory.replay()
+                self.replays += 1
+        for key in set(self._introductions(quiz)) | set(self._reviews(quiz)):
+            memory = self._memory.get(key)
+            if memory is not None and not memory.reviews and key not in self._introduced:
+                del self._memory[key]
+
+    @staticmethod
+    def _introductions(quiz: Dict) -> List[Tuple[str, str]]:
+        return list(dict.fromkeys((quiz.get("topic", ""), q.get("keyword", "")) for q in quiz.get("questions", [])))
+
+    def _refresh_new(self, key: Tuple[str, str]):
+        memory = self._memory.get(key)
+        if memory is not None:
+            introduced = self._introduced.get(key)
+            memory.new_since = min(introduced.values()) if introduced else None
+
+    def _apply(self, quiz: Dict, replay: bool) -> List[Tuple[str, str]]:
+        """Record a quiz; returns keys whose reviews must be replayed (when replay is False)"""
+        quiz_id = quiz["quiz_id"]
+        generated_at = parse_timestamp(quiz.get("generated_at"))
+        if generated_at is not None:
+            for key in self._introductions(quiz):
+                self._introduced.setdefault(key, {})[quiz_id] = generated_at
+                memory = self._memory.setdefault(key, _Memory())
+                if memory.new_since is None or generated_at < memory.new_since:
+                    memory.new_since = generated_at
+
+        reviewed_at = parse_timestamp(quiz.get("completed_at"))
+        stale = []
+        if reviewed_at is None:
+            return stale
+        for key, quality in self._reviews(quiz).items():
+            memory = self._memory.setdefault(key, _Memory())
+            entry = (reviewed_at, quiz_id, quality)
+            if not memory.reviews or entry > memory.reviews[-1]:
+                memory.reviews.append(entry)
+                if replay:
+                    memory.step(reviewed_at, quality)
+                    self.incremental_updates += 1
+                else:
+                    stale.append(key)
+            else:
+                bisect.insort(memory.reviews, entry)
+                if replay:
+                    memory.replay()
+                    self.replays += 1
+                else:
+                    stale.append(key)
+        return stale
+
+    def recompute(self, quizzes: Iterable[Dict]) -> Dict:
+        """
+        Rebuild all scheduling state from full history, replaying each keyword
+        once. The new state is built without holding the lock, so /due keeps
+        answering from the current state meanwhile, and then swapped in.
+        Changes reported while it was built are recorded and replayed onto
+        it first; pass a lazy iterator such as store.history() so nothing
+        written before recording starts can be missing from it.
+        """
+        started = time.perf_counter()
+        recording: List[Tuple[str, Optional[Dict]]] = []
+        with self._lock:
+            self._recordings.append(recording)
+        try:
+            # Iterated off the lock: reading the history can take the store's
+            # lock, which writers hold while notifying this observer
+            rebuilt = ReviewScheduler()
+            stale = set()
+            quiz_count = 0
+            for quiz in quizzes:
+                stale.update(rebuilt._apply(quiz, replay=False))
+                quiz_count += 1
+            for key in stale:
+                rebuilt._memory[key].replay()
+
+            with self._lock:
+                # A change may or may not be in what was read, so an added quiz
+                # replaces whatever of it the rebuilt state has
+                for event, quiz in recording:
+                    if event == "reset":
+                        rebuilt._memory.clear()
+                        rebuilt._introduced.clear()
+                        continue
+                    rebuilt._remove(quiz)
+                    if event == "quiz_added":
+                        rebuilt._apply(quiz, replay=True)
+                self._memory, self._introduced = rebuilt._memory, rebuilt._introduced
+                return {
+                    "quizzes": quiz_count,
+                    "replayed_changes": len(recording),
+                    "keywords": len(self._memory),
+                    "reviews": sum(len(m.reviews) for m in self._memory.values()),
+                    "seconds": round(time.perf_counter() - started, 4),
+                }
+        finally:
+            with self._lock:
+                self._recordings.remove(recording)
+
+    def due(self, now: Optional[datetime] = None, limit: int = 20, topic: Optional[str] = None,
+            include_new: bool = False) -> Tuple[List[Dict], int]:
+        """
+        Keywords due for review, most urgent first: the furthest past due
+        relative to their interval, then the lowest easiness. Returns the
+        page and the total number due.
+        """
+        now = now or utc_now()
+        due = []
+        with self._lock:
+            for (key_topic, keyword), memory in self._memory.items():
+                if topic is not None and key_topic != topic:
+                    continue
+                reviewed = memory.last_reviewed is not None
+                if not reviewed and not include_new:
+                    continue
+                due_at = memory.due_at
+                if due_at is None or due_at > now:
+                    continue
+                overdue_days = (now - due_at).total_seconds() / 86400
+                # Never-reviewed keywords rank after anything already forgotten-prone
+                priority = overdue_days / max(memory.interval, 1.0) if reviewed else 0.0
+                due.append({
+                    "topic": key_topic,
+                    "keyword": keyword,
+                    "due_at": format_utc(due_at),
+                    "overdue_days": round(overdue_days, 2),
+                    "interval_days": round(memory.interval, 2),
+                    "easiness": round(memory.easiness, 2),
+                    "repetitions": memory.repetitions,
+                    "reviews": len(memory.reviews),
+                    "last_reviewed": format_utc(memory.last_reviewed) if reviewed else None,
+                    "last_quality": memory.last_quality,
+                    "priority": round(priority, 4),
+                })
+        due.sort(key=lambda item: (-item["priority"], item["easiness"], item["due_at"]))
+        return due[:limit], len(due)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "keywords": len(self._memory),
+                "reviewed_keywords": sum(1 for m in self._memory.values() if m.reviews),
+                "incremental_updates": self.incremental_updates,
+                "replays": self.replays,
+            }
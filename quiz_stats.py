@@ -0,0 +1,162 @@
+"""
+Running aggregates over quiz history for /quiz-stats.
+
+QuizStats is registered as an observer on IndexedQuizStore and gets every
+quiz as it is added and removed (an update is a removal of the old version
+followed by an add of the new one). Each call adjusts counters by that one
+quiz's contribution, so reading the stats never rescans history. Tokens
+are the prompt and completion tokens recorded with each quiz (zero for
+quizzes served from the cache or pool), counted on the day it was generated.
+"""
+
+import threading
+from collections import Counter
+from datetime import date
+from typing import Dict, Optional
+
+def _day(timestamp: Optional[str]) -> Optional[date]:
+    if not timestamp:
+        return None
+    try:
+        return date.fromisoformat(timestamp[:10])
+    except ValueError:
+        return None
+
+def _week(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+class _Bucket:
+    """Counters for one topic, keyword or time bucket"""
+
+    def __init__(self):
+        self.counts = Counter()
+        # Multiset of activity timestamps so last_seen survives deletes
+        self.seen = Counter()
+        self._last_seen: Optional[str] = None
+
+    def add_seen(self, timestamp: Optional[str], sign: int):
+        if not timestamp:
+            return
+        self.seen[timestamp] += sign
+        if self.seen[timestamp] <= 0:
+            del self.seen[timestamp]
+            if timestamp == self._last_seen:
+                self._last_seen = max(self.seen) if self.seen else None
+        elif self._last_seen is None or timestamp > self._last_seen:
+            self._last_seen = timestamp
+
+    def empty(self) -> bool:
+        return not +self.counts and not self.seen
+
+    def summary(self, keys) -> Dict:
+        counts = self.counts
+        attempts = counts["attempts"]
+        result = {key: counts[key] for key in keys}
+        result["accuracy"] = round(counts["correct"] / attempts * 100, 2) if attempts else 0
+        result["last_seen"] = self._last_seen
+        return result
+
+class QuizStats:
+    """Incrementally maintained totals and per-topic, per-keyword and per-period breakdowns"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.total_quizzes = 0
+        self.completed_quizzes = 0
+        self.scored_quizzes = 0
+        self.score_percentage_sum = 0.0
+        self.topics: Dict[str, _Bucket] = {}
+        self.keywords: Dict[str, _Bucket] = {}
+        self.daily: Dict[str, Counter] = {}
+        self.weekly: Dict[str, Counter] = {}
+
+    def quiz_added(self, quiz: Dict):
+        with self._lock:
+            self._apply(quiz, 1)
+
+    def quiz_removed(self, quiz: Dict):
+        with self._lock:
+            self._apply(quiz, -1)
+
+    def _bump(self, buckets: Dict[str, _Bucket], key: str, sign: int, timestamps=(), **counts):
+        bucket = buckets.setdefault(key, _Bucket())
+        for name, value in counts.items():
+            bucket.counts[name] += sign * value
+        for timestamp in timestamps:
+            bucket.add_seen(timestamp, sign)
+        if bucket.empty():
+            del buckets[key]
+
+    def _bump_series(self, day: Optional[date], sign: int, **counts):
+        if day is None:
+            return
+        for series, key in ((self.daily, day.isoformat()), (self.weekly, _week(day))):
+            bucket = series.setdefault(key, Counter())
+            for name, value in counts.items():
+                bucket[name] += sign * value
+            if not +bucket:
+                del series[key]
+
+    def _apply(self, quiz: Dict, sign: int):
+        generated_at = quiz.get("generated_at")
+        completed_at = quiz.get("completed_at")
+        completed = 1 if completed_at else 0
+        score = quiz.get("score")
+        total_questions = quiz.get("total_questions", 0)
+        questions = quiz.get("questions", [])
+        answers = quiz.get("user_answers", [])
+        correct = sum(1 for answer in answers if answer.get("is_correct"))
+        usage = quiz.get("usage") or {}
+        tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+        self.total_quizzes += sign
+        self.completed_quizzes += sign * completed
+        if score is not None and total_questions > 0:
+            self.scored_quizzes += sign
+            self.score_percentage_sum += sign * (score / total_questions) * 100
+
+        self._bump(self.topics, quiz.get("topic", "Unknown"), sign, (generated_at, completed_at),
+                   quizzes=1, completed=completed, questions=len(questions),
+                   attempts=len(answers), correct=correct, tokens=tokens)
+
+        for question in questions:
+            self._bump(self.keywords, question.get("keyword", ""), sign, (generated_at,), questions=1)
+        for answer in answers:
+            index = answer.get("question_index", -1)
+            if 0 <= index < len(questions):
+                self._bump(self.keywords, questions[index].get("keyword", ""), sign, (completed_at,),
+                           attempts=1, correct=1 if answer.get("is_correct") else 0)
+
+        self._bump_series(_day(generated_at), sign, generated=1, tokens=tokens)
+        self._bump_series(_day(completed_at), sign, completed=completed, attempts=len(answers), correct=correct)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            average = self.score_percentage_sum / self.scored_quizzes if self.scored_quizzes else 0
+            return {
+                "total_quizzes": self.total_quizzes,
+                "completed_quizzes": self.completed_quizzes,
+                "pending_quizzes": self.total_quizzes - self.completed_quizzes,
+                "average_score_percentage": round(average, 2),
+                "topics": {topic: bucket.counts["quizzes"] for topic, bucket in self.topics.items()},
+                "topic_breakdown": {
+                    topic: bucket.summary(("quizzes", "completed", "questions", "attempts", "correct", "tokens"))
+                    for topic, bucket in self.topics.items()
+                },
+                "keyword_breakdown": {
+                    keyword: bucket.summary(("questions", "attempts", "correct"))
+                    for keyword, bucket in self.keywords.items()
+                },
+                "daily": {day: self._series_entry(counts) for day, counts in sorted(self.daily.items())},
+                "weekly": {week: self._series_entry(counts) for week, counts in sorted(self.weekly.items())},
+            }
+
+    @staticmethod
+    def _series_entry(counts: Counter) -> Dict:
+        entry = {key: counts[key] for key in ("generated", "completed", "attempts", "correct", "tokens")}
+        entry["accuracy"] = round(counts["correct"] / counts["attempts"] * 100, 2) if counts["attempts"] else 0
+        return entry
@@ -0,0 +1,907 @@
+"""
+Storage backends for quiz history.
+
+QuizStore (the default) keeps one row per quiz in SQLite, so generating,
+submitting or deleting a quiz only touches that row instead of rewriting the
+whole history. The database runs in WAL mode so reads never wait on a writer.
+Triggers record every changed quiz_id in a quiz_changes log, so several
+processes can share one database: each one asks external_changes() which
+quizzes the others touched since it last looked.
+
+EventLogQuizStore keeps history in memory and persists it as an append-only
+event log with periodic snapshots.
+
+Both expose the same methods and store quizzes as plain dicts in the same
+shape as the old quiz_history.json entries. IndexedQuizStore wraps either one
+with resident indexes for constant-time lookups.
+"""
+
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    quiz_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    completed_at TEXT,
+    score INTEGER,
+    total_questions INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quizzes_topic ON quizzes(topic);
+CREATE INDEX IF NOT EXISTS idx_quizzes_generated_at ON quizzes(generated_at);
+CREATE TABLE IF NOT EXISTS quiz_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    quiz_id TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS quizzes_inserted AFTER INSERT ON quizzes
+BEGIN INSERT INTO quiz_changes (quiz_id) VALUES (NEW.quiz_id); END;
+CREATE TRIGGER IF NOT EXISTS quizzes_updated AFTER UPDATE ON quizzes
+BEGIN INSERT INTO quiz_changes (quiz_id) VALUES (NEW.quiz_id); END;
+CREATE TRIGGER IF NOT EXISTS quizzes_deleted AFTER DELETE ON quizzes
+BEGIN INSERT INTO quiz_changes (quiz_id) VALUES (OLD.quiz_id); END;
+CREATE TABLE IF NOT EXISTS store_info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# How many change log entries are kept for processes that haven't caught up yet
+CHANGE_LOG_KEEP = 10000
+
+class QuizStore:
+    """Quiz history stored one row per quiz in a SQLite database"""
+
+    def __init__(self, path: str, busy_timeout: float = 10.0):
+        self.path = path
+        self._lock = threading.Lock()
+        # Other processes may hold the write lock briefly; wait for it rather than failing
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Identifies this database, so versions of a recreated one never match old ones
+        self._conn.execute("INSERT OR IGNORE INTO store_info VALUES ('store_id', ?)", (uuid.uuid4().hex[:8],))
+        self._store_id = self._conn.execute("SELECT value FROM store_info WHERE key = 'store_id'").fetchone()[0]
+        # Change log position this connection has caught up to, and the seq
+        # ranges (exclusive start, inclusive end) its own writes produced since
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._synced = self._last_change()
+        self._own: List[Tuple[int, int]] = []
+        # Latest change reflected in what this connection has read or written
+        self._applied = self._synced
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _last_change(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM quiz_changes").fetchone()[0]
+
+    def _write(self, work: Callable[[], object]):
+        """Run work() in one write transaction, remembering which change log entries are ours"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._last_change()
+                result = work()
+                after = self._last_change()
+                if after // 1000 != before // 1000:
+                    self._conn.execute("DELETE FROM quiz_changes WHERE seq <= ?", (after - CHANGE_LOG_KEEP,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if after > before:
+                self._own.append((before, after))
+                self._applied = max(self._applied, after)
+            return result
+
+    @staticmethod
+    def _row_values(quiz: Dict):
+        return (
+            quiz.get("quiz_id", ""),
+            quiz.get("topic", ""),
+            quiz.get("keyword", ""),
+            quiz.get("generated_at", ""),
+            quiz.get("completed_at"),
+            quiz.get("score"),
+            quiz.get("total_questions", 0),
+            json.dumps(quiz),
+        )
+
+    def add(self, quiz: Dict):
+        """Insert a quiz, replacing any existing quiz with the same ID"""
+        self._write(lambda: self._conn.execute(
+            "INSERT OR REPLACE INTO quizzes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._row_values(quiz),
+        ))
+
+    def add_many(self, quizzes: List[Dict]):
+        """Insert several quizzes in one transaction"""
+        self._write(lambda: self._conn.executemany(
+            "INSERT OR REPLACE INTO quizzes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [self._row_values(quiz) for quiz in quizzes],
+        ))
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM quizzes WHERE quiz_id = ?", (quiz_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, quiz_id: str, changes: Dict) -> bool:
+        """Merge changes into a stored quiz. Returns False if the quiz doesn't exist"""
+        def work():
+            row = self._conn.execute("SELECT data FROM quizzes WHERE quiz_id = ?", (quiz_id,)).fetchone()
+            if row is None:
+                return False
+            quiz = json.loads(row[0])
+            quiz.update(changes)
+            # UPDATE rather than REPLACE so the quiz keeps its place in history order
+            self._conn.execute(
+                "UPDATE quizzes SET quiz_id = ?, topic = ?, keyword = ?, generated_at = ?, "
+                "completed_at = ?, score = ?, total_questions = ?, data = ? WHERE quiz_id = ?",
+                self._row_values(quiz) + (quiz_id,),
+            )
+            return True
+        return self._write(work)
+
+    def delete(self, quiz_id: str) -> bool:
+        """Delete a quiz. Returns False if the quiz doesn't exist"""
+        cursor = self._write(lambda: self._conn.execute("DELETE FROM quizzes WHERE quiz_id = ?", (quiz_id,)))
+        return cursor.rowcount > 0
+
+    def delete_many(self, quiz_ids: List[str]) -> int:
+        """Delete several quizzes in one transaction. Returns how many existed"""
+        cursor = self._write(lambda: self._conn.executemany(
+            "DELETE FROM quizzes WHERE quiz_id = ?", [(quiz_id,) for quiz_id in quiz_ids]
+        ))
+        return cursor.rowcount
+
+    @property
+    def version(self) -> str:
+        """
+        The history as of the latest change this connection has applied. Every
+        process that has caught up with external_changes() reports the same one.
+        """
+        return f"{self._store_id}.{self._applied}"
+
+    def changed_elsewhere(self) -> bool:
+        """Whether another connection has committed since external_changes() last ran"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+
+    def external_changes(self) -> Optional[List[str]]:
+        """
+        IDs of quizzes other connections added, changed or deleted since the
+        last call, oldest change first. None means the change log no longer
+        reaches back that far and the caller must reload everything.
+        """
+        with self._lock:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            oldest = self._conn.execute("SELECT MIN(seq) FROM quiz_changes").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT seq, quiz_id FROM quiz_changes WHERE seq > ? ORDER BY seq", (self._synced,)
+            ).fetchall()
+            truncated = oldest is not None and oldest > self._synced + 1
+            own = self._own
+            if rows:
+                self._synced = rows[-1][0]
+                self._applied = max(self._applied, self._synced)
+            self._own = [(start, end) for start, end in own if end > self._synced]
+            if truncated:
+                return None
+            changed = {}
+            for seq, quiz_id in rows:
+                if not any(start < seq <= end for start, end in own):
+                    changed.pop(quiz_id, None)
+                    changed[quiz_id] = None
+            return list(changed)
+
+    def all(self) -> List[Dict]:
+        """Every quiz in the order it was saved"""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM quizzes ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_all(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """
+        Every quiz in the order it was saved, read chunk_size rows at a time
+        so the whole history is never in memory. Writes made meanwhile may or
+        may not be included.
+        """
+        after = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, data FROM quizzes WHERE rowid > ? ORDER BY rowid LIMIT ?", (after, chunk_size)
+                ).fetchall()
+            for _, data in rows:
+                yield json.loads(data)
+            if len(rows) < chunk_size:
+                return
+            after = rows[-1][0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-time import of a legacy quiz_history.json file. The file is renamed
+        to <name>.migrated afterwards so the import never runs twice.
+        Returns the number of quizzes imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                quizzes = json.load(f)
+        except FileNotFoundError:
+            # Another worker process imported it first
+            return 0
+        quizzes = [quiz for quiz in quizzes if quiz.get("quiz_id")]
+        self.add_many(quizzes)
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError:
+            pass
+        return len(quizzes)
+
+class EventLogQuizStore:
+    """
+    Quiz history kept in memory and persisted as an append-only event log.
+
+    Every change is one small JSON line (quiz_generated, quiz_submitted or
+    quiz_deleted) appended to quiz_events.log, so write cost doesn't depend on
+    history size. fsyncs are batched: the log is synced once fsync_batch
+    events are pending or fsync_interval seconds have passed. Once the log
+    holds compact_after events it is set aside as quiz_events.log.<n> and a
+    fresh log started; a background thread then writes quiz_snapshot.json and
+    deletes the logs it covers, so writers never wait for the snapshot. On
+    startup the snapshot is loaded and any set-aside logs and the live log
+    replayed; a torn final line from a crash mid-append is dropped. Only one
+    process may use a log at a time.
+    """
+
+    def __init__(self, data_dir: str, fsync_batch: int = 32, fsync_interval: float = 1.0,
+                 compact_after: int = 10000):
+        self.log_path = os.path.join(data_dir, "quiz_events.log")
+        self.snapshot_path = os.path.join(data_dir, "quiz_snapshot.json")
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._quizzes: Dict[str, Dict] = {}
+        self._epoch = uuid.uuid4().hex[:8]
+        self._changes = 0
+        self._log_events = 0
+        self._unsynced = 0
+        # Numbers the set-aside logs; snapshot writes take _compact_lock so
+        # they land in that order
+        self._generation = 0
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._recover()
+        self._log = open(self.log_path, 'a')
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self._syncer.start()
+
+    def _rotated_logs(self) -> List[Tuple[int, str]]:
+        """Logs set aside for a snapshot that hasn't been written yet, oldest first"""
+        directory, name = os.path.split(self.log_path)
+        logs = []
+        for entry in os.listdir(directory):
+            suffix = entry[len(name) + 1:]
+            if entry.startswith(name + ".") and suffix.isdigit():
+                logs.append((int(suffix), os.path.join(directory, entry)))
+        return sorted(logs)
+
+    def _recover(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                for quiz in json.load(f):
+                    self._quizzes[quiz["quiz_id"]] = quiz
+        # Left behind when the process stopped before their snapshot was
+        # written (or after, before they were deleted: replaying is harmless)
+        for generation, path in self._rotated_logs():
+            with open(path, 'rb') as f:
+                for line in f:
+                    self._apply(json.loads(line))
+            self._generation = generation
+        if not os.path.exists(self.log_path):
+            return
+        valid_bytes = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash: everything after it is discarded
+                    logging.getLogger(__name__).warning(f"Dropping incomplete event at byte {valid_bytes} of {self.log_path}")
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self._apply(event)
+                self._log_events += 1
+                valid_bytes += len(line)
+        if valid_bytes != os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+    def _apply(self, event: Dict):
+        kind = event["event"]
+        if kind == "quiz_generated":
+            quiz = event["quiz"]
+            self._quizzes.pop(quiz["quiz_id"], None)
+            self._quizzes[quiz["quiz_id"]] = quiz
+        elif kind == "quiz_submitted":
+            quiz = self._quizzes.get(event["quiz_id"])
+            if quiz is not None:
+                quiz.update(event["changes"])
+        elif kind == "quiz_deleted":
+            self._quizzes.pop(event["quiz_id"], None)
+
+    def _append(self, events: List[Dict]):
+        """Apply events in memory and append them to the log. Caller holds the lock"""
+        for event in events:
+            self._apply(event)
+        self._log.write("".join(json.dumps(event) + "\n" for event in events))
+        self._log.flush()
+        self._log_events += len(events)
+        self._changes += len(events)
+        self._unsynced += len(events)
+        if self._unsynced >= self.fsync_batch:
+            self._fsync()
+        if self._log_events >= self.compact_after and self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+            self._compactor.start()
+
+    def _fsync(self):
+        if self._unsynced:
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if not self._log.closed:
+                    self._fsync()
+
+    def _rotate(self) -> Tuple[int, List[Dict]]:
+        """
+        Set the log aside, start an empty one and copy the quizzes it brings
+        the snapshot up to. Caller holds the lock
+        """
+        os.fsync(self._log.fileno())
+        self._log.close()
+        self._generation += 1
+        os.replace(self.log_path, f"{self.log_path}.{self._generation}")
+        self._log = open(self.log_path, 'w')
+        self._log_events = 0
+        self._unsynced = 0
+        # Updates replace a quiz's fields rather than mutate them, so copying
+        # each dict is enough to keep writers away from the snapshot
+        return self._generation, [dict(quiz) for quiz in self._quizzes.values()]
+
+    def compact(self):
+        """Fold the log into a new snapshot, then start an empty log"""
+        with self._compact_lock:
+            with self._lock:
+                generation, quizzes = self._rotate()
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(quizzes, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            for rotated, path in self._rotated_logs():
+                if rotated <= generation:
+                    os.remove(path)
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error compacting {self.log_path}: {str(e)}")
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def close(self):
+        self._closed.set()
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._fsync()
+            self._log.close()
+
+    def add(self, quiz: Dict):
+        """Insert a quiz, replacing any existing quiz with the same ID"""
+        with self._lock:
+            self._append([{"event": "quiz_generated", "quiz": quiz}])
+
+    def add_many(self, quizzes: List[Dict]):
+        """Insert several quizzes with a single append"""
+        with self._lock:
+            self._append([{"event": "quiz_generated", "quiz": quiz} for quiz in quizzes])
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        with self._lock:
+            quiz = self._quizzes.get(quiz_id)
+            return dict(quiz) if quiz is not None else None
+
+    def update(self, quiz_id: str, changes: Dict) -> bool:
+        """Merge changes into a stored quiz. Returns False if the quiz doesn't exist"""
+        with self._lock:
+            if quiz_id not in self._quizzes:
+                return False
+            self._append([{"event": "quiz_submitted", "quiz_id": quiz_id, "changes": changes}])
+            return True
+
+    def delete(self, quiz_id: str) -> bool:
+        """Delete a quiz. Returns False if the quiz doesn't exist"""
+        with self._lock:
+            if quiz_id not in self._quizzes:
+                return False
+            self._append([{"event": "quiz_deleted", "quiz_id": quiz_id}])
+            return True
+
+    def delete_many(self, quiz_ids: List[str]) -> int:
+        """Delete several quizzes with a single append. Returns how many existed"""
+        with self._lock:
+            existing = [quiz_id for quiz_id in dict.fromkeys(quiz_ids) if quiz_id in self._quizzes]
+            if existing:
+                self._append([{"event": "quiz_deleted", "quiz_id": quiz_id} for quiz_id in existing])
+            return len(existing)
+
+    def all(self) -> List[Dict]:
+        """Every quiz in the order it was saved"""
+        with self._lock:
+            return [dict(quiz) for quiz in self._quizzes.values()]
+
+    def iter_all(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """Every quiz in the order it was saved (history is in memory already)"""
+        return iter(self.all())
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._quizzes)
+
+    @property
+    def version(self) -> str:
+        """Changes on every write and every restart"""
+        return f"{self._epoch}.{self._changes}"
+
+    def changed_elsewhere(self) -> bool:
+        """Always False: the log belongs to a single process"""
+        return False
+
+    def external_changes(self) -> Optional[List[str]]:
+        return []
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-time import of a legacy quiz_history.json file. The file is renamed
+        to <name>.migrated afterwards so the import never runs twice.
+        Returns the number of quizzes imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r') as f:
+            quizzes = json.load(f)
+        quizzes = [quiz for quiz in quizzes if quiz.get("quiz_id")]
+        self.add_many(quizzes)
+        self.compact()
+        os.replace(json_path, json_path + ".migrated")
+        return len(quizzes)
+
+# Per-quiz fields that make up the "body"; everything else is metadata
+BODY_FIELDS = ("questions", "user_answers")
+
+class IndexedQuizStore:
+    """
+    Resident index in front of a QuizStore or EventLogQuizStore.
+
+    Metadata for every quiz is kept in memory keyed by quiz_id, with secondary
+    indexes by topic and by keyword and a list sorted by (generated_at,
+    quiz_id) for paging, so lookups, submissions and deletes never scan the
+    history. Writes go to the wrapped store first and then update the
+    index, so the two never disagree.
+
+    Question bodies are cached separately. With max_bodies set, only that many
+    bodies stay resident (least recently used evicted first); an evicted
+    quiz keeps its metadata indexed and its body is reloaded from the
+    wrapped store on the next read.
+
+    Observers are told about every change as full quiz dicts through
+    quiz_added(quiz) and quiz_removed(quiz); an update is reported as the
+    old version removed and the new one added. reset() is called before a
+    rebuild replays the whole history.
+
+    version_tag changes whenever the history does, so callers can use it to
+    build ETags without reading any quizzes. With the SQLite store it is the
+    same in every process that has synced.
+
+    When other processes write to the same store (several server workers),
+    sync() applies their changes to the index and observers; stale() is a
+    cheap check for whether there is anything to apply.
+
+    With an archive (quiz_archive.QuizArchive), archive_quizzes() moves
+    quizzes out of the store and the index into it without telling
+    observers, so they keep counting them; rebuild() replays archived
+    quizzes to observers too.
+    get() and delete() fall back to the archive, and history() iterates both.
+    """
+
+    def __init__(self, store, max_bodies: int = 0, observers=(), archive=None):
+        self.store = store
+        self.archive = archive
+        self.max_bodies = max_bodies
+        self.observers = list(observers)
+        self._lock = threading.RLock()
+        self._meta: Dict[str, Dict] = {}
+        self._bodies: "OrderedDict[str, Dict]" = OrderedDict()
+        self._by_topic: Dict[str, Dict[str, None]] = {}
+        self._by_keyword: Dict[str, Dict[str, None]] = {}
+        self._order: List[Tuple[str, str]] = []
+        self.rebuild()
+
+    def rebuild(self):
+        """Rebuild every index from the wrapped store"""
+        with self._lock:
+            self._meta.clear()
+            self._bodies.clear()
+            self._by_topic.clear()
+            self._by_keyword.clear()
+            self._order.clear()
+            for observer in self.observers:
+                observer.reset()
+            for quiz in self.store.all():
+                self._index(quiz)
+                self._notify("quiz_added", quiz)
+            if self.archive is not None:
+                for quiz in self.archive.replay():
+                    # A quiz in both was being archived when the process stopped
+                    if quiz["quiz_id"] not in self._meta:
+                        self._notify("quiz_added", quiz)
+
+    @staticmethod
+    def _keywords(quiz: Dict):
+        keywords = {quiz.get("keyword", "")}
+        keywords.update(q.get("keyword", "") for q in quiz.get("questions", []))
+        keywords.discard("")
+        return keywords
+
+    def _index(self, quiz: Dict):
+        """Index a quiz. Re-indexing an existing quiz keeps its place in history order"""
+        quiz_id = quiz["quiz_id"]
+        meta = {key: value for key, value in quiz.items() if key not in BODY_FIELDS}
+        meta["keywords"] = sorted(self._keywords(quiz))
+        old = self._meta.get(quiz_id)
+        relink = old is None or old.get("topic") != meta.get("topic") or old["keywords"] != meta["keywords"]
+        if old is not None and relink:
+            self._unlink(quiz_id, old)
+        if old is None or old.get("generated_at", "") != meta.get("generated_at", ""):
+            if old is not None:
+                self._unorder(quiz_id, old)
+            bisect.insort(self._order, (meta.get("generated_at", ""), quiz_id))
+        self._meta[quiz_id] = meta
+        if relink:
+            self._by_topic.setdefault(meta.get("topic", ""), {})[quiz_id] = None
+            for keyword in meta["keywords"]:
+                self._by_keyword.setdefault(keyword, {})[quiz_id] = None
+        self._cache_body(quiz_id, {field: quiz.get(field, []) for field in BODY_FIELDS})
+
+    def _unlink(self, quiz_id: str, meta: Dict):
+        """Drop a quiz from the secondary indexes"""
+        topic_ids = self._by_topic.get(meta.get("topic", ""), {})
+        topic_ids.pop(quiz_id, None)
+        if not topic_ids:
+            self._by_topic.pop(meta.get("topic", ""), None)
+        for keyword in meta["keywords"]:
+            keyword_ids = self._by_keyword.get(keyword, {})
+            keyword_ids.pop(quiz_id, None)
+            if not keyword_ids:
+                self._by_keyword.pop(keyword, None)
+
+    def _unorder(self, quiz_id: str, meta: Dict):
+        key = (meta.get("generated_at", ""), quiz_id)
+        position = bisect.bisect_left(self._order, key)
+        if position < len(self._order) and self._order[position] == key:
+            del self._order[position]
+
+    def _unindex(self, quiz_id: str):
+        meta = self._meta.pop(quiz_id)
+        self._bodies.pop(quiz_id, None)
+        self._unlink(quiz_id, meta)
+        self._unorder(quiz_id, meta)
+
+    def _notify(self, event: str, quiz: Dict):
+        for observer in self.observers:
+            getattr(observer, event)(quiz)
+
+    def _remove(self, quiz_id: str):
+        """Unindex a quiz and tell observers it is gone"""
+        old = self._assemble(quiz_id)
+        self._unindex(quiz_id)
+        if old is not None:
+            self._notify("quiz_removed", old)
+
+    def _cache_body(self, quiz_id: str, body: Dict):
+        self._bodies[quiz_id] = body
+        self._bodies.move_to_end(quiz_id)
+        if self.max_bodies:
+            while len(self._bodies) > self.max_bodies:
+                self._bodies.popitem(last=False)
+
+    def _assemble(self, quiz_id: str) -> Optional[Dict]:
+        """Metadata plus body for one quiz, reloading an evicted body"""
+        meta = self._meta.get(quiz_id)
+        if meta is None:
+            return None
+        body = self._bodies.get(quiz_id)
+        if body is None:
+            stored = self.store.get(quiz_id)
+            if stored is None:
+                return None
+            body = {field: stored.get(field, []) for field in BODY_FIELDS}
+            self._cache_body(quiz_id, body)
+        else:
+            self._bodies.move_to_end(quiz_id)
+        quiz = {key: value for key, value in meta.items() if key != "keywords"}
+        quiz.update(body)
+        return quiz
+
+    def close(self):
+        self.store.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def add(self, quiz: Dict):
+        with self._lock:
+            if quiz["quiz_id"] in self._meta:
+                # A replaced quiz moves to the end, as it does in the stores
+                self._remove(quiz["quiz_id"])
+            self.store.add(quiz)
+            self._index(quiz)
+            self._notify("quiz_added", quiz)
+
+    def add_many(self, quizzes: List[Dict]):
+        # Later duplicates of a quiz_id win, as they would with repeated add()
+        quizzes = list({quiz["quiz_id"]: quiz for quiz in quizzes}.values())
+        with self._lock:
+            for quiz in quizzes:
+                if quiz["quiz_id"] in self._meta:
+                    self._remove(quiz["quiz_id"])
+            self.store.add_many(quizzes)
+            for quiz in quizzes:
+                self._index(quiz)
+                self._notify("quiz_added", quiz)
+
+    def get(self, quiz_id: str) -> Optional[Dict]:
+        with self._lock:
+            quiz = self._assemble(quiz_id)
+        if quiz is None and self.archive is not None:
+            quiz = self.archive.get(quiz_id)
+        return quiz
+
+    def get_meta(self, quiz_id: str) -> Optional[Dict]:
+        """Indexed metadata for a quiz without touching its body"""
+        with self._lock:
+            meta = self._meta.get(quiz_id)
+            return dict(meta) if meta is not None else None
+
+    def update(self, quiz_id: str, changes: Dict) -> bool:
+        with self._lock:
+            if quiz_id not in self._meta:
+                return False
+            old = self._assemble(quiz_id)
+            if not self.store.update(quiz_id, changes):
+                return False
+            quiz = dict(old)
+            quiz.update(changes)
+            self._index(quiz)
+            self._notify("quiz_removed", old)
+            self._notify("quiz_added", quiz)
+            return True
+
+    def delete(self, quiz_id: str) -> bool:
+        with self._lock:
+            if quiz_id not in self._meta:
+                if self.archive is None:
+                    return False
+                old = self.archive.remove(quiz_id)
+                if old is None:
+                    return False
+                self._notify("quiz_removed", old)
+                return True
+            # Assemble before deleting: an evicted body can't be reloaded afterwards
+            old = self._assemble(quiz_id)
+            self.store.delete(quiz_id)
+            self._unindex(quiz_id)
+            if old is not None:
+                self._notify("quiz_removed", old)
+            return True
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            if len(self._bodies) < len(self._meta):
+                # Some bodies are evicted: one bulk read beats a lookup per quiz
+                return self.store.all()
+            return [self._assemble(quiz_id) for quiz_id in self._meta]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._meta)
+
+    def archive_quizzes(self, quiz_ids: List[str], archived_at: str) -> int:
+        """
+        Move quizzes from the store to the archive. Observers aren't told:
+        the quizzes are still part of history. Returns how many moved.
+        """
+        with self._lock:
+            quizzes = [quiz for quiz in (self._assemble(quiz_id) for quiz_id in quiz_ids) if quiz is not None]
+            if not quizzes:
+                return 0
+            # Archived first: a crash in between leaves a quiz in both, never in neither
+            self.archive.put_many(quizzes, archived_at)
+            self.store.delete_many([quiz["quiz_id"] for quiz in quizzes])
+            for quiz in quizzes:
+                self._unindex(quiz["quiz_id"])
+            return len(quizzes)
+
+    def iter_stored(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """Every quiz that hasn't been archived, read from the wrapped store in chunks"""
+        return self.store.iter_all(chunk_size)
+
+    def history(self, chunk_size: int = 500) -> Iterator[Dict]:
+        """Every quiz, stored then archived, read in chunks"""
+        yield from self.iter_stored(chunk_size)
+        if self.archive is not None:
+            for quiz in self.archive.iter_all(chunk_size):
+                if self.get_meta(quiz["quiz_id"]) is None:
+                    yield quiz
+
+    def stale(self) -> bool:
+        """Whether another process has changed the wrapped store or archive since the last sync()"""
+        if self.archive is not None and self.archive.changed_elsewhere():
+            return True
+        return self.store.changed_elsewhere()
+
+    def sync(self) -> int:
+        """
+        Apply changes other processes made to the wrapped store, as if they
+        had been made through this index. Returns how many quizzes changed.
+        """
+        with self._lock:
+            removed = self.archive.external_removals() if self.archive is not None else []
+            changed = self.store.external_changes()
+            # Observers need the old version of a changed quiz; an evicted body
+            # would be reloaded already changed, so fall back to a full rebuild.
+            # Likewise when a removed quiz that isn't indexed here also passed
+            # through the store: it may or may not have reached the observers
+            if removed is None or changed is None or any(
+                quiz_id in self._meta and quiz_id not in self._bodies for quiz_id in changed
+            ) or not {quiz["quiz_id"] for quiz in removed}.isdisjoint(set(changed) - self._meta.keys()):
+                self.rebuild()
+                return len(self._meta) if removed is None or changed is None else len(removed) + len(changed)
+            for quiz in removed:
+                # A quiz still indexed here was archived and removed since the
+                # last sync; the store's change log removes that one below
+                if quiz["quiz_id"] not in self._meta:
+                    self._notify("quiz_removed", quiz)
+            for quiz_id in changed:
+                quiz = self.store.get(quiz_id)
+                if quiz is None:
+                    archived = self.archive is not None and self.archive.contains(quiz_id)
+                    if quiz_id in self._meta:
+                        if archived:
+                            # Archived by another process: still history for the observers
+                            self._unindex(quiz_id)
+                        else:
+                            self._remove(quiz_id)
+                    elif archived:
+                        # Added and archived by another process since the last sync
+                        self._notify("quiz_added", self.archive.get(quiz_id))
+                    continue
+                old = self._assemble(quiz_id)
+                self._index(quiz)
+                if old is not None:
+                    self._notify("quiz_removed", old)
+                self._notify("quiz_added", quiz)
+            return len(removed) + len(changed)
+
+    @property
+    def version_tag(self) -> str:
+        # Taken from the wrapped store and archive, so every worker serving
+        # the same history gives the same tag. Not locked: handlers read it
+        # on the event loop while a write may hold the lock
+        if self.archive is None:
+            return self.store.version
+        return f"{self.store.version}.{self.archive.version}"
+
+    def ids(self) -> List[str]:
+        """Every quiz_id in history order"""
+        with self._lock:
+            return list(self._meta)
+
+    def ids_by_topic(self, topic: str) -> List[str]:
+        with self._lock:
+            return list(self._by_topic.get(topic, {}))
+
+    def ids_by_keyword(self, keyword: str) -> List[str]:
+        with self._lock:
+            return list(self._by_keyword.get(keyword, {}))
+
+    def _candidates(self, topic: Optional[str], keyword: Optional[str]) -> Optional[Iterable[str]]:
+        """Quiz_ids with the given topic and keyword from the secondary indexes; None when neither is given"""
+        if topic is None and keyword is None:
+            return None
+        if topic is None:
+            return self._by_keyword.get(keyword, {})
+        by_topic = self._by_topic.get(topic, {})
+        if keyword is None:
+            return by_topic
+        by_keyword = self._by_keyword.get(keyword, {})
+        if len(by_keyword) < len(by_topic):
+            by_topic, by_keyword = by_keyword, by_topic
+        return [quiz_id for quiz_id in by_topic if quiz_id in by_keyword]
+
+    def page_ids(self, limit: int, after: Optional[Tuple[str, str]] = None, descending: bool = False,
+                 predicate: Optional[Callable[[Dict], bool]] = None, topic: Optional[str] = None,
+                 keyword: Optional[str] = None) -> List[str]:
+        """
+        Up to limit quiz_ids ordered by (generated_at, quiz_id), starting
+        strictly after the given key and keeping only quizzes whose metadata
+        passes predicate. A topic or keyword narrows the scan to the quizzes
+        indexed under it.
+        """
+        with self._lock:
+            candidates = self._candidates(topic, keyword)
+            if candidates is None:
+                order = self._order
+            else:
+                order = sorted((self._meta[quiz_id].get("generated_at", ""), quiz_id) for quiz_id in candidates)
+            if descending:
+                start = bisect.bisect_left(order, after) if after else len(order)
+                keys = (order[i] for i in range(start - 1, -1, -1))
+            else:
+                start = bisect.bisect_right(order, after) if after else 0
+                keys = (order[i] for i in range(start, len(order)))
+            page = []
+            for _, quiz_id in keys:
+                if predicate is None or predicate(self._meta[quiz_id]):
+                    page.append(quiz_id)
+                    if len(page) >= limit:
+                        break
+            return page
+
+    def count_matching(self, predicate: Optional[Callable[[Dict], bool]] = None, topic: Optional[str] = None,
+                       keyword: Optional[str] = None) -> int:
+        """Number of quizzes with the given topic and keyword whose metadata passes predicate"""
+        with self._lock:
+            candidates = self._candidates(topic, keyword)
+            if candidates is None:
+                candidates = self._meta
+            if predicate is None:
+                return len(candidates)
+            return sum(1 for quiz_id in candidates if predicate(self._meta[quiz_id]))
+
+    def migrate_from_json(self, json_path: str) -> int:
+        with self._lock:
+            count = self.store.migrate_from_json(json_path)
+            if count:
+                self.rebuild()
+            return count
@@ -0,0 +1,143 @@
+"""
+Budgets shared by every worker process of the server.
+
+With several uvicorn/gunicorn workers each process has its own memory, but
+the OpenAI rate limits and the per-user LLM quotas are budgets that must be
+counted once. SharedState keeps them in one SQLite file next to the quiz
+data; every read-modify-write runs in a BEGIN IMMEDIATE transaction, so
+processes take turns on the write lock and no update is lost.
+
+SharedTokenBucket is a drop-in for upstream.TokenBucket (RateLimiter uses
+it when given a SharedState), with refills measured on the wall clock so
+all processes agree on them. Pauses after a 429 are shared the same way.
+LLMQuota records completions through record_call() and reads them back
+with calls().
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_buckets (
+    name TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pauses (
+    name TEXT PRIMARY KEY,
+    until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_calls (
+    user_id TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_user ON llm_calls(user_id, at);
+"""
+
+class SharedState:
+    """SQLite file holding rate-limit buckets, pauses and per-user completion times"""
+
+    def __init__(self, path: str, busy_timeout: float = 10.0):
+        self.path = path
+        # Reentrant so helpers can run inside transaction()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Reads get their own connection: in WAL mode they never wait for a writer,
+        # while the write connection may be waiting busy_timeout for another process
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._recorded = 0
+
+    def close(self):
+        with self._lock, self._read_lock:
+            self._conn.close()
+            self._reader.close()
+
+    @contextmanager
+    def connection(self):
+        """The read connection, held by this process for the with block"""
+        with self._read_lock:
+            yield self._reader
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database write lock (and this process's lock) for the with block"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def paused_until(self, name: str) -> float:
+        with self._read_lock:
+            row = self._reader.execute("SELECT until FROM pauses WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0.0
+
+    def pause(self, name: str, until: float):
+        """Extend the named pause to at least until (wall clock)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pauses VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET until = MAX(until, excluded.until)",
+                (name, until),
+            )
+
+    def calls(self, user_id: str, since: float) -> List[float]:
+        """The user's recorded completion times after since, oldest first"""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT at FROM llm_calls WHERE user_id = ? AND at >= ? ORDER BY at", (user_id, since)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_call(self, user_id: str, at: float):
+        with self._lock:
+            self._conn.execute("INSERT INTO llm_calls VALUES (?, ?)", (user_id, at))
+            self._recorded += 1
+            if self._recorded % 100 == 0:
+                # Quotas look back one day at most
+                self._conn.execute("DELETE FROM llm_calls WHERE at < ?", (at - 86400,))
+
+class SharedTokenBucket:
+    """upstream.TokenBucket whose level lives in a SharedState"""
+
+    def __init__(self, state: SharedState, name: str, rate_per_minute: float):
+        self.state = state
+        self.name = name
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+
+    def _level(self, conn, now: float) -> float:
+        row = conn.execute("SELECT level, updated FROM token_buckets WHERE name = ?", (self.name,)).fetchone()
+        if row is None:
+            return self.capacity
+        return min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+
+    def _adjust(self, delta: float):
+        now = time.time()
+        with self.state.transaction() as conn:
+            level = min(self.capacity, self._level(conn, now) + delta)
+            conn.execute("INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)", (self.name, level, now))
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)"""
+        with self.state.connection() as conn:
+            level = self._level(conn, time.time())
+        amount = min(amount, self.capacity)
+        return 0.0 if level >= amount else (amount - level) / self.rate
+
+    def take(self, amount: float):
+        # Another process may take between wait_time() and take(); the level
+        # then goes negative and the overdraft is repaid before anyone else runs
+        self._adjust(-min(amount, self.capacity))
+
+    def give_back(self, amount: float):
+        self._adjust(amount)
@@ -0,0 +1,272 @@
+"""
+Per-user data and limits.
+
+Every user gets a UserSpace: their own quiz store under
+quiz_data/users/<user_id>/ wrapped in their own IndexedQuizStore with its
+own observers (stats, seen questions, review schedule). Requests only touch
+the caller's space, so one user's history size or write traffic never
+slows another user's requests. Spaces open lazily, off the event loop, and
+idle ones are closed once more than max_open are resident.
+
+Users are identified by API key (X-API-Key, looked up in an api_keys.json
+file) when that file exists, or otherwise by an X-User-Id header falling
+back to the "default" user, so a single-user install keeps working without
+any configuration.
+
+LLMQuota caps completions per user per hour and per day. Calls are charged
+to the user in the current_user_id context variable, so background work
+(pool refills) isn't charged to anyone. Given a SharedState the calls are
+recorded there, so every worker process enforces the same quota.
+
+migrate_to_default_user moves a pre-tenancy install's history files into
+the default user's directory.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from shared_state import SharedState
+
+DEFAULT_USER = "default"
+_USER_ID = re.compile(r"^[A-Za-z0-9_.\-]{1,64}$")
+
+# Files that belonged to the single global history before tenancy
+LEGACY_HISTORY_FILES = (
+    "quiz_history.db", "quiz_history.db-wal", "quiz_history.db-shm",
+    "quiz_history.json", "quiz_history.json.migrated",
+    "quiz_events.log", "quiz_snapshot.json",
+)
+
+# User whose request is being served; None for background work
+current_user_id = contextvars.ContextVar("current_user_id", default=None)
+
+def valid_user_id(user_id: str) -> bool:
+    return bool(_USER_ID.match(user_id)) and user_id not in (".", "..")
+
+def migrate_to_default_user(data_dir: str, users_dir: str) -> List[str]:
+    """Move legacy global history files into the default user's directory"""
+    default_dir = os.path.join(users_dir, DEFAULT_USER)
+    legacy = [name for name in LEGACY_HISTORY_FILES if os.path.exists(os.path.join(data_dir, name))]
+    if not legacy or os.path.exists(default_dir):
+        return []
+    try:
+        os.makedirs(default_dir)
+    except FileExistsError:
+        # Another worker process is doing the move
+        return []
+    for name in legacy:
+        os.replace(os.path.join(data_dir, name), os.path.join(default_dir, name))
+    return legacy
+
+class UserSpace:
+    """One user's quiz store and the observers maintained over it"""
+
+    def __init__(self, user_id: str, store, stats, seen, scheduler):
+        self.user_id = user_id
+        self.store = store
+        self.stats = stats
+        self.seen = seen
+        self.scheduler = scheduler
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+class UserSpaces:
+    """Lazily opened UserSpaces, closing idle ones beyond max_open"""
+
+    def __init__(self, users_dir: str, open_space: Callable[[str, str], UserSpace],
+                 max_open: int = 64, idle_seconds: float = 60.0):
+        self.users_dir = users_dir
+        self.open_space = open_space
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._spaces: "OrderedDict[str, UserSpace]" = OrderedDict()
+        self._opening: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        os.makedirs(users_dir, exist_ok=True)
+
+    async def acquire(self, user_id: str) -> UserSpace:
+        """The user's space, opened in a worker thread on first use"""
+        while True:
+            with self._lock:
+                space = self._spaces.get(user_id)
+                if space is not None:
+                    self._spaces.move_to_end(user_id)
+                    space.in_use += 1
+                    space.last_used = time.monotonic()
+                    return space
+                opening = self._opening.get(user_id)
+            if opening is not None:
+                await asyncio.shield(opening)
+                continue
+            opening = asyncio.get_running_loop().create_future()
+            self._opening[user_id] = opening
+            try:
+                user_dir = os.path.join(self.users_dir, user_id)
+                os.makedirs(user_dir, exist_ok=True)
+                # Loading a large history must not block other users' requests
+                space = await asyncio.get_running_loop().run_in_executor(None, self.open_space, user_id, user_dir)
+                with self._lock:
+                    # Held before evicting so the new space can't be closed under the caller
+                    space.in_use += 1
+                    self._spaces[user_id] = space
+                    self.opened += 1
+                self._evict()
+                return space
+            finally:
+                del self._opening[user_id]
+                opening.set_result(None)
+
+    def retain(self, space: UserSpace):
+        """Keep an acquired space open past the request, e.g. for a streamed body"""
+        with self._lock:
+            space.in_use += 1
+
+    def release(self, space: UserSpace):
+        with self._lock:
+            space.in_use -= 1
+            space.last_used = time.monotonic()
+
+    def _evict(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                user_id for user_id, space in self._spaces.items()
+                if space.in_use == 0 and now - space.last_used > self.idle_seconds
+            ]
+            evicted = []
+            for user_id in idle:
+                if len(self._spaces) <= self.max_open:
+                    break
+                evicted.append(self._spaces.pop(user_id))
+        for space in evicted:
+            space.store.close()
+            self.closed += 1
+
+    def close(self):
+        with self._lock:
+            spaces = list(self._spaces.values())
+            self._spaces.clear()
+        for space in spaces:
+            space.store.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"open": len(self._spaces), "opened": self.opened, "closed": self.closed}
+
+class QuotaExceededError(HTTPException):
+    """The user has used up their completions for the hour or day"""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(int(retry_after) + 1)})
+
+class LLMQuota:
+    """Sliding-window per-user limits on upstream completions; 0 means unlimited"""
+
+    WINDOWS = (("hour", 3600), ("day", 86400))
+
+    def __init__(self, per_hour: int = 0, per_day: int = 0, overrides: Optional[Dict[str, Dict]] = None,
+                 shared: Optional[SharedState] = None):
+        self.limits = {"hour": per_hour, "day": per_day}
+        self.overrides = overrides or {}
+        self.shared = shared
+        self._calls: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _limit(self, user_id: str, window: str) -> int:
+        override = self.overrides.get(user_id, {})
+        return int(override.get(f"llm_calls_per_{window}", self.limits[window]))
+
+    def _locked(self):
+        """
+        This process's lock, guarding the in-memory windows. Shared windows
+        are guarded by SQLite, and taking the lock there would make readers
+        wait for a charge() that is waiting on another worker.
+        """
+        return self._lock if self.shared is None else nullcontext()
+
+    def _recent(self, user_id: str, now: float):
+        """The user's completions in the last day, oldest first. Caller holds _locked()"""
+        if self.shared is not None:
+            return self.shared.calls(user_id, now - 86400)
+        calls = self._calls.setdefault(user_id, deque())
+        while calls and calls[0] < now - 86400:
+            calls.popleft()
+        return calls
+
+    def _check(self, user_id: str, calls, now: float, needed: int = 1):
+        for window, seconds in self.WINDOWS:
+            limit = self._limit(user_id, window)
+            if not limit:
+                continue
+            recent = [t for t in calls if t >= now - seconds] if window == "hour" else calls
+            excess = len(recent) + needed - limit
+            if excess > 0:
+                self.rejected += 1
+                # Enough calls to make room expire when the excess-th oldest does
+                retry_at = recent[excess - 1] + seconds if excess <= len(recent) else now + seconds
+                if needed == 1:
+                    raise QuotaExceededError(f"LLM quota of {limit} calls per {window} used up", retry_at - now)
+                raise QuotaExceededError(f"LLM quota of {limit} calls per {window} leaves fewer than {needed}",
+                                         retry_at - now)
+
+    def check(self, user_id: str, needed: int = 1):
+        """Raise QuotaExceededError if the user has fewer than needed completions left"""
+        now = time.time()
+        with self._locked():
+            self._check(user_id, self._recent(user_id, now), now, needed)
+
+    def charge(self, user_id: str):
+        """Record one completion for the user, or raise if they have none left"""
+        now = time.time()
+        if self.shared is not None:
+            # Check and record atomically across processes
+            with self.shared.transaction():
+                self._check(user_id, self._recent(user_id, now), now)
+                self.shared.record_call(user_id, now)
+            return
+        with self._lock:
+            calls = self._recent(user_id, now)
+            self._check(user_id, calls, now)
+            calls.append(now)
+
+    def usage(self, user_id: str) -> Dict:
+        now = time.time()
+        with self._locked():
+            calls = self._recent(user_id, now)
+            result = {}
+            for window, seconds in self.WINDOWS:
+                result[f"calls_last_{window}"] = sum(1 for t in calls if t >= now - seconds)
+                result[f"limit_per_{window}"] = self._limit(user_id, window) or None
+            return result
+
+def load_api_keys(path: str) -> Dict[str, Dict]:
+    """{"<api key>": {"user_id": ..., "llm_calls_per_hour": ..., "llm_calls_per_day": ...}}"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            keys = json.load(f)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Error loading API keys: {str(e)}")
+        return {}
+    valid = {}
+    for key, entry in keys.items():
+        if valid_user_id(str(entry.get("user_id", ""))):
+            valid[key] = entry
+        else:
+            logging.getLogger(__name__).warning(f"Ignoring API key with invalid user_id: {entry.get('user_id')!r}")
+    return valid
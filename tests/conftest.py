@@ -0,0 +1,106 @@
+import importlib
+import os
+import sys
+from typing import Dict, List, Optional
+
+import pytest
+
+# The modules live at the repository root, next to fastapiserver.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quiz_archive import QuizArchive
+from quiz_cache import SeenQuestions
+from quiz_scheduler import ReviewScheduler
+from quiz_stats import QuizStats
+from quiz_store import IndexedQuizStore, QuizStore
+
+
+def make_quiz(quiz_id: str, topic: str = "Biology", keywords: List[str] = ("cell", "gene"),
+              generated_at: str = "2026-01-01T10:00:00", completed_at: Optional[str] = None,
+              correct: Optional[List[bool]] = None) -> Dict:
+    """A stored quiz with one question per keyword, answered as given in correct"""
+    questions = [
+        {"question": f"{quiz_id} about {keyword}?", "choice1": "a", "choice2": "b", "choice3": "c",
+         "choice4": "d", "correct": "A", "keyword": keyword, "difficulty": "medium"}
+        for keyword in keywords
+    ]
+    answers = []
+    if correct is not None:
+        answers = [
+            {"question_index": index, "selected_answer": "A" if right else "B", "is_correct": right}
+            for index, right in enumerate(correct)
+        ]
+    return {
+        "quiz_id": quiz_id,
+        "topic": topic,
+        "keyword": keywords[0],
+        "questions": questions,
+        "user_answers": answers,
+        "generated_at": generated_at,
+        "completed_at": completed_at,
+        "score": sum(correct) if correct is not None else None,
+        "total_questions": len(questions),
+    }
+
+
+class Space:
+    """An IndexedQuizStore over SQLite with the server's observers and an archive"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.stats = QuizStats()
+        self.seen = SeenQuestions()
+        self.scheduler = ReviewScheduler()
+        self.store = IndexedQuizStore(
+            QuizStore(os.path.join(directory, "quiz_history.db")),
+            observers=[self.stats, self.seen, self.scheduler],
+            archive=QuizArchive(os.path.join(directory, "quiz_archive.db")),
+        )
+
+    def close(self):
+        self.store.close()
+
+
+@pytest.fixture
+def space(tmp_path):
+    opened = Space(str(tmp_path))
+    yield opened
+    opened.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Loads fastapiserver afresh with the given environment, keeping quiz_data/
+    under tmp_path and sending completions to the benchmark stub in-process
+    """
+    import json
+
+    import httpx
+    import openai
+    from benchmarks import stub_llm_server as stub
+
+    monkeypatch.setattr(stub, "LATENCY", 0.0)
+    requests = []
+
+    async def record(request):
+        requests.append(json.loads(request.content))
+
+    def load(**env):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("OPENAI_API_KEY", "k")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        sys.modules.pop("fastapiserver", None)
+        module = importlib.import_module("fastapiserver")
+        monkeypatch.setattr(module, "openai_client", openai.AsyncOpenAI(
+            api_key="k", base_url="http://stub/v1", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub.app),
+                                          event_hooks={"request": [record]}),
+        ))
+        return module
+
+    # Bodies of the completions requested so far
+    load.requests = requests
+    yield load
+    sys.modules.pop("fastapiserver", None)
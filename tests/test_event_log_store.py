@@ -0,0 +1,80 @@
+import os
+
+from conftest import make_quiz
+from quiz_store import EventLogQuizStore
+
+
+def test_compaction_runs_off_the_write_path(tmp_path):
+    store = EventLogQuizStore(str(tmp_path), compact_after=4)
+    for index in range(10):
+        store.add(make_quiz(f"q{index}"))
+    store.update("q3", {"completed_at": "2026-01-02T10:00:00", "score": 2})
+    store.delete("q5")
+    expected = store.all()
+    store.close()
+
+    assert os.path.exists(str(tmp_path / "quiz_snapshot.json"))
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith("quiz_events.log.")]
+    reopened = EventLogQuizStore(str(tmp_path))
+    assert reopened.all() == expected
+    reopened.close()
+
+
+def test_replays_logs_set_aside_before_their_snapshot(tmp_path):
+    store = EventLogQuizStore(str(tmp_path))
+    store.add_many([make_quiz("a"), make_quiz("b")])
+    with store._lock:
+        # The process stops after setting the log aside, before the snapshot is written
+        store._rotate()
+    store.update("a", {"score": 1})
+    store.delete("b")
+    store.add(make_quiz("c"))
+    expected = store.all()
+    store.close()
+
+    reopened = EventLogQuizStore(str(tmp_path))
+    assert reopened.all() == expected
+    reopened.compact()
+    assert sorted(os.listdir(str(tmp_path))) == ["quiz_events.log", "quiz_snapshot.json"]
+    reopened.close()
+    compacted = EventLogQuizStore(str(tmp_path))
+    assert compacted.all() == expected
+    compacted.close()
+
+
+def test_replay_after_compaction(tmp_path):
+    store = EventLogQuizStore(str(tmp_path))
+    store.add_many([make_quiz(f"q{index}") for index in range(4)])
+    store.update("q1", {"completed_at": "2026-01-02T10:00:00", "score": 2})
+    store.compact()
+    # Changes after the snapshot only exist in the log
+    store.update("q2", {"score": 1})
+    store.delete("q0")
+    store.add(make_quiz("q1"))
+    store.add(make_quiz("q4"))
+    expected = store.all()
+    store.close()
+
+    reopened = EventLogQuizStore(str(tmp_path))
+    assert reopened.all() == expected
+    assert [quiz["quiz_id"] for quiz in reopened.all()] == ["q2", "q3", "q1", "q4"]
+    assert reopened.get("q1")["score"] is None
+    reopened.close()
+
+
+def test_torn_final_event_is_dropped(tmp_path):
+    store = EventLogQuizStore(str(tmp_path))
+    store.add(make_quiz("a"))
+    store.compact()
+    store.add(make_quiz("b"))
+    store.close()
+    with open(str(tmp_path / "quiz_events.log"), "a") as log:
+        log.write('{"event": "quiz_generated", "quiz": {"quiz_id": "c"')
+
+    reopened = EventLogQuizStore(str(tmp_path))
+    assert [quiz["quiz_id"] for quiz in reopened.all()] == ["a", "b"]
+    reopened.add(make_quiz("d"))
+    reopened.close()
+    recovered = EventLogQuizStore(str(tmp_path))
+    assert [quiz["quiz_id"] for quiz in recovered.all()] == ["a", "b", "d"]
+    recovered.close()
@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+import keyword_engine
+from keyword_engine import KeywordEngine
+
+# Each document mentions photosynthesis with its own terms around it; "energy" is everywhere
+DOCUMENTS = {
+    "leaf.txt": "Photosynthesis happens in the chloroplast. Chlorophyll absorbs light energy. "
+                "The light reactions split water and release oxygen.",
+    "cycle.md": "Photosynthesis continues in the Calvin cycle, where carbon dioxide is fixed by rubisco. "
+                "Glucose is built from carbon dioxide using energy.",
+    "plants.txt": "Stomata let carbon dioxide into the leaf for photosynthesis. Chlorophyll gives leaves "
+                  "their green colour. Sunlight provides the energy.",
+    "engines.txt": "Steam engines turn heat energy into motion with pistons and boilers.",
+    "notes.csv": "photosynthesis,ignored,because,not,text",
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    index = tmp_path / "index.json"
+    index.write_text(json.dumps({
+        "Machine Learning": {"aliases": ["ML"], "keywords": ["model", "training", "overfitting"]},
+    }))
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for name, text in DOCUMENTS.items():
+        (corpus / name).write_text(text)
+    return KeywordEngine([str(index), str(tmp_path / "missing.json")], corpus_dir=str(corpus),
+                         max_keywords=6, min_keywords=3)
+
+
+def test_index_answers_topics_and_aliases(engine):
+    assert engine.keywords("machine   learning") == ["model", "training", "overfitting"]
+    assert engine.keywords("ml") == ["model", "training", "overfitting"]
+    assert engine.stats()["index_hits"] == 2
+    assert engine.stats()["indexed_topics"] == 1
+
+
+def test_corpus_fallback_ranks_topic_specific_phrases(engine):
+    keywords = engine.keywords("Photosynthesis")
+
+    assert keywords is not None and 3 <= len(keywords) <= 6
+    assert "carbon dioxide" in keywords and "chlorophyll" in keywords
+    # Only documents mentioning the topic count, the topic itself is left out
+    assert not {"steam engines", "pistons", "photosynthesis"} & set(keywords)
+    assert engine.stats()["corpus_hits"] == 1
+    assert engine.stats()["corpus_documents"] == 4
+
+
+def test_unknown_topics_are_misses(engine):
+    assert engine.keywords("Medieval Poetry") is None
+    assert engine.keywords("the of and") is None
+    assert engine.stats()["misses"] == 2
+
+
+def test_corpus_answers_and_misses_are_remembered(engine, monkeypatch):
+    expected = engine.keywords("Photosynthesis")
+    assert engine.keywords("Medieval Poetry") is None
+
+    def rescan(topic):
+        raise AssertionError(f"corpus scanned again for {topic}")
+
+    monkeypatch.setattr(engine, "_from_corpus", rescan)
+    assert engine.keywords("photosynthesis") == expected
+    assert engine.keywords("medieval  poetry") is None
+    assert engine.stats() == {**engine.stats(), "corpus_hits": 2, "misses": 2, "corpus_topics_remembered": 2}
+
+    # Callers can't change the remembered answer
+    engine.keywords("photosynthesis").append("mutated")
+    assert engine.keywords("photosynthesis") == expected
+
+
+def test_remembered_topics_are_bounded(engine):
+    engine.max_corpus_topics = 2
+    for topic in ("Photosynthesis", "Poetry", "Chess"):
+        engine.keywords(topic)
+    assert list(engine._corpus_answers) == ["poetry", "chess"]
+
+
+def test_engine_without_a_corpus(tmp_path):
+    engine = KeywordEngine([str(tmp_path / "missing.json")])
+    assert engine.keywords("Photosynthesis") is None
+    assert engine.stats() == {**engine.stats(), "indexed_topics": 0, "corpus_documents": 0, "misses": 1}
+
+
+def test_bundled_index_loads():
+    path = os.path.join(os.path.dirname(os.path.abspath(keyword_engine.__file__)), "keyword_index.json")
+    assert KeywordEngine([path]).stats()["indexed_topics"] > 0
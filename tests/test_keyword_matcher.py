@@ -0,0 +1,76 @@
+import random
+import re
+
+from fastapi.testclient import TestClient
+
+from keyword_matcher import KeywordAutomaton, MatcherCache
+
+
+def test_whole_words_only():
+    automaton = KeywordAutomaton(["learn", "C++", "node.js", "machine learning"])
+    counts = automaton.counts_by_keyword([
+        "Learning to learn: LEARN c++ and Node.js.",
+        "machine\n  learning, not machinelearning or machine-learning",
+    ])
+    assert counts == {"learn": 2, "C++": 1, "node.js": 1, "machine learning": 1}
+
+
+def test_substrings_without_whole_word():
+    automaton = KeywordAutomaton(["learn", "ear"], whole_word=False)
+    assert automaton.counts_by_keyword(["Learning to learn", "yearly"]) == {"learn": 2, "ear": 3}
+
+
+def test_case_sensitive_matching():
+    automaton = KeywordAutomaton(["Python", "python"], case_sensitive=True)
+    assert automaton.counts_by_keyword(["Python python PYTHON"]) == {"Python": 1, "python": 1}
+    # Case-insensitively the two are one keyword
+    assert KeywordAutomaton(["Python", "python", " ", ""]).keywords == ["Python"]
+
+
+def test_overlapping_occurrences_count_once():
+    assert KeywordAutomaton(["aa"], whole_word=False).counts_by_keyword(["aaaa"]) == {"aa": 2}
+    assert KeywordAutomaton(["ha ha"]).counts_by_keyword(["ha ha ha"]) == {"ha ha": 1}
+
+
+def test_matches_a_regex_per_keyword():
+    rng = random.Random(11)
+    vocabulary = ["cell", "cells", "gene", "dna", "rna", "cell wall", "wall", "gene expression", "expression"]
+    for _ in range(50):
+        keywords = rng.sample(vocabulary, 4)
+        texts = [" ".join(rng.choice(["cell", "cells", "gene", "dna", "wall", "expression", "the", "a"])
+                          for _ in range(rng.randint(0, 30))) for _ in range(3)]
+        expected = {}
+        for keyword in keywords:
+            pattern = re.compile(r"(?<!\w)" + r"\s+".join(map(re.escape, keyword.split())) + r"(?!\w)")
+            found = sum(len(pattern.findall(text)) for text in texts)
+            if found:
+                expected[keyword] = found
+        assert KeywordAutomaton(keywords).counts_by_keyword(texts) == expected
+
+
+def test_cache_reuses_automata_for_the_same_set():
+    cache = MatcherCache(max_entries=2)
+    key, first, cached = cache.get(["Cell", "gene"])
+    assert not cached
+    # Order, case and spacing of the keywords don't matter
+    assert cache.get(["gene ", "cell"]) == (key, first, True)
+    assert cache.get(["cell", "gene"], case_sensitive=True)[2] is False
+    assert cache.get(["cell", "gene"], whole_word=False)[2] is False
+    # The least recently used set was evicted
+    assert cache.get(["cell", "gene"])[2] is False
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 2)
+
+
+def test_match_keywords_endpoint(server):
+    client = TestClient(server().app)
+    request = {"topics": {"Biology": ["cell", "Gene"], "ML": ["learn", "gene"]},
+               "texts": ["A cell has genes; gene expression.", "We learn. GENE"]}
+
+    first = client.post("/match-keywords", json=request).json()
+    assert first["matches"] == {"Biology": {"cell": 1, "Gene": 2}, "ML": {"learn": 1, "gene": 2}}
+    assert first["total_matches"] == 4
+    assert first["automaton_cached"] is False
+
+    second = client.post("/match-keywords", json=request).json()
+    assert second["automaton_cached"] is True and second["automaton_key"] == first["automaton_key"]
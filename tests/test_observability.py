@@ -0,0 +1,60 @@
+import json
+import logging
+
+import pytest
+
+import observability
+from observability import configure_logging
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    yield
+    root.handlers[:], level = saved
+    root.setLevel(level)
+    for name in ("camel",) + observability._CHATTY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+def log_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+
+
+def test_module_loggers_write_json_with_the_request_id(capsys, restore_logging):
+    logger = configure_logging("camel", "INFO")
+    token = observability.request_id.set("req-1")
+    try:
+        logger.info("served", extra={"route": "/due"})
+        logging.getLogger("quiz_pool").warning("Error refilling quiz pool")
+    finally:
+        observability.request_id.reset(token)
+
+    served, refill = log_lines(capsys)
+    assert served == {**served, "logger": "camel", "message": "served", "route": "/due", "request_id": "req-1"}
+    assert refill == {**refill, "logger": "quiz_pool", "level": "warning", "request_id": "req-1"}
+
+
+def test_level_applies_to_every_logger(capsys, restore_logging):
+    configure_logging("camel", "WARNING")
+    logging.getLogger("camel").info("hidden")
+    logging.getLogger("keyword_engine").info("hidden")
+    logging.getLogger("keyword_engine").error("shown")
+    assert [entry["message"] for entry in log_lines(capsys)] == ["shown"]
+
+
+def test_http_client_chatter_stays_quiet_unless_debugging(capsys, restore_logging):
+    configure_logging("camel", "INFO")
+    logging.getLogger("httpx").info("HTTP Request: POST /v1/chat/completions")
+    assert log_lines(capsys) == []
+
+    configure_logging("camel", "DEBUG")
+    logging.getLogger("httpx").info("HTTP Request: POST /v1/chat/completions")
+    assert [entry["logger"] for entry in log_lines(capsys)] == ["httpx"]
+
+
+def test_text_format(capsys, restore_logging):
+    configure_logging("camel", "INFO", json_format=False)
+    logging.getLogger("tenancy").warning("Error loading API keys")
+    assert capsys.readouterr().err == "WARNING tenancy: Error loading API keys\n"
@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import make_quiz
+
+
+@pytest.fixture
+def tokyo(monkeypatch):
+    """The server's local time is UTC+9, so client timestamps in UTC must be converted"""
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def client(server, tokyo):
+    app = server()
+    client = TestClient(app.app)
+    # Stored timestamps are the server's local time, as it stamps them
+    quizzes = [
+        make_quiz(f"q{day}", topic="Biology" if day % 2 else "Physics",
+                  generated_at=f"2026-01-0{day}T10:00:00", completed_at=f"2026-01-0{day}T10:05:00", correct=[True, False])
+        for day in range(1, 7)
+    ]
+    body = "\n".join(json.dumps(quiz) for quiz in quizzes)
+    assert client.post("/quiz-history/import", content=body).json()["imported"] == 6
+    assert client.post("/quiz-archive/run", params={"older_than_days": 0}).json()["archived"] == 6
+    return client
+
+
+def archive_ids(client, **params):
+    page = client.get("/quiz-archive", params=params)
+    assert page.status_code == 200, page.text
+    page = page.json()
+    return [quiz["quiz_id"] for quiz in page["quizzes"]], page["total_count"], page["next_cursor"]
+
+
+def test_archive_pages_in_both_orders(client):
+    ids, total, cursor = archive_ids(client, limit=4)
+    assert (ids, total) == (["q1", "q2", "q3", "q4"], 6)
+    ids, total, cursor = archive_ids(client, limit=4, cursor=cursor)
+    assert (ids, total, cursor) == (["q5", "q6"], 6, None)
+
+    ids, _, cursor = archive_ids(client, limit=5, order="desc")
+    assert ids == ["q6", "q5", "q4", "q3", "q2"]
+    assert archive_ids(client, limit=5, order="desc", cursor=cursor)[0] == ["q1"]
+
+
+def test_archive_filters(client):
+    ids, total, _ = archive_ids(client, topic="Biology", limit=2)
+    assert (ids, total) == (["q1", "q3"], 3)
+    assert archive_ids(client, since="2026-01-03T10:00:00", until="2026-01-05")[:2] == (["q3", "q4"], 2)
+    assert archive_ids(client, topic="Physics", since="2026-01-03")[:2] == (["q4", "q6"], 2)
+
+
+def test_archive_bounds_are_normalized_like_quiz_history(client):
+    # 01:00Z is 10:00 in the server's local time
+    assert archive_ids(client, since="2026-01-03T01:00:00Z")[1] == 4
+    assert archive_ids(client, since="2026-01-03T01:00:01Z")[1] == 3
+    assert archive_ids(client, until="2026-01-03T10:00:00+09:00")[0] == ["q1", "q2"]
+    # Without seconds, and with a space instead of T
+    assert archive_ids(client, since="2026-01-05T10:00")[0] == ["q5", "q6"]
+    assert archive_ids(client, since="2026-01-05 10:00:00")[0] == ["q5", "q6"]
+
+    history = client.get("/quiz-history", params={"since": "2026-01-03T01:00:01Z"}).json()
+    assert history["total_count"] == 0
+
+
+def test_invalid_archive_bounds(client):
+    response = client.get("/quiz-archive", params={"since": "yesterday"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid timestamp: yesterday"
@@ -0,0 +1,100 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmarks import stub_llm_server as stub
+
+TOPICS = ["Biology", "Physics", "Chemistry", "History", "Music"]
+
+
+def batch_request(topics=TOPICS):
+    return {"items": [{"topic": topic, "keywords": [f"{topic.lower()} term"]} for topic in topics]}
+
+
+def is_batch(body):
+    return "Quiz requests:" in body["messages"][-1]["content"]
+
+
+def test_items_are_packed_by_token_budget(server):
+    app = server(QUIZ_BATCH_MAX_TOKENS="2000", QUIZ_BATCH_TOKENS_PER_QUIZ="700")
+    items = [(index, app.QuizRequest(topic=topic, keywords=["k"])) for index, topic in enumerate(TOPICS)]
+    assert [[index for index, _ in batch] for batch in app.pack_quiz_batches(items)] == [[0, 1], [2, 3], [4]]
+    assert app.pack_quiz_batches([]) == []
+
+    # A budget below one quiz still sends one per completion
+    app.QUIZ_BATCH_MAX_TOKENS = 100
+    assert len(app.pack_quiz_batches(items)) == 5
+
+
+def test_batch_quizzes_come_back_in_order_and_are_saved(server):
+    app = server(QUIZ_CACHE_POLICY="off", QUIZ_BATCH_MAX_TOKENS="1400", QUIZ_BATCH_TOKENS_PER_QUIZ="700")
+    client = TestClient(app.app)
+
+    response = client.post("/generate-quiz/batch", json=batch_request()).json()
+
+    assert response["completions"] == 3
+    assert [body["max_tokens"] for body in server.requests] == [1400, 1400, 700]
+    assert [quiz["topic"] for quiz in response["quizzes"]] == TOPICS
+    for quiz, topic in zip(response["quizzes"], TOPICS):
+        assert {q["keyword"] for q in quiz["questions"]} == {f"{topic.lower()} term"}
+    saved = [client.get(f"/quiz-history/{quiz['quiz_id']}").json() for quiz in response["quizzes"]]
+    assert {quiz["usage"]["source"] for quiz in saved} == {"batch"}
+    # The two quizzes of a completion split its tokens between them
+    first, second = saved[0]["usage"], saved[1]["usage"]
+    assert abs(first["completion_tokens"] - second["completion_tokens"]) <= 1
+
+
+def test_items_the_batch_missed_are_generated_on_their_own(server, monkeypatch):
+    app = server(QUIZ_CACHE_POLICY="off")
+    build_quiz_batch = stub.build_quiz_batch
+
+    def skip_second(prompt):
+        return json.dumps([entry for entry in json.loads(build_quiz_batch(prompt)) if entry["item"] != 2])
+
+    monkeypatch.setattr(stub, "build_quiz_batch", skip_second)
+    client = TestClient(app.app)
+
+    response = client.post("/generate-quiz/batch", json=batch_request(TOPICS[:3])).json()
+
+    assert response["completions"] == 1
+    assert [is_batch(body) for body in server.requests] == [True, False]
+    assert "Physics" in server.requests[1]["messages"][-1]["content"]
+    sources = [client.get(f"/quiz-history/{quiz['quiz_id']}").json()["usage"]["source"] for quiz in response["quizzes"]]
+    assert sources == ["batch", "openai", "batch"]
+
+
+def test_a_failed_batch_falls_back_per_item(server, monkeypatch):
+    app = server(QUIZ_CACHE_POLICY="off")
+    monkeypatch.setattr(stub, "build_quiz_batch", lambda prompt: "Sorry, I can't help with that.")
+    client = TestClient(app.app)
+
+    response = client.post("/generate-quiz/batch", json=batch_request(TOPICS[:2])).json()
+
+    assert [is_batch(body) for body in server.requests] == [True, False, False]
+    assert [quiz["topic"] for quiz in response["quizzes"]] == TOPICS[:2]
+    assert all(len(quiz["questions"]) >= 3 for quiz in response["quizzes"])
+
+
+def test_cached_items_skip_the_batch(server):
+    app = server(QUIZ_CACHE_POLICY="any")
+    client = TestClient(app.app)
+    client.post("/generate-quiz/batch", json=batch_request(TOPICS[:2]))
+    sent = len(server.requests)
+
+    response = client.post("/generate-quiz/batch", json=batch_request(TOPICS[:3])).json()
+
+    assert response["completions"] == 1
+    assert len(server.requests) == sent + 1
+    assert "Chemistry" in server.requests[-1]["messages"][-1]["content"]
+    assert "Biology" not in server.requests[-1]["messages"][-1]["content"]
+
+
+def test_invalid_batches_are_rejected(server):
+    app = server()
+    client = TestClient(app.app)
+    response = client.post("/generate-quiz/batch", json={"items": [{"topic": "Biology", "keywords": ["cell"]},
+                                                                  {"topic": " ", "keywords": ["x"]}]})
+    assert (response.status_code, response.json()["detail"]) == (400, "No topic provided for item 2")
+    too_many = batch_request(["Biology"] * (app.QUIZ_BATCH_MAX_ITEMS + 1))
+    assert client.post("/generate-quiz/batch", json=too_many).status_code == 400
+    assert server.requests == []
@@ -0,0 +1,127 @@
+import sqlite3
+
+import pytest
+
+import quiz_cache
+from quiz_cache import QuizCache, SeenQuestions
+
+
+class Clock:
+    """Stands in for the time module in quiz_cache only"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(quiz_cache, "time", fake)
+    return fake
+
+
+def questions(prefix, keywords, count=4):
+    return [{"question": f"{prefix} {index}?", "keyword": keywords[index % len(keywords)]} for index in range(count)]
+
+
+def open_cache(tmp_path, **options):
+    return QuizCache(str(tmp_path / "quiz_cache.db"), "quiz-v1", **options)
+
+
+def disk_last_used(tmp_path):
+    with sqlite3.connect(str(tmp_path / "quiz_cache.db")) as conn:
+        return dict(conn.execute("SELECT cache_key, last_used FROM quiz_cache"))
+
+
+def test_exact_hits_skip_seen_questions(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.store("Biology", ["cell", "gene"], "medium", questions("bio", ["cell", "gene"]), tokens=400)
+
+    # Keyword order, case and spacing don't matter
+    assert len(cache.lookup(" biology", ["Gene", "cell"], "medium")) == 4
+    seen = SeenQuestions()
+    seen.quiz_added({"questions": questions("bio", ["cell", "gene"], count=2)})
+    assert [q["question"] for q in cache.lookup("Biology", ["cell", "gene"], "medium", seen=seen, min_questions=2)] \
+        == ["bio 2?", "bio 3?"]
+    assert cache.lookup("Biology", ["cell", "gene"], "medium", seen=seen) is None
+    assert cache.lookup("Biology", ["cell", "gene"], "big") is None
+    assert cache.stats() == {**cache.stats(), "hits": 2, "misses": 2, "tokens_saved": 600}
+
+
+def test_related_entries_fill_in_on_matching_keywords(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.store("Biology", ["cell", "gene"], "medium", questions("a", ["cell", "gene"]), tokens=40)
+    cache.store("Biology", ["cell"], "medium", questions("b", ["cell"], count=1), tokens=10)
+
+    picked = cache.lookup("Biology", ["cell"], "medium")
+    assert [q["question"] for q in picked] == ["b 0?", "a 0?", "a 2?"]
+    assert cache.stats()["related_hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl=100)
+    cache.store("Biology", ["cell"], "medium", questions("bio", ["cell"]), tokens=40)
+    clock.now += 99
+    assert cache.lookup("Biology", ["cell"], "medium") is not None
+
+    # Use doesn't extend an entry's life
+    clock.now += 2
+    assert cache.lookup("Biology", ["cell"], "medium") is None
+    assert cache.stats()["disk_entries"] == cache.stats()["memory_entries"] == 0
+
+    # Nor does adding questions to it: they keep the entry's creation time
+    cache.store("Biology", ["cell"], "medium", questions("new", ["cell"]), tokens=40)
+    clock.now += 60
+    cache.store("Biology", ["cell"], "medium", questions("newer", ["cell"]), tokens=40)
+    clock.now += 50
+    assert cache.lookup("Biology", ["cell"], "medium") is None
+
+
+def test_lookups_batch_their_last_used_writes(tmp_path, clock):
+    cache = open_cache(tmp_path, touch_interval=30)
+    cache.store("Biology", ["cell"], "medium", questions("bio", ["cell"]), tokens=40)
+    key = cache.cache_key("Biology", ["cell"], "medium")
+    assert disk_last_used(tmp_path) == {key: 1000.0}
+
+    for _ in range(3):
+        clock.now += 10
+        cache.lookup("Biology", ["cell"], "medium")
+    # The third lookup is 30s after the last write and flushes
+    assert disk_last_used(tmp_path) == {key: 1030.0}
+    clock.now += 10
+    cache.lookup("Biology", ["cell"], "medium")
+    assert disk_last_used(tmp_path) == {key: 1030.0}
+
+    cache.close()
+    assert disk_last_used(tmp_path) == {key: 1040.0}
+
+
+def test_disk_eviction_sees_pending_use(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=1, max_disk_entries=2, touch_interval=3600)
+    cache.store("Biology", ["cell"], "medium", questions("a", ["cell"]), tokens=40)
+    clock.now += 1
+    cache.store("Biology", ["gene"], "medium", questions("b", ["gene"]), tokens=40)
+    clock.now += 1
+    # Used since it was written, but only in memory so far
+    cache.lookup("Biology", ["cell"], "medium")
+    clock.now += 1
+    cache.store("Biology", ["atom"], "medium", questions("c", ["atom"]), tokens=40)
+
+    kept = set(disk_last_used(tmp_path))
+    assert kept == {cache.cache_key("Biology", ["cell"], "medium"), cache.cache_key("Biology", ["atom"], "medium")}
+
+
+def test_processes_sharing_a_file_merge_their_questions(tmp_path, clock):
+    first, second = open_cache(tmp_path), open_cache(tmp_path)
+    first.store("Biology", ["cell"], "medium", questions("a", ["cell"], count=2), tokens=20)
+    assert first.lookup("Biology", ["cell"], "medium", min_questions=2) is not None
+    second.store("Biology", ["cell"], "medium", questions("b", ["cell"], count=2), tokens=20)
+    # first's memory copy is stale, but its next store merges into the disk copy
+    first.store("Biology", ["cell"], "medium", questions("c", ["cell"], count=1), tokens=10)
+
+    reopened = open_cache(tmp_path)
+    picked = reopened.lookup("Biology", ["cell"], "medium", max_questions=10)
+    assert sorted(q["question"] for q in picked) == ["a 0?", "a 1?", "b 0?", "b 1?", "c 0?"]
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import make_quiz
+
+
+def seed(client, count=5, user="default"):
+    quizzes = [make_quiz(f"q{index}", topic="Biology" if index % 2 else "Physics",
+                         generated_at=f"2026-01-0{index + 1}T10:00:00",
+                         completed_at=f"2026-01-0{index + 1}T10:05:00" if index < 2 else None,
+                         correct=[True, False] if index < 2 else None)
+               for index in range(count)]
+    body = "\n".join(json.dumps(quiz) for quiz in quizzes)
+    response = client.post("/quiz-history/import", content=body, headers={"X-User-ID": user})
+    assert response.json()["imported"] == count
+
+
+@pytest.fixture
+def client(server):
+    client = TestClient(server().app)
+    seed(client)
+    return client
+
+
+def submit(client, quiz_id):
+    response = client.post("/submit-quiz", json={
+        "quiz_id": quiz_id, "topic": "Physics", "keyword": "cell", "completed_at": "2026-02-01T10:00:00",
+        "user_answers": [{"question_index": 0, "selected_answer": "A", "is_correct": True}],
+    })
+    assert response.status_code == 200
+
+
+def test_unchanged_history_gets_a_304(client):
+    first = client.get("/quiz-history", params={"limit": 2})
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    again = client.get("/quiz-history", params={"limit": 2}, headers={"If-None-Match": etag})
+    assert (again.status_code, again.content, again.headers["etag"]) == (304, b"", etag)
+    # Weak comparison, lists of tags and *
+    for header in (etag[2:], f'"other", {etag}', "*"):
+        assert client.get("/quiz-history", params={"limit": 2}, headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/quiz-history", params={"limit": 2}, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_changes_with_the_request_the_history_and_the_user(client):
+    etag = client.get("/quiz-history", params={"limit": 2}).headers["etag"]
+    others = {
+        client.get("/quiz-history", params={"limit": 3}).headers["etag"],
+        client.get("/quiz-history", params={"limit": 2, "topic": "Biology"}).headers["etag"],
+        client.get("/quiz-history", params={"limit": 2, "fields": "topic"}).headers["etag"],
+        client.get("/quiz-history", params={"limit": 2}, headers={"X-User-ID": "bob"}).headers["etag"],
+    }
+    assert etag not in others and len(others) == 4
+
+    by_id = client.get("/quiz-history/q3").headers["etag"]
+    submit(client, "q3")
+    assert client.get("/quiz-history", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/quiz-history/q3", headers={"If-None-Match": by_id}).status_code == 200
+
+    # Archiving moves quizzes without changing them, but the response does change
+    etag = client.get("/quiz-history").headers["etag"]
+    assert client.post("/quiz-archive/run", params={"older_than_days": 0}).json()["archived"] == 3
+    assert client.get("/quiz-history", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_projection_returns_only_the_requested_fields(client):
+    full = client.get("/quiz-history", params={"order": "desc"}).json()
+
+    projected = client.get("/quiz-history", params={"order": "desc", "fields": "topic, score"}).json()
+    assert projected["total_count"] == full["total_count"] == 5
+    assert projected["quizzes"] == [
+        {"quiz_id": quiz["quiz_id"], "topic": quiz["topic"], "score": quiz["score"]} for quiz in full["quizzes"]
+    ]
+
+    with_bodies = client.get("/quiz-history", params={"fields": "questions,quiz_id", "limit": 1}).json()
+    assert list(with_bodies["quizzes"][0]) == ["questions", "quiz_id"]
+    assert with_bodies["quizzes"][0]["questions"][0]["keyword"] == "cell"
+    assert with_bodies["next_cursor"] is not None
+
+    response = client.get("/quiz-history", params={"fields": "topic,secret"})
+    assert (response.status_code, response.json()["detail"]) == (400, "Unknown fields: secret")
+
+
+@pytest.mark.parametrize("env", [{"HISTORY_VALIDATE": "1"}, {"HISTORY_STREAM_CHUNK": "2"}])
+def test_every_serialization_path_returns_the_same_history(server, env):
+    default = TestClient(server().app)
+    seed(default)
+    expected = default.get("/quiz-history", params={"completed": "false"}).json()
+
+    client = TestClient(server(**env).app)
+    response = client.get("/quiz-history", params={"completed": "false"})
+    assert response.json() == expected
+    assert [quiz["quiz_id"] for quiz in expected["quizzes"]] == ["q2", "q3", "q4"]
+    assert "etag" in response.headers
@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_batch_uses_the_quiz_model_and_schema(server):
+    app = server(QUIZ_OUTPUT_MODE="json_schema", OPENAI_QUIZ_MODEL="quiz-model")
+    items = [(0, app.QuizRequest(topic="Biology", keywords=["cell"])),
+             (1, app.QuizRequest(topic="Physics", keywords=["force", "mass"]))]
+
+    results = asyncio.run(app.request_quiz_batch_from_openai(items))
+
+    body = server.requests[-1]
+    assert body["model"] == "quiz-model"
+    assert body["response_format"]["json_schema"]["name"] == "quiz_batch"
+    assert body["response_format"]["json_schema"]["schema"] == app.QUIZ_BATCH_JSON_SCHEMA
+    assert '{"quizzes": [...]}' in body["messages"][-1]["content"]
+    # The stub answers {"quizzes": [...]} to that prompt
+    assert sorted(results) == [0, 1]
+    questions, usage = results[1]
+    assert {q.keyword for q in questions} == {"force", "mass"}
+    assert usage["source"] == "batch"
+
+
+def test_text_mode_sends_no_response_format(server):
+    app = server(QUIZ_OUTPUT_MODE="text")
+    asyncio.run(app.request_quiz_batch_from_openai([(0, app.QuizRequest(topic="Biology", keywords=["cell"]))]))
+
+    body = server.requests[-1]
+    assert body["model"] == app.QUIZ_MODEL
+    assert "response_format" not in body
+    assert '"quizzes"' not in body["messages"][-1]["content"]
+
+
+def test_stream_uses_the_quiz_model_and_format(server):
+    app = server(QUIZ_OUTPUT_MODE="json_object", OPENAI_QUIZ_MODEL="quiz-model", QUIZ_CACHE_POLICY="off")
+    client = TestClient(app.app)
+
+    response = client.post("/generate-quiz/stream", json={"topic": "Biology", "keywords": ["cell", "gene"]})
+
+    assert response.status_code == 200
+    body = server.requests[-1]
+    assert body["model"] == "quiz-model" and body["stream"] is True
+    assert body["response_format"] == {"type": "json_object"}
+    # The wrapped {"questions": [...]} stream still arrives question by question
+    questions = [json.loads(line[len("data: "):]) for line in response.text.splitlines()
+                 if line.startswith("data: ") and '"question"' in line]
+    assert {q["keyword"] for q in questions} == {"cell", "gene"}
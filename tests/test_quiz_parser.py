@@ -0,0 +1,83 @@
+import json
+
+from quiz_parser import JSONArrayStreamParser, parse_quiz_items
+
+QUESTIONS = [
+    {"question": "Which {brace} is [this]?", "choice1": "a", "correct": "A", "keyword": "cell"},
+    {"question": 'A "quoted" \\ question', "choice1": "b", "correct": "B", "keyword": "gene"},
+]
+
+
+def feed_in_pieces(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+def test_bare_array_in_any_piece_size():
+    text = json.dumps(QUESTIONS)
+    for size in (1, 3, 7, len(text)):
+        assert feed_in_pieces(JSONArrayStreamParser(unwrap="questions"), text, size) == QUESTIONS
+
+
+def test_wrapped_object_yields_its_items():
+    text = json.dumps({"questions": QUESTIONS})
+    for size in (1, 5, len(text)):
+        parser = JSONArrayStreamParser(unwrap="questions")
+        assert feed_in_pieces(parser, text, size) == QUESTIONS
+        assert parser.errors == parser.skipped == 0
+
+
+def test_wrapper_key_after_other_fields():
+    text = json.dumps({"title": "questions", "meta": {"n": [1, 2]}, "questions": QUESTIONS})
+    assert JSONArrayStreamParser(unwrap="questions").feed(text) == QUESTIONS
+
+
+def test_items_emitted_as_they_complete():
+    parser = JSONArrayStreamParser(unwrap="questions")
+    first, second = json.dumps(QUESTIONS[0]), json.dumps(QUESTIONS[1])
+    assert parser.feed('{"questions": [' + first[:-1]) == []
+    assert parser.feed("}, " + second[:10]) == [QUESTIONS[0]]
+    assert parser.feed(second[10:] + "]}") == [QUESTIONS[1]]
+
+
+def test_without_unwrap_a_wrapper_is_one_item():
+    wrapped = {"questions": QUESTIONS}
+    assert JSONArrayStreamParser().feed(json.dumps(wrapped)) == [wrapped]
+
+
+def test_ndjson_objects_keep_nested_arrays():
+    quizzes = [{"quiz_id": "a", "questions": QUESTIONS}, {"quiz_id": "b", "questions": []}]
+    text = "\n".join(json.dumps(quiz) for quiz in quizzes) + "\n"
+    assert JSONArrayStreamParser(unwrap="quizzes").feed(text) == quizzes
+
+
+def test_counts_non_objects_and_broken_items():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[1, "x", {"a": 1}, [2], null, {"b": 1 2}, {"c": 3}]') == [{"a": 1}, {"c": 3}]
+    assert parser.skipped == 4
+    assert parser.errors == 1
+
+
+def test_cut_off_item_is_incomplete():
+    parser = JSONArrayStreamParser(unwrap="quizzes")
+    assert parser.feed('{"quizzes": [{"a": 1}, {"b": [1, 2') == [{"a": 1}]
+    assert parser.incomplete
+    assert parser.feed("]}]}") == [{"b": [1, 2]}]
+    assert not parser.incomplete
+
+
+def test_trailing_commas_inside_items_are_repaired():
+    assert JSONArrayStreamParser().feed('[{"a": [1, 2,], "b": 1,},]') == [{"a": [1, 2], "b": 1}]
+
+
+def test_parse_quiz_items_salvages_truncated_wrapper():
+    text = json.dumps({"questions": QUESTIONS})
+    items, outcome = parse_quiz_items(text[:-20])
+    assert outcome == "partial"
+    assert items == QUESTIONS[:1]
+
+
+def test_parse_quiz_items_unwraps_clean_output():
+    assert parse_quiz_items(json.dumps({"questions": QUESTIONS})) == (QUESTIONS, "clean")
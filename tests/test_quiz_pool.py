@@ -0,0 +1,162 @@
+import asyncio
+import json
+from collections import deque
+
+import pytest
+
+import quiz_pool
+from quiz_pool import QuizPool
+
+
+def test_topics_without_keywords_are_not_tracked(tmp_path):
+    state = tmp_path / "tracked_topics.json"
+    state.write_text(json.dumps([
+        {"topic": "Empty", "keywords": []},
+        {"topic": "Blank", "keywords": ["", "  "]},
+        {"topic": "Biology", "keywords": ["cell", ""]},
+    ]))
+    generated = []
+
+    async def generate(topic, keywords, difficulty):
+        generated.append((topic, keywords[0]))
+        return [{"question": f"{keywords[0]}?"}], 10
+
+    async def run():
+        pool = QuizPool(generate, str(state), size=2, difficulties=["medium"])
+        pool.track("u1", "Nothing", [" "])
+        await pool.start()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.stats()["tracked_topics"] == 1
+    assert generated == [("Biology", "cell"), ("Biology", "cell")]
+    assert pool.failures == 0
+
+
+class Clock:
+    """Stands in for the time module in quiz_pool only"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(quiz_pool, "time", fake)
+    return fake
+
+
+def make_generate(generated, tokens=10):
+    async def generate(topic, keywords, difficulty):
+        generated.append((topic, keywords[0]))
+        return [f"{topic}/{keywords[0]}/{len(generated)}?"], tokens
+    return generate
+
+
+async def settle():
+    for _ in range(50):
+        await asyncio.sleep(0)
+
+
+def test_token_budget_is_per_user(tmp_path, clock):
+    generated = []
+
+    async def run():
+        pool = QuizPool(make_generate(generated, tokens=100), str(tmp_path / "tracked.json"), size=3,
+                        tokens_per_hour=150, difficulties=["medium"])
+        await pool.start()
+        pool.track("u1", "Biology", ["cell"])
+        await settle()
+        pool.track("u2", "Physics", ["force"])
+        await settle()
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(run())
+    # Each user's budget covers two completions; u1 running out doesn't stop u2
+    assert generated == [("Biology", "cell")] * 2 + [("Physics", "force")] * 2
+    stats = pool.stats()
+    assert stats["users"] == {"u1": {"tracked_topics": 1, "tokens_last_hour": 200},
+                              "u2": {"tracked_topics": 1, "tokens_last_hour": 200}}
+    assert stats["tracked_topics"] == 2 and stats["budget_skips"] == 2
+
+    clock.now += 3601
+    assert pool.stats()["tokens_last_hour"] == 0 and pool.stats()["users"]["u1"]["tokens_last_hour"] == 0
+
+
+def test_refills_are_charged_to_the_tracker_with_budget_left(tmp_path, clock):
+    generated = []
+
+    async def run():
+        pool = QuizPool(make_generate(generated, tokens=100), str(tmp_path / "tracked.json"), size=3,
+                        tokens_per_hour=100, difficulties=["medium"])
+        await pool.start()
+        pool.track("u1", "Biology", ["cell"])
+        pool.track("u2", "biology", ["gene"])
+        await settle()
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(run())
+    assert sorted(generated) == [("Biology", "cell"), ("biology", "gene")]
+    assert {user: entry["tokens_last_hour"] for user, entry in pool.stats()["users"].items()} == {"u1": 100, "u2": 100}
+
+
+def test_seen_quizzes_stay_for_other_users(tmp_path, clock):
+    pool = QuizPool(make_generate([]), str(tmp_path / "tracked.json"), size=2, difficulties=["medium"])
+    pool._pools[("biology", "medium")] = deque([
+        {"keyword": "cell", "questions": ["q1"], "created_at": clock.now},
+        {"keyword": "cell", "questions": ["q2"], "created_at": clock.now},
+    ])
+
+    assert pool.take("Biology", ["cell"], "medium", seen={"q1"}) == ["q2"]
+    assert pool.take("Biology", ["cell"], "medium", seen={"q1"}) is None
+    assert pool.take("Biology", ["gene"], "medium") is None
+    # Someone who hasn't seen q1 still gets it
+    assert pool.take("Biology", ["cell"], "medium", seen={"q2"}) == ["q1"]
+    assert (pool.served, pool.empty) == (2, 2)
+
+
+def test_idle_topics_and_old_quizzes_expire(tmp_path, clock):
+    state = tmp_path / "tracked.json"
+    pool = QuizPool(make_generate([]), str(state), size=2, difficulties=["medium"], topic_ttl=100)
+    pool.track("u1", "Biology", ["cell"])
+    pool.track("u2", "Physics", ["force"])
+    pool._pools[("biology", "medium")] = deque([{"keyword": "cell", "questions": ["old"], "created_at": clock.now}])
+    pool._pools[("physics", "medium")] = deque([{"keyword": "force", "questions": ["p"], "created_at": clock.now}])
+
+    clock.now += 60
+    pool.track("u1", "Biology", ["cell"])
+    pool._pools[("biology", "medium")].append({"keyword": "cell", "questions": ["new"], "created_at": clock.now})
+    clock.now += 60
+    pool._expire()
+
+    # u2 hasn't asked about Physics for 120s: its topic and pool are gone
+    assert pool.stats()["users"] == {"u1": {"tracked_topics": 1, "tokens_last_hour": 0}}
+    assert pool.stats()["expired_topics"] == 1
+    assert pool.stats()["ready"] == {"biology/medium": 1}
+    assert pool.take("Biology", ["cell"], "medium") == ["new"]
+    assert [entry["user_id"] for entry in json.loads(state.read_text())] == ["u1"]
+
+
+def test_tracked_topics_survive_a_restart_per_user(tmp_path, clock):
+    state = tmp_path / "tracked.json"
+    pool = QuizPool(make_generate([]), str(state), size=2, difficulties=["medium"])
+    pool.track("u1", "Biology", ["cell"])
+    pool.track("u2", "Physics", ["force", "mass"])
+
+    reloaded = QuizPool(make_generate([]), str(state), size=2, difficulties=["medium"])
+    assert reloaded._topics == pool._topics
+
+    # Files written before per-user tracking belong to the default user
+    state.write_text(json.dumps([{"topic": "Chemistry", "keywords": ["atom"]}]))
+    legacy = QuizPool(make_generate([]), str(state), size=2, difficulties=["medium"], default_user="default")
+    assert legacy._topics == {"default": {"chemistry": {"topic": "Chemistry", "keywords": ["atom"], "next": 0,
+                                                         "requested_at": clock.now}}}
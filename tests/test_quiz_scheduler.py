@@ -0,0 +1,137 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from conftest import make_quiz
+from quiz_scheduler import ReviewScheduler, parse_timestamp, utc_now
+
+NOW = datetime(2026, 6, 1)
+
+
+def test_recompute_reads_history_before_locking(space):
+    for index in range(4):
+        space.store.add(make_quiz(f"q{index}", completed_at=f"2020-01-0{index + 1}T10:00:00",
+                                  correct=[True, index % 2 == 0]))
+    space.store.archive_quizzes(["q0", "q1"], "2026-01-01T00:00:00")
+
+    def history_with_concurrent_add():
+        # A submission arriving mid-recompute notifies the scheduler while
+        # holding the index lock, which history() also needs
+        writer = threading.Thread(target=space.store.add, args=(make_quiz("late"),), daemon=True)
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive(), "add() blocked on the scheduler lock"
+        yield from space.store.history()
+
+    result = space.scheduler.recompute(history_with_concurrent_add())
+    assert result["quizzes"] == 5
+
+
+def due_state(scheduler):
+    due, total = scheduler.due(now=NOW, limit=10000, include_new=True)
+    return total, sorted(due, key=lambda item: (item["topic"], item["keyword"]))
+
+
+def test_incremental_updates_match_a_full_recompute(space):
+    rng = random.Random(5)
+    keywords = ["cell", "gene", "atom", "war"]
+    live = []
+    for step in range(120):
+        action = rng.random()
+        if action < 0.45 or not live:
+            quiz_id = f"q{step}"
+            space.store.add(make_quiz(quiz_id, topic=rng.choice(["Biology", "History"]),
+                                      keywords=rng.sample(keywords, 2),
+                                      generated_at=f"2026-0{rng.randint(1, 4)}-{rng.randint(10, 28)}T10:00:00"))
+            live.append(quiz_id)
+        elif action < 0.85:
+            # Submissions arrive out of order, and some are answered again
+            space.store.update(rng.choice(live), {
+                "user_answers": [
+                    {"question_index": index, "selected_answer": "A", "is_correct": rng.random() < 0.6}
+                    for index in range(2)
+                ],
+                "completed_at": f"2026-0{rng.randint(1, 5)}-{rng.randint(10, 28)}T{rng.randint(10, 23)}:00:00",
+            })
+        else:
+            quiz_id = live.pop(rng.randrange(len(live)))
+            space.store.delete(quiz_id)
+        if step == 60:
+            space.store.archive_quizzes(live[:5], "2026-05-01T00:00:00")
+
+    assert space.scheduler.incremental_updates > 0
+    fresh = ReviewScheduler()
+    fresh.recompute(space.store.history())
+    assert due_state(space.scheduler) == due_state(fresh)
+    assert due_state(fresh)[0] > 0
+
+    space.scheduler.recompute(space.store.history())
+    assert due_state(space.scheduler) == due_state(fresh)
+
+
+def test_submissions_during_recompute_are_not_lost(space):
+    for index in range(6):
+        space.store.add(make_quiz(f"q{index}", generated_at=f"2026-01-0{index + 1}T10:00:00"))
+
+    def answer(quiz_id, day):
+        space.store.update(quiz_id, {
+            "user_answers": [{"question_index": 0, "selected_answer": "A", "is_correct": True}],
+            "completed_at": f"2026-02-0{day}T10:00:00",
+        })
+
+    def history_with_submissions():
+        for position, quiz in enumerate(space.store.history()):
+            if position == 3:
+                # q0 was already read unanswered; q5 is answered before it's read
+                answer("q0", 1)
+                answer("q5", 2)
+                # /due still answers from the current state meanwhile
+                assert space.scheduler.due(now=NOW)[1] == 1
+            yield quiz
+
+    result = space.scheduler.recompute(history_with_submissions())
+    assert result["quizzes"] == 6 and result["replayed_changes"] == 4
+
+    fresh = ReviewScheduler()
+    fresh.recompute(space.store.history())
+    assert due_state(space.scheduler) == due_state(fresh)
+    assert {(item["keyword"], item["reviews"]) for item in due_state(space.scheduler)[1]} == {("cell", 2), ("gene", 0)}
+
+
+def test_a_rebuild_during_recompute_wins(space):
+    space.store.add(make_quiz("q0", completed_at="2026-01-02T10:00:00", correct=[True, True]))
+
+    def history_then_rebuild():
+        yield from space.store.history()
+        space.store.delete("q0")
+        space.store.rebuild()
+
+    space.scheduler.recompute(history_then_rebuild())
+    assert due_state(space.scheduler) == (0, [])
+
+
+def test_timestamps_are_compared_in_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    try:
+        assert parse_timestamp("2026-01-01T10:00:00Z") == datetime(2026, 1, 1, 10)
+        assert parse_timestamp("2026-01-01T12:00:00+02:00") == datetime(2026, 1, 1, 10)
+        # Without an offset it's the server's local time
+        assert parse_timestamp("2026-01-01T19:00:00") == datetime(2026, 1, 1, 10)
+        assert parse_timestamp("2026-01-01") == datetime(2025, 12, 31, 15)
+        assert parse_timestamp("not a time") is None and parse_timestamp(None) is None
+        assert abs(utc_now() - datetime.fromtimestamp(time.time(), timezone.utc).replace(tzinfo=None)) < timedelta(seconds=1)
+
+        scheduler = ReviewScheduler()
+        # Completed at the same moment, written in three ways
+        for quiz_id, completed_at in (("a", "2026-01-01T10:00:00Z"), ("b", "2026-01-01T19:00:00"),
+                                      ("c", "2026-01-01T11:00:00+01:00")):
+            scheduler.quiz_added(make_quiz(quiz_id, topic=quiz_id, keywords=["cell"], completed_at=completed_at,
+                                           correct=[True]))
+        due, _ = scheduler.due(now=datetime(2026, 1, 2, 10))
+        assert {item["due_at"] for item in due} == {"2026-01-02T10:00:00+00:00"}
+        assert {item["last_reviewed"] for item in due} == {"2026-01-01T10:00:00+00:00"}
+    finally:
+        monkeypatch.undo()
+        time.tzset()
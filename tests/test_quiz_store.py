@@ -0,0 +1,158 @@
+from conftest import Space, make_quiz
+from quiz_archive import QuizArchive
+from quiz_store import IndexedQuizStore, QuizStore
+
+
+def catch_up(space):
+    if space.store.stale():
+        space.store.sync()
+
+
+def test_version_tag_agrees_across_workers(tmp_path):
+    first, second = Space(str(tmp_path)), Space(str(tmp_path))
+    try:
+        assert first.store.version_tag == second.store.version_tag
+        first.store.add(make_quiz("a"))
+        second.store.add(make_quiz("b"))
+        tags = set()
+        for space in (first, second):
+            catch_up(space)
+            tags.add(space.store.version_tag)
+        assert len(tags) == 1
+
+        first.store.update("a", {"completed_at": "2026-01-02T10:00:00"})
+        assert first.store.version_tag not in tags
+        catch_up(second)
+        assert second.store.version_tag == first.store.version_tag
+    finally:
+        first.close()
+        second.close()
+
+
+def test_version_tag_survives_restart_but_not_a_new_database(tmp_path):
+    (tmp_path / "one").mkdir()
+    (tmp_path / "two").mkdir()
+    space = Space(str(tmp_path / "one"))
+    space.store.add(make_quiz("a"))
+    tag = space.store.version_tag
+    space.close()
+    reopened = Space(str(tmp_path / "one"))
+    assert reopened.store.version_tag == tag
+    reopened.close()
+
+    other = Space(str(tmp_path / "two"))
+    other.store.add(make_quiz("a"))
+    assert other.store.version_tag != tag
+    other.close()
+
+
+def test_archive_removals_reach_other_workers(tmp_path):
+    first, second = Space(str(tmp_path)), Space(str(tmp_path))
+    try:
+        for index in range(3):
+            first.store.add(make_quiz(f"q{index}", completed_at="2026-01-02T10:00:00", correct=[True, False]))
+        first.store.archive_quizzes(["q0", "q1"], "2026-02-01T00:00:00")
+        catch_up(second)
+        assert second.stats.summary() == first.stats.summary()
+
+        assert first.store.delete("q0")
+        # Added and archived before the other worker ever saw it
+        first.store.add(make_quiz("late", completed_at="2026-01-03T10:00:00", correct=[True, True]))
+        first.store.archive_quizzes(["late"], "2026-02-01T00:00:00")
+        assert second.store.stale()
+        catch_up(second)
+        assert second.stats.summary() == first.stats.summary()
+        assert second.stats.summary()["total_quizzes"] == 3
+        assert second.store.version_tag == first.store.version_tag
+
+        fresh = Space(str(tmp_path))
+        assert fresh.stats.summary() == first.stats.summary()
+        fresh.close()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_topic_and_keyword_narrow_pages(space):
+    for index in range(6):
+        topic = "Biology" if index % 2 else "History"
+        keywords = ("cell", "gene") if index % 3 else ("war",)
+        space.store.add(make_quiz(f"q{index}", topic=topic, keywords=keywords,
+                                  generated_at=f"2026-01-0{index + 1}T10:00:00"))
+    store = space.store
+    assert store.page_ids(10, topic="Biology") == ["q1", "q3", "q5"]
+    assert store.page_ids(10, topic="Biology", keyword="cell") == ["q1", "q5"]
+    assert store.page_ids(10, keyword="war", descending=True) == ["q3", "q0"]
+    assert store.page_ids(1, after=("2026-01-02T10:00:00", "q1"), topic="Biology") == ["q3"]
+    assert store.page_ids(10, topic="Chemistry") == []
+    assert store.count_matching(topic="History", keyword="gene") == 2
+    assert store.count_matching(lambda meta: meta["quiz_id"] != "q2", topic="History") == 2
+    assert store.count_matching() == 6
+
+
+def test_iter_stored_leaves_out_archived_quizzes(space):
+    for index in range(3):
+        space.store.add(make_quiz(f"q{index}", generated_at=f"2026-01-0{index + 1}T10:00:00"))
+    space.store.archive_quizzes(["q1"], "2026-02-01T00:00:00")
+    assert [quiz["quiz_id"] for quiz in space.store.iter_stored(chunk_size=1)] == ["q0", "q2"]
+    assert sorted(quiz["quiz_id"] for quiz in space.store.history()) == ["q0", "q1", "q2"]
+
+
+class Recorder:
+    """Observer that records every notification it gets"""
+
+    def __init__(self):
+        self.events = []
+
+    def reset(self):
+        self.events.append(("reset", None, None))
+
+    def quiz_added(self, quiz):
+        self.events.append(("added", quiz["quiz_id"], quiz))
+
+    def quiz_removed(self, quiz):
+        self.events.append(("removed", quiz["quiz_id"], quiz))
+
+    def take(self):
+        events, self.events = self.events, []
+        return [(kind, quiz_id) for kind, quiz_id, _ in events], events
+
+
+def test_observers_see_every_change_with_full_quizzes(tmp_path):
+    recorder = Recorder()
+    # One cached body: old versions must be reloaded for the notifications
+    store = IndexedQuizStore(QuizStore(str(tmp_path / "quiz_history.db")), max_bodies=1, observers=[recorder],
+                             archive=QuizArchive(str(tmp_path / "quiz_archive.db")))
+    try:
+        assert recorder.take()[0] == [("reset", None)]
+        store.add(make_quiz("a"))
+        store.add_many([make_quiz("b"), make_quiz("c")])
+        assert recorder.take()[0] == [("added", "a"), ("added", "b"), ("added", "c")]
+
+        assert store.update("a", {"completed_at": "2026-01-02T10:00:00", "score": 1})
+        kinds, events = recorder.take()
+        assert kinds == [("removed", "a"), ("added", "a")]
+        assert events[0][2]["completed_at"] is None and events[1][2]["score"] == 1
+        assert [len(event[2]["questions"]) for event in events] == [2, 2]
+
+        assert store.delete("b")
+        kinds, events = recorder.take()
+        assert kinds == [("removed", "b")] and events[0][2]["questions"]
+        assert not store.delete("b") and not store.update("b", {"score": 1})
+
+        # Archived quizzes are still history: moving them isn't a change
+        assert store.archive_quizzes(["a"], "2026-02-01T00:00:00") == 1
+        assert recorder.take()[0] == []
+        assert store.delete("a")
+        kinds, events = recorder.take()
+        assert kinds == [("removed", "a")] and events[0][2]["score"] == 1
+
+        store.archive_quizzes(["c"], "2026-02-01T00:00:00")
+        store.add(make_quiz("d"))
+        recorder.take()
+        store.rebuild()
+        kinds, _ = recorder.take()
+        assert kinds[0] == ("reset", None)
+        assert sorted(kinds[1:]) == [("added", "c"), ("added", "d")]
+    finally:
+        store.close()
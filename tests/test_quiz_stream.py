@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmarks import stub_llm_server as stub
+from quiz_parser import JSONArrayStreamParser
+
+QUIZ = {"topic": "Biology", "keywords": ["cell", "gene"]}
+
+
+def parse_events(body):
+    """(event, data) pairs, checking each is framed as event/data lines and a blank line"""
+    assert body.endswith("\n\n")
+    events = []
+    for block in body[:-2].split("\n\n"):
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def test_sse_event_format(server):
+    app = server()
+    assert app.sse_event("done", {"n": 1}) == 'event: done\ndata: {"n": 1}\n\n'
+
+
+def test_stream_sends_quiz_questions_done_and_saves(server):
+    app = server(QUIZ_CACHE_POLICY="off")
+    client = TestClient(app.app)
+
+    response = client.post("/generate-quiz/stream", json=QUIZ)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "quiz" and names[-1] == "done"
+    assert set(names[1:-1]) == {"question"} and len(names) > 3
+    quiz_id = events[0][1]["quiz_id"]
+    questions = [data for name, data in events if name == "question"]
+    assert [q.pop("index") for q in questions] == list(range(len(questions)))
+    assert events[-1][1] == {"quiz_id": quiz_id, "total_questions": len(questions)}
+
+    saved = client.get(f"/quiz-history/{quiz_id}").json()
+    assert saved["questions"] == questions
+    assert saved["usage"]["source"] == "openai" and saved["usage"]["completion_tokens"] > 0
+    # Every stream gave its concurrency slot back
+    assert app.openai_semaphore._value == app.OPENAI_MAX_CONCURRENCY
+
+
+def test_repeat_streams_come_from_the_cache(server):
+    app = server(QUIZ_CACHE_POLICY="any")
+    client = TestClient(app.app)
+    client.post("/generate-quiz/stream", json=QUIZ)
+    completions = len(server.requests)
+
+    events = parse_events(client.post("/generate-quiz/stream", json=QUIZ).text)
+
+    assert len(server.requests) == completions
+    quiz_id = events[0][1]["quiz_id"]
+    assert client.get(f"/quiz-history/{quiz_id}").json()["usage"]["source"] == "cache"
+
+
+def test_stream_falls_back_when_the_upstream_fails(server, monkeypatch):
+    app = server(QUIZ_CACHE_POLICY="off", OPENAI_MAX_RETRIES="0")
+    monkeypatch.setitem(stub.FAULTS, "rate_limit_rate", 1.0)
+    client = TestClient(app.app)
+
+    events = parse_events(client.post("/generate-quiz/stream", json=QUIZ).text)
+
+    assert [name for name, _ in events] == ["quiz", "question", "done"]
+    assert client.get(f"/quiz-history/{events[0][1]['quiz_id']}").json()["usage"]["source"] == "fallback"
+    assert app.openai_semaphore._value == app.OPENAI_MAX_CONCURRENCY
+
+
+def test_invalid_requests_fail_before_streaming(server):
+    client = TestClient(server().app)
+    assert client.post("/generate-quiz/stream", json={"topic": " ", "keywords": ["cell"]}).status_code == 400
+    assert client.post("/generate-quiz/stream", json={"topic": "Biology", "keywords": []}).status_code == 400
+
+
+def test_questions_are_parsed_before_the_completion_ends(server, monkeypatch):
+    app = server()
+    monkeypatch.setattr(stub, "STREAM_CHUNKS", 40)
+    messages = app.quiz_prompts.choose().messages(topic="Biology", keywords=["cell", "gene"], difficulty="medium",
+                                                  wrap_object=False)
+
+    async def run():
+        usage, pieces = {}, []
+        async for piece in app.stream_chat_completion(10.0, usage, model=app.QUIZ_MODEL, messages=messages,
+                                                      max_tokens=2000):
+            pieces.append(piece)
+        return usage, pieces
+
+    usage, pieces = asyncio.run(run())
+    assert usage["finish_reason"] == "stop" and usage["completion_tokens"] > 0
+    parser = JSONArrayStreamParser(unwrap="questions")
+    completed_at = [index for index, piece in enumerate(pieces) for _ in parser.feed(piece)]
+    assert len(completed_at) >= 3
+    assert completed_at[0] < len(pieces) // 2
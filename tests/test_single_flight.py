@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from benchmarks import stub_llm_server as stub
+from upstream import SingleFlight
+
+
+def counting_factory(calls, result="value", delay=0.01, error=None):
+    async def call():
+        calls.append(result)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return lambda: call()
+
+
+def test_concurrent_callers_share_one_call():
+    flights, calls = SingleFlight(), []
+
+    async def run():
+        factory = counting_factory(calls)
+        first = asyncio.ensure_future(flights.run("quiz", "k", factory))
+        await asyncio.sleep(0)
+        assert flights.in_flight("quiz", "k") and not flights.in_flight("keywords", "k")
+        others = [flights.run("quiz", "k", factory) for _ in range(4)]
+        return await asyncio.gather(first, *others)
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert calls == ["value"]
+    assert flights.stats() == {"quiz": {"upstream_calls": 1, "coalesced": 4}, "in_flight": 0}
+
+
+def test_kinds_and_keys_are_separate_and_finished_calls_are_not_reused():
+    flights, calls = SingleFlight(), []
+
+    async def run():
+        await asyncio.gather(
+            flights.run("quiz", "a", counting_factory(calls, "quiz a")),
+            flights.run("quiz", "b", counting_factory(calls, "quiz b")),
+            flights.run("keywords", "a", counting_factory(calls, "keywords a")),
+        )
+        return await flights.run("quiz", "a", counting_factory(calls, "quiz a again"))
+
+    assert asyncio.run(run()) == "quiz a again"
+    assert calls == ["quiz a", "quiz b", "keywords a", "quiz a again"]
+    assert flights.stats()["quiz"] == {"upstream_calls": 3, "coalesced": 0}
+
+
+def test_a_cancelled_caller_leaves_the_call_running_for_the_others():
+    flights, calls = SingleFlight(), []
+
+    async def run():
+        factory = counting_factory(calls, delay=0.05)
+        leaving = asyncio.ensure_future(flights.run("quiz", "k", factory))
+        staying = asyncio.ensure_future(flights.run("quiz", "k", factory))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(run()) == "value"
+    assert calls == ["value"]
+
+
+def test_every_cancelled_caller_still_lets_the_call_finish():
+    flights, calls = SingleFlight(), []
+
+    async def run():
+        waiter = asyncio.ensure_future(flights.run("quiz", "k", counting_factory(calls, delay=0.02)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert flights.in_flight("quiz", "k")
+        await asyncio.sleep(0.05)
+        return flights.in_flight("quiz", "k")
+
+    assert asyncio.run(run()) is False
+    assert calls == ["value"]
+
+
+def test_errors_reach_every_caller_and_the_key_is_retried_afterwards():
+    flights, calls = SingleFlight(), []
+
+    async def run():
+        factory = counting_factory(calls, error=ValueError("upstream down"))
+        results = await asyncio.gather(*(flights.run("quiz", "k", factory) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        return await flights.run("quiz", "k", counting_factory(calls, "recovered"))
+
+    assert asyncio.run(run()) == "recovered"
+    assert len(calls) == 2
+
+
+def test_identical_quiz_requests_share_one_completion(server, monkeypatch):
+    app = server(QUIZ_CACHE_POLICY="off")
+    monkeypatch.setattr(stub, "LATENCY", 0.05)
+
+    async def run():
+        return await asyncio.gather(*(app.request_quiz_from_openai("Biology", ["cell", "gene"]) for _ in range(3)),
+                                    app.request_quiz_from_openai("Biology", ["cell"]))
+
+    results = asyncio.run(run())
+    assert len(server.requests) == 2
+    shared = results[:3]
+    assert all(questions == shared[0][0] for questions, _ in shared)
+    # The completion's tokens are counted for one of the callers only
+    assert sum(1 for _, usage in shared if usage["completion_tokens"] > 0) == 1
+    assert sum(1 for _, usage in shared if usage.get("coalesced")) == 2
+    assert app.upstream_flights.stats()["quiz"] == {"upstream_calls": 2, "coalesced": 2}
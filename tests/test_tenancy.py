@@ -0,0 +1,106 @@
+import pytest
+
+import tenancy
+from shared_state import SharedState
+from tenancy import LLMQuota, QuotaExceededError
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(tenancy.time, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "shared"])
+def make_quota(request, tmp_path):
+    states = []
+
+    def make(**limits):
+        shared = None
+        if request.param == "shared":
+            shared = SharedState(str(tmp_path / "shared_state.db"))
+            states.append(shared)
+        return LLMQuota(shared=shared, **limits)
+
+    yield make
+    for state in states:
+        state.close()
+
+
+def test_hour_window_slides(clock, make_quota):
+    quota = make_quota(per_hour=2)
+    quota.charge("ann")
+    clock.now += 600
+    quota.charge("ann")
+    with pytest.raises(QuotaExceededError) as raised:
+        quota.charge("ann")
+    # Room again once the first call is an hour old
+    assert raised.value.headers["Retry-After"] == str(3600 - 600 + 1)
+    clock.now += 3001
+    quota.charge("ann")
+    assert quota.usage("ann") == {"calls_last_hour": 2, "limit_per_hour": 2,
+                                  "calls_last_day": 3, "limit_per_day": None}
+    assert quota.rejected == 1
+
+
+def test_day_window_counts_past_the_hour(clock, make_quota):
+    quota = make_quota(per_hour=5, per_day=3)
+    for _ in range(3):
+        quota.charge("ann")
+        clock.now += 3600
+    with pytest.raises(QuotaExceededError) as raised:
+        quota.check("ann")
+    assert "per day" in raised.value.detail
+    clock.now += 86400 - 3 * 3600 + 1
+    quota.check("ann")
+    assert quota.usage("ann")["calls_last_day"] == 2
+
+
+def test_users_and_overrides_are_separate(clock, make_quota):
+    quota = make_quota(per_hour=1, overrides={"vip": {"llm_calls_per_hour": 3}, "free": {"llm_calls_per_hour": 0}})
+    quota.charge("ann")
+    quota.charge("bob")
+    for _ in range(3):
+        quota.charge("vip")
+    for _ in range(10):
+        quota.charge("free")
+    with pytest.raises(QuotaExceededError):
+        quota.charge("vip")
+    assert quota.usage("free")["limit_per_hour"] is None
+
+
+def test_check_reserves_several_completions(clock, make_quota):
+    quota = make_quota(per_hour=3)
+    quota.charge("ann")
+    quota.check("ann", 2)
+    with pytest.raises(QuotaExceededError) as raised:
+        quota.check("ann", 3)
+    assert raised.value.status_code == 429
+    with pytest.raises(QuotaExceededError):
+        quota.check("ann", 4)
+    quota.check("bob", 3)
+
+
+def test_shared_windows_count_every_process(clock, tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    first, second = SharedState(path), SharedState(path)
+    try:
+        quotas = [LLMQuota(per_hour=3, shared=first), LLMQuota(per_hour=3, shared=second)]
+        quotas[0].charge("ann")
+        quotas[1].charge("ann")
+        quotas[0].charge("ann")
+        with pytest.raises(QuotaExceededError):
+            quotas[1].charge("ann")
+        assert quotas[1].usage("ann")["calls_last_hour"] == 3
+    finally:
+        first.close()
+        second.close()
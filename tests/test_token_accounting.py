@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import token_accounting
+from token_accounting import TokenBudget, TokenLedger, count_message_tokens, count_tokens
+
+
+class Template:
+    def __init__(self, name="quiz-v1", question_tokens=60):
+        self.name = name
+        self.question_tokens = question_tokens
+
+
+@pytest.fixture
+def approximate(monkeypatch):
+    """Count with the approximation even where tiktoken is installed"""
+    monkeypatch.setattr(token_accounting, "_encoding", None)
+
+
+def test_approximate_counts(approximate):
+    assert count_tokens("") == 0
+    assert count_tokens("hello world") == 2
+    assert count_tokens("Hello, world!\n") == 5
+    # Long words and numbers split into several tokens
+    assert count_tokens("internationalization") == 4
+    assert count_tokens("12345") == 2
+    assert count_tokens('{\n    "a": 1\n}') == 10
+    messages = [{"role": "system", "content": "hello world"}, {"role": "user", "content": None}]
+    assert count_message_tokens(messages) == (2 + 4) + (0 + 4) + 3
+
+
+def test_budget_is_sized_to_the_questions_asked_for():
+    budget = TokenBudget(ceiling=2000, headroom=1.3, overhead=30)
+    template = Template(question_tokens=60)
+    # 60 tokens in the template's example, doubled for medium questions
+    assert budget.per_question(template, "medium") == 120
+    assert budget.max_tokens(template, "medium", 5) == 5 * 120 * 1.3 + 30
+    assert budget.max_tokens(template, "small", 1) == 1 * 90 * 1.3 + 30
+    assert budget.max_tokens(template, "big", 20) == 2000
+    assert budget.max_tokens(Template(question_tokens=0), "medium", 3) == 30
+
+
+def test_budget_follows_observed_completions_per_template_and_difficulty():
+    budget = TokenBudget(smoothing=0.5)
+    template = Template()
+    budget.observe(template, "medium", completion_tokens=400, questions=5, truncated=False)
+    assert budget.per_question(template, "medium") == 120 + 0.5 * (80 - 120)
+    # Other difficulties and templates keep their own estimate
+    assert budget.per_question(template, "big") == 180
+    assert budget.per_question(Template(name="quiz-v2"), "medium") == 120
+    # Nothing is learned from an empty completion
+    budget.observe(template, "medium", completion_tokens=0, questions=0, truncated=False)
+    assert budget.per_question(template, "medium") == 100
+    assert budget.stats()["tokens_per_question"] == {"quiz-v1/medium": 100.0}
+
+
+def test_a_truncated_completion_raises_the_budget_at_once():
+    budget = TokenBudget(ceiling=150)
+    template = Template()
+    budget.observe(template, "medium", completion_tokens=2000, questions=2, truncated=True)
+    assert budget.per_question(template, "medium") == 150
+    budget.observe(template, "small", completion_tokens=100, questions=1, truncated=True)
+    assert budget.per_question(template, "small") == 90 * 1.25
+    assert budget.stats()["truncated_completions"] == 2
+
+
+def test_ledger_adds_up_per_day_topic_purpose_and_prompt(tmp_path):
+    path = str(tmp_path / "token_usage.db")
+    today = date.today()
+    ledger = TokenLedger(path)
+    ledger.record("quiz", "Biology", "quiz-v1", 100, 300)
+    ledger.record("quiz", "Biology", "quiz-v1", 50, 200)
+    ledger.record("batch", "Physics", "batch-v1", 10, 20, day=(today - timedelta(days=1)).isoformat())
+    ledger.record("keywords", "Physics", "keywords-v1", 5, 5, day=(today - timedelta(days=40)).isoformat())
+    ledger.close()
+
+    report = TokenLedger(path).report(days=30)
+    assert report["since"] == (today - timedelta(days=29)).isoformat()
+    assert report["total"] == {"calls": 3, "prompt_tokens": 160, "completion_tokens": 520, "total_tokens": 680}
+    assert list(report["by_day"]) == [(today - timedelta(days=1)).isoformat(), today.isoformat()]
+    # Biggest spenders first
+    assert list(report["by_topic"]) == ["Biology", "Physics"]
+    assert report["by_topic"]["Biology"]["calls"] == 2
+    assert set(report["by_purpose"]) == {"quiz", "batch"}
+    assert set(report["by_prompt"]) == {"quiz-v1", "batch-v1"}
+
+    physics = TokenLedger(path).report(days=60, topic="Physics")
+    assert physics["total"]["calls"] == 2 and set(physics["by_purpose"]) == {"batch", "keywords"}
+
+
+def test_quizzes_are_budgeted_and_accounted(server):
+    app = server(QUIZ_CACHE_POLICY="off")
+    client = TestClient(app.app)
+
+    quiz_id = client.post("/generate-quiz", json={"topic": "Biology", "keywords": ["cell", "gene"]}).json()["quiz_id"]
+    saved = client.get(f"/quiz-history/{quiz_id}").json()["usage"]
+
+    assert server.requests[-1]["max_tokens"] < app.QUIZ_MAX_TOKENS
+    usage = client.get("/token-usage", params={"topic": "Biology"}).json()
+    assert usage["by_purpose"]["quiz"]["completion_tokens"] == saved["completion_tokens"] > 0
+    assert usage["by_prompt"][saved["prompt"]]["calls"] == 1
+    # The first completion already informs the next budget
+    assert app.token_budget.stats()["tokens_per_question"]
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+import upstream
+from benchmarks import stub_llm_server as stub
+from upstream import CircuitBreaker, CircuitOpenError, RateLimiter, UpstreamGuard
+
+
+class Clock:
+    """Stands in for the time module in upstream only: asyncio keeps the real clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(upstream, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    """An OpenAI client talking to the benchmark stub in-process, without its own retries"""
+    monkeypatch.setattr(stub, "LATENCY", 0.0)
+    monkeypatch.setattr(stub, "RETRY_AFTER", 0.05)
+    monkeypatch.setitem(stub.FAULTS, "rate_limit_rate", 0.0)
+    return openai.AsyncOpenAI(
+        api_key="k", base_url="http://stub/v1", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub.app)),
+    )
+
+
+def complete(client):
+    return lambda: client.chat.completions.create(
+        model="gpt-3.5-turbo", messages=[{"role": "user", "content": 'learning about "Biology"'}]
+    )
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.rejected == 2
+
+
+def test_cancelled_probe_gives_the_breaker_back(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    guard = UpstreamGuard(limiter, breaker)
+    breaker.record_failure()
+    clock.now += 30
+    limiter.requests.level = 0
+    limiter.requests._updated = clock.now
+
+    async def factory():
+        return "ok"
+
+    async def run():
+        waiting = asyncio.ensure_future(guard.call(factory))
+        await asyncio.sleep(0.05)
+        assert breaker.probing
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert not breaker.probing and breaker.state == "half_open"
+        limiter.requests.level = 60
+        return await guard.call(factory)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_non_retryable_errors_release_the_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    guard = UpstreamGuard(RateLimiter(), breaker)
+    breaker.record_failure()
+    clock.now += 30
+
+    async def factory():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(guard.call(factory))
+    assert not breaker.probing and breaker.state == "half_open"
+    assert guard.retries == 0
+
+
+def test_limiter_waits_for_both_budgets():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+
+    async def run():
+        await limiter.acquire(100)
+        limiter.requests.level = 0
+        started = time.monotonic()
+        await limiter.acquire(100)
+        return time.monotonic() - started
+
+    # 10 requests per second refill: the second request waits about 0.1s
+    assert asyncio.run(run()) >= 0.08
+    assert limiter.waited > 0
+    assert limiter.tokens.level == pytest.approx(5800, abs=20)
+    limiter.settle(100, 40)
+    assert limiter.tokens.level == pytest.approx(5860, abs=20)
+
+
+def test_rate_limits_are_retried_after_retry_after(stub_client):
+    stub.FAULTS["rate_limit_rate"] = 1.0
+    limiter = RateLimiter()
+    guard = UpstreamGuard(limiter, CircuitBreaker(failure_threshold=10), max_retries=2, base_delay=0.001)
+
+    async def run():
+        started = time.monotonic()
+        with pytest.raises(openai.RateLimitError):
+            await guard.call(complete(stub_client))
+        return time.monotonic() - started
+
+    # Two backoffs, each at least the stub's Retry-After
+    assert asyncio.run(run()) >= 0.1
+    assert guard.attempts == 3 and guard.retries == 2
+    assert guard.errors == {"RateLimitError": 3}
+
+
+def test_transient_rate_limit_recovers(stub_client):
+    stub.FAULTS["rate_limit_rate"] = 1.0
+    limiter = RateLimiter(tokens_per_minute=100000)
+    guard = UpstreamGuard(limiter, CircuitBreaker(failure_threshold=10), base_delay=0.001)
+    send = complete(stub_client)
+
+    async def flaky():
+        try:
+            return await send()
+        finally:
+            stub.FAULTS["rate_limit_rate"] = 0.0
+
+    response = asyncio.run(guard.call(flaky, tokens=5000))
+    assert response.choices[0].message.content
+    assert guard.retries == 1 and guard.breaker.state == "closed"
+    # The estimate was settled against the real usage
+    assert limiter.tokens.level > 100000 - 5000 * 2 + response.usage.total_tokens
@@ -0,0 +1,169 @@
+"""
+Token counting, completion budgets and spend accounting.
+
+count_tokens() uses tiktoken when it is installed (pip install tiktoken)
+and otherwise approximates GPT tokenization: about one token per short
+word, more for long words, one per punctuation mark and per line break or
+indentation run. That is close enough to size budgets, not to bill.
+
+TokenBudget picks max_tokens for a quiz completion from the number of
+questions asked for instead of reserving a fixed 2000 tokens. Its estimate
+of completion tokens per question starts from the tokenized example
+question of the prompt template (scaled by difficulty) and then follows the
+completions actually observed, per template and difficulty. A completion
+cut off by max_tokens raises the estimate at once.
+
+TokenLedger adds up prompt and completion tokens per day, topic, purpose
+(keywords, quiz, batch, ...) and prompt template in SQLite, so spend can be
+reported across restarts and across worker processes.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or the encoding can't be loaded offline
+    _encoding = None
+
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\S\n]+|\n+|[^\sA-Za-z\d]")
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: exact with tiktoken, else an approximation"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece[0] == " " and len(piece) == 1:
+            continue  # Merged into the next word
+        else:
+            tokens += 1
+    return tokens
+
+def count_message_tokens(messages: Iterable[Dict]) -> int:
+    """Prompt tokens of a chat request, including the per-message framing"""
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages) + 3
+
+# Real questions are longer than a template's placeholder example, and harder
+# ones carry more context; observed completions replace these starting points
+DIFFICULTY_LENGTH = {"small": 1.5, "medium": 2.0, "big": 3.0}
+
+class TokenBudget:
+    """max_tokens for quiz completions, sized to the number of questions requested"""
+
+    def __init__(self, ceiling: int = 2000, headroom: float = 1.3, overhead: int = 30,
+                 smoothing: float = 0.2):
+        self.ceiling = ceiling
+        self.headroom = headroom
+        self.overhead = overhead
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._per_question: Dict[Tuple[str, str], float] = {}
+        self.truncated = 0
+
+    def per_question(self, template, difficulty: str) -> float:
+        """Expected completion tokens per question for this template and difficulty"""
+        with self._lock:
+            observed = self._per_question.get((template.name, difficulty))
+        if observed is not None:
+            return observed
+        return template.question_tokens * DIFFICULTY_LENGTH.get(difficulty, 2.0)
+
+    def max_tokens(self, template, difficulty: str, questions: int) -> int:
+        estimate = questions * self.per_question(template, difficulty) * self.headroom + self.overhead
+        return max(1, min(self.ceiling, int(math.ceil(estimate))))
+
+    def observe(self, template, difficulty: str, completion_tokens: int, questions: int, truncated: bool):
+        """Learn from one finished completion that produced this many questions"""
+        current = self.per_question(template, difficulty)
+        with self._lock:
+            if truncated:
+                # Cut off: whatever it produced, the budget was too small
+                self.truncated += 1
+                self._per_question[(template.name, difficulty)] = min(current * 1.25, float(self.ceiling))
+            elif questions > 0 and completion_tokens > 0:
+                sample = completion_tokens / questions
+                self._per_question[(template.name, difficulty)] = current + self.smoothing * (sample - current)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ceiling": self.ceiling,
+                "headroom": self.headroom,
+                "truncated_completions": self.truncated,
+                "tokens_per_question": {f"{name}/{difficulty}": round(value, 1)
+                                        for (name, difficulty), value in sorted(self._per_question.items())},
+            }
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_usage (
+    day TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    PRIMARY KEY (day, topic, purpose, prompt)
+);
+"""
+
+class TokenLedger:
+    """Prompt and completion tokens spent per day, topic, purpose and prompt template"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, purpose: str, topic: str, prompt: str, prompt_tokens: int, completion_tokens: int,
+               calls: int = 1, day: Optional[str] = None):
+        """Add tokens to the day's row; a completion serving several topics is recorded once per topic"""
+        day = day or datetime.now().date().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO token_usage VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day, topic, purpose, prompt) "
+                "DO UPDATE SET calls = calls + excluded.calls, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens",
+                (day, topic, purpose, prompt, calls, prompt_tokens, completion_tokens),
+            )
+
+    def report(self, days: int = 30, topic: Optional[str] = None) -> Dict:
+        """Totals over the last days, broken down per day, topic, purpose and prompt template"""
+        since = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+        query = "SELECT day, topic, purpose, prompt, calls, prompt_tokens, completion_tokens FROM token_usage WHERE day >= ?"
+        params = [since]
+        if topic is not None:
+            query += " AND topic = ?"
+            params.append(topic)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        def empty():
+            return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        report = {"since": since, "total": empty(), "by_day": {}, "by_topic": {}, "by_purpose": {}, "by_prompt": {}}
+        for day, row_topic, purpose, prompt, calls, prompt_tokens, completion_tokens in rows:
+            for entry in (report["total"], report["by_day"].setdefault(day, empty()),
+                          report["by_topic"].setdefault(row_topic, empty()),
+                          report["by_purpose"].setdefault(purpose, empty()),
+                          report["by_prompt"].setdefault(prompt, empty())):
+                entry["calls"] += calls
+                entry["prompt_tokens"] += prompt_tokens
+                entry["completion_tokens"] += completion_tokens
+                entry["total_tokens"] += prompt_tokens + completion_tokens
+        report["by_day"] = dict(sorted(report["by_day"].items()))
+        report["by_topic"] = dict(sorted(report["by_topic"].items(), key=lambda item: -item[1]["total_tokens"]))
+        return report
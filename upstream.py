@@ -0,0 +1,318 @@
+"""
+Helpers for calls to the upstream LLM API.
+
+SingleFlight coalesces identical concurrent calls: the first caller for a
+key starts the work, and everyone who asks for the same key while it is
+still running awaits that same result instead of starting another call.
+
+UpstreamGuard wraps every completion call with the rest of the resilience
+policy: a RateLimiter (token buckets for requests and tokens per minute,
+paused whenever the API answers 429 with Retry-After; given a SharedState
+the budgets and pauses are shared by every worker process), retries with
+jittered exponential backoff for transient errors, and a CircuitBreaker
+that fails fast with CircuitOpenError after repeated failures so callers
+can serve cached content instead of queueing behind a dead upstream.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import openai
+
+from shared_state import SharedState, SharedTokenBucket
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = Counter()
+        self.coalesced = Counter()
+
+    async def run(self, kind: str, key: Hashable, factory: Callable[[], Awaitable]):
+        """
+        Await factory() for this key, or join the call already running for it.
+        kind groups the counters (e.g. "quiz" or "keywords").
+        """
+        flight_key: Tuple[str, Hashable] = (kind, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[flight_key] = task
+
+            def forget(finished, flight_key=flight_key):
+                if self._inflight.get(flight_key) is finished:
+                    del self._inflight[flight_key]
+
+            task.add_done_callback(forget)
+            self.calls[kind] += 1
+        else:
+            self.coalesced[kind] += 1
+        # Shielded so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def in_flight(self, kind: str, key: Hashable) -> bool:
+        """Whether run(kind, key, ...) would join a call already running"""
+        return (kind, key) in self._inflight
+
+    def stats(self) -> Dict:
+        stats = {
+            kind: {"upstream_calls": self.calls[kind], "coalesced": self.coalesced[kind]}
+            for kind in sorted(set(self.calls) | set(self.coalesced))
+        }
+        stats["in_flight"] = len(self._inflight)
+        return stats
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx are worth retrying"""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                          openai.InternalServerError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait (Retry-After header), if any"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class TokenBucket:
+    """Refills at rate_per_minute / 60 per second up to one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.level = rate_per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)"""
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self._refill(time.monotonic())
+        self.level = min(self.capacity, self.level + amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets; 0 disables a budget"""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 shared: Optional[SharedState] = None):
+        def bucket(name: str, rate: float):
+            if rate <= 0:
+                return None
+            return SharedTokenBucket(shared, name, rate) if shared is not None else TokenBucket(rate)
+
+        self.shared = shared
+        self.requests = bucket("upstream_requests", requests_per_minute)
+        self.tokens = bucket("upstream_tokens", tokens_per_minute)
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self.waited = 0.0
+
+    async def offload(self, function: Callable, *args):
+        """
+        Call function(*args), in a thread when the budgets are shared: their
+        SQLite transactions may wait on other workers for the busy timeout.
+        """
+        if self.shared is None:
+            return function(*args)
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))
+
+    def _try_take(self, tokens: int) -> float:
+        """Take one request's budgets and return 0, or return how long to wait first"""
+        delay = self.paused_for()
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(tokens))
+        if delay > 0:
+            return delay
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+        return 0.0
+
+    async def acquire(self, tokens: int):
+        """Wait until one request using about `tokens` tokens fits both budgets"""
+        # Callers are served in arrival order so large requests aren't starved
+        async with self._lock:
+            while True:
+                delay = await self.offload(self._try_take, tokens)
+                if delay <= 0:
+                    return
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token budget once the real usage is known"""
+        if self.tokens is not None and actual < estimated:
+            self.tokens.give_back(estimated - actual)
+        elif self.tokens is not None:
+            self.tokens.take(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. for a 429's Retry-After"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self.shared is not None:
+            self.shared.pause("upstream", time.time() + seconds)
+
+    def paused_for(self) -> float:
+        """Seconds left of the current pause (0 or less when not paused)"""
+        remaining = self._paused_until - time.monotonic()
+        if self.shared is not None:
+            remaining = max(remaining, self.shared.paused_until("upstream") - time.time())
+        return remaining
+
+    def stats(self) -> Dict:
+        return {
+            "requests_per_minute": self.requests.capacity if self.requests else None,
+            "tokens_per_minute": self.tokens.capacity if self.tokens else None,
+            "paused_for": round(max(0.0, self.paused_for()), 2),
+            "seconds_waited": round(self.waited, 2),
+        }
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures it
+    opens and rejects calls for reset_timeout seconds, then lets a single
+    probe call through (half open); the probe's outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self.probing):
+            self.rejected += 1
+            raise CircuitOpenError("Upstream circuit breaker is open")
+        if state == "half_open":
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release(self):
+        """A call ended without telling us anything about upstream health"""
+        self.probing = False
+
+    def stats(self) -> Dict:
+        state = self.state
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "retry_in": round(self.reset_timeout - (time.monotonic() - self.opened_at), 2) if state == "open" else 0,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected,
+        }
+
+class UpstreamGuard:
+    """Rate limiting, retries with backoff and a circuit breaker around upstream calls"""
+
+    def __init__(self, limiter: RateLimiter, breaker: CircuitBreaker, max_retries: int = 2,
+                 base_delay: float = 0.5, max_delay: float = 8.0):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = 0
+        self.retries = 0
+        self.errors = Counter()
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential delay, never shorter than the API's Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    async def call(self, factory: Callable[[], Awaitable], tokens: int = 0):
+        """
+        Await factory() within the budgets, retrying transient failures.
+        tokens is the estimated usage; if the result reports its real usage
+        the token budget is corrected. Raises CircuitOpenError while open.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                # Inside the try: a wait that is cancelled or fails must give
+                # back a half-open breaker's probe like any other early exit
+                await self.limiter.acquire(tokens)
+                self.attempts += 1
+                result = await factory()
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release()
+                    raise
+                self.errors[type(e).__name__] += 1
+                self.breaker.record_failure()
+                if isinstance(e, openai.RateLimitError):
+                    await self.limiter.offload(self.limiter.pause, retry_after(e) or self.base_delay)
+                if attempt >= self.max_retries or self.breaker.state != "closed":
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            usage = getattr(result, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                await self.limiter.offload(self.limiter.settle, tokens, usage.total_tokens)
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            "circuit_breaker": self.breaker.stats(),
+            "rate_limiter": self.limiter.stats(),
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "errors": dict(self.errors),
+        }